@@ -0,0 +1,65 @@
+"""
+Benchmark: inserting new listings into a local PostgreSQL
+
+Compares the per-listing path (insert_new_listing(), one INSERT per row and a commit per listing)
+with ListingWriter (multi-row INSERTs, one transaction per batch) for several batch sizes and
+reports rows/sec. Requires a running PostgreSQL configured in .env (see benchmarks/common.py).
+
+Usage:
+    python benchmarks/bench_db_insert.py [--offers N] [--photos P] [--batch-sizes 10,50,200]
+"""
+import argparse, time
+
+from common import make_offer, scratch_schema
+
+from db.db_operations import insert_new_listing
+from db.bulk_writer import ListingWriter
+
+
+def rows_of(offers: list) -> int:
+    # listing + features + zdjecia (+ lokalizacje, pomijalne)
+    return sum(2 + len(offer['images']) for offer in offers)
+
+
+def bench_one_by_one(offers: list) -> float:
+    with scratch_schema() as conn:
+        cur = conn.cursor()
+        start = time.perf_counter()
+        for offer in offers:
+            insert_new_listing(offer, conn, cur)
+        elapsed = time.perf_counter() - start
+        cur.close()
+    return elapsed
+
+
+def bench_writer(offers: list, batch_size: int) -> float:
+    with scratch_schema() as conn:
+        start = time.perf_counter()
+        with ListingWriter(conn, batch_size=batch_size, flush_interval=float('inf')) as writer:
+            for offer in offers:
+                writer.add(offer)
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, default=1000)
+    parser.add_argument('--photos', type=int, default=3, help="photos per offer")
+    parser.add_argument('--batch-sizes', default='10,50,200')
+    args = parser.parse_args()
+
+    offers = [make_offer(n, photos=args.photos, photo_size=20_000) for n in range(args.offers)]
+    rows = rows_of(offers)
+
+    print(f"{args.offers} ofert, {rows} wierszy")
+    print(f"{'method':<25} {'seconds':>9} {'rows/s':>10}")
+    elapsed = bench_one_by_one(offers)
+    print(f"{'insert_new_listing':<25} {elapsed:>9.2f} {rows / elapsed:>10.0f}")
+    for batch_size in (int(size) for size in args.batch_sizes.split(',')):
+        elapsed = bench_writer(offers, batch_size)
+        print(f"{f'ListingWriter({batch_size})':<25} {elapsed:>9.2f} {rows / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: cost of logging as seen by the scraping thread
+
+1. Debug dump of the offers of a search (the f-string formatted before the call, as crawl_search did)
+   versus a lazy %-style call, with DEBUG disabled: the f-string is built anyway, the lazy call only
+   checks the level.
+2. Time of one INFO record written by synchronous file and console handlers versus the QueueHandler
+   set up by config.logging_config.setup_logger() (the handlers run in the QueueListener thread).
+
+Usage:
+    python benchmarks/bench_logging.py [--offers N] [--records N]
+"""
+import argparse, logging, logging.handlers, os, queue, sys, tempfile, time
+import colorlog
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def make_search_offers(count: int) -> list:
+    return [{'listing_id': 66_000_000 + n, 'area': 48.5, 'price': 455_000, 'price_per_m': 9381,
+             'link': f"https://www.otodom.pl/pl/oferta/mieszkanie-ID{n}"} for n in range(count)]
+
+
+def bench_debug_dump(logger: logging.Logger, offers: list, repeat: int = 20) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        logger.debug(f"Dane z all_offers_basic_from_sarching_page: \n{'--' * 100}\n{offers}\n {'--' * 100}\n")
+    eager = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        logger.debug("Dane z all_offers_basic_from_sarching_page: %s", offers)
+    lazy = (time.perf_counter() - start) / repeat
+    return eager, lazy
+
+
+def bench_handlers(handlers: list, records: int) -> float:
+    logger = logging.getLogger(f"bench.{id(handlers)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    for handler in handlers:
+        logger.addHandler(handler)
+    start = time.perf_counter()
+    for n in range(records):
+        logger.info("Update ceny oferty %s w bazie zakonczony", n)
+    elapsed = time.perf_counter() - start
+    for handler in handlers:
+        logger.removeHandler(handler)
+    return elapsed / records
+
+
+def make_handlers(directory: str, name: str, console) -> list:
+    """
+    File and console handlers as in config.logging_config.setup_logger()
+    """
+    file_handler = logging.FileHandler(os.path.join(directory, name))
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'))
+    console_handler = colorlog.StreamHandler(console)
+    console_handler.setFormatter(colorlog.ColoredFormatter('%(log_color)s%(asctime)s - %(levelname)s - %(message)s'))
+    return [file_handler, console_handler]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, default=3000, help="offers in the debug dump")
+    parser.add_argument('--records', type=int, default=20000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench.dump")
+    logger.setLevel(logging.INFO)
+    eager, lazy = bench_debug_dump(logger, make_search_offers(args.offers))
+    print(f"debug dump of {args.offers} offers at INFO level: f-string {eager * 1000:.2f} ms, lazy {lazy * 1000:.4f} ms")
+
+    # konsola: plik na dysku zamiast terminala (terminal jest zwykle wolniejszy)
+    with tempfile.TemporaryDirectory() as directory, open(os.path.join(directory, "console.log"), 'w') as console:
+        handlers = make_handlers(directory, "sync.log", console)
+        sync = bench_handlers(handlers, args.records)
+        handlers[0].close()
+
+        handlers = make_handlers(directory, "queued.log", console)
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *handlers)
+        listener.start()
+        queued = bench_handlers([logging.handlers.QueueHandler(log_queue)], args.records)
+        listener.stop()
+        for handler in handlers:
+            handler.close()
+
+    print(f"INFO record (file + console), caller's time: synchronous handlers {sync * 1e6:.1f} us, "
+          f"QueueHandler {queued * 1e6:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: extracting __NEXT_DATA__ from saved Otodom pages
+
+Compares the old approach (full BeautifulSoup parse of the document + json.loads) with
+scraper.next_data.extract_next_data (byte-level slice + orjson).
+
+Usage:
+    python benchmarks/bench_next_data.py [directory with saved .html pages] [--repeat N]
+
+Without a directory the recorded pages from tests/fixtures/otodom are used, together with
+a synthetic ~500 KB listing page built from one of them (the size of a real listing page).
+"""
+import argparse, glob, json, os, sys, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bs4 import BeautifulSoup
+from scraper.next_data import extract_next_data
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'otodom')
+
+
+def soup_extract(content: bytes) -> dict:
+    soup = BeautifulSoup(content.decode('utf-8'), 'html.parser')
+    script_tag = soup.find('script', {'id': '__NEXT_DATA__'})
+    return json.loads(script_tag.string)
+
+
+def inflate_listing_page(content: bytes, target_size: int = 500_000) -> bytes:
+    """
+    Builds a page of realistic size: markup before the script (as rendered by Next.js) and
+    a long description / many images inside the JSON
+    """
+    data = extract_next_data(content)
+    ad = data['props']['pageProps']['ad']
+    ad['description'] = ad['description'] * 40
+    ad['images'] = ad['images'] * 30
+    markup = ''.join(f'<div class="css-{n}"><span data-cy="item">Element {n}</span><a href="/pl/oferta/x-{n}">link</a></div>'
+                     for n in range(target_size // 110))
+    payload = json.dumps(data, ensure_ascii=False)
+    html = (f'<!DOCTYPE html><html><head><title>x</title></head><body><div id="__next">{markup}</div>'
+            f'<script id="__NEXT_DATA__" type="application/json">{payload}</script></body></html>')
+    return html.encode('utf-8')
+
+
+def timeit(func, content: bytes, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', nargs='?', default=None)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(args.directory or FIXTURES_DIR, '*.html'))):
+        with open(path, 'rb') as f:
+            pages[os.path.basename(path)] = f.read()
+    if args.directory is None:
+        listing = next(content for name, content in pages.items() if name.startswith('listing_'))
+        pages['synthetic_listing_500kb.html'] = inflate_listing_page(listing)
+
+    print(f"{'page':<55} {'size KB':>8} {'soup ms':>9} {'fast ms':>9} {'speedup':>8}")
+    total_soup = total_fast = 0.0
+    for name, content in pages.items():
+        assert soup_extract(content) == extract_next_data(content), name
+        soup_time = timeit(soup_extract, content, args.repeat)
+        fast_time = timeit(extract_next_data, content, args.repeat)
+        total_soup += soup_time
+        total_fast += fast_time
+        print(f"{name[:55]:<55} {len(content) / 1024:>8.1f} {soup_time * 1000:>9.3f} {fast_time * 1000:>9.3f} {soup_time / fast_time:>7.1f}x")
+    print(f"{'TOTAL':<55} {'':>8} {total_soup * 1000:>9.3f} {total_fast * 1000:>9.3f} {total_soup / total_fast:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
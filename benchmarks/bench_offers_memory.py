@@ -0,0 +1,90 @@
+"""
+Benchmark: memory of the search-result offers held during a crawl
+
+Builds N synthetic offers of search results (as parse_search_page_offers() sees them) and compares
+the memory retained by a list of dictionaries (the previous representation) with scraper.offers.OfferBatch,
+measured with tracemalloc. It also times reading the (listing_id, area) keys used by the deletion stage
+and the rows used by the diff stage.
+
+Usage:
+    python benchmarks/bench_offers_memory.py [--offers N]
+"""
+import argparse, os, random, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scraper.offers import OfferBatch, LINK_PREFIX
+
+DISTRICTS = ['koszutka', 'ligota', 'brynow', 'srodmiescie', 'zaleze', 'bogucice', 'giszowiec']
+
+
+def generate_offers(count: int, seed: int = 1):
+    """
+    Yields the fields of synthetic offers: (listing_id, area, price, price_per_m, link)
+    """
+    rng = random.Random(seed)
+    for n in range(count):
+        area = round(rng.uniform(25, 120), 2)
+        price = rng.randrange(250_000, 1_500_000, 1000)
+        link = f"{LINK_PREFIX}mieszkanie-{rng.randint(1, 5)}-pokojowe-katowice-{rng.choice(DISTRICTS)}-ID4{n:07x}"
+        yield 66_000_000 + n, area, price, int(price / area), link
+
+
+def retained(build) -> tuple:
+    """
+    Returns (the built object, bytes allocated by build() and still held)
+    """
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def build_dicts(count: int) -> list:
+    return [{'listing_id': listing_id, 'area': area, 'price': price, 'price_per_m': price_per_m, 'link': link}
+            for listing_id, area, price, price_per_m, link in generate_offers(count)]
+
+
+def build_batch(count: int) -> OfferBatch:
+    batch = OfferBatch()
+    for fields in generate_offers(count):
+        batch.append(*fields)
+    return batch
+
+
+def best_of(function, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, default=300_000)
+    args = parser.parse_args()
+
+    dicts, dicts_size = retained(lambda: build_dicts(args.offers))
+    batch, batch_size = retained(lambda: build_batch(args.offers))
+    assert list(batch.rows())[:1000] == [tuple(offer.values()) for offer in dicts[:1000]]
+
+    print(f"{args.offers} ofert")
+    print(f"{'container':<16} {'MB':>8} {'B/offer':>8} {'build s':>8} {'keys s':>8} {'rows s':>8}")
+    # czasy bez tracemalloc (śledzenie alokacji wielokrotnie spowalnia budowanie)
+    dicts_build = best_of(lambda: build_dicts(args.offers), repeat=1)
+    batch_build = best_of(lambda: build_batch(args.offers), repeat=1)
+    dicts_keys = best_of(lambda: [(offer['listing_id'], offer['area']) for offer in dicts])
+    dicts_rows = best_of(lambda: [(offer['listing_id'], offer['area'], offer['price']) for offer in dicts])
+    batch_keys = best_of(lambda: list(batch.keys()))
+    batch_rows = best_of(lambda: [row[:3] for row in batch.rows()])
+    for name, size, build, keys, rows in (('list of dicts', dicts_size, dicts_build, dicts_keys, dicts_rows),
+                                          ('OfferBatch', batch_size, batch_build, batch_keys, batch_rows)):
+        print(f"{name:<16} {size / 1e6:>8.1f} {size / args.offers:>8.0f} {build:>8.2f} {keys:>8.2f} {rows:>8.2f}")
+    print(f"OfferBatch: {dicts_size / batch_size:.1f}x mniej pamięci")
+
+
+if __name__ == '__main__':
+    main()
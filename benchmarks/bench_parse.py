@@ -0,0 +1,205 @@
+"""
+Benchmark: offline parsing and transforming of recorded Otodom pages
+
+Times every stage a page goes through on its way to the database, without any network access:
+get_total_pages(), parse_search_page_offers() (offers of a search page), download_data_from_listing_page()
+(photos are never fetched there, only their URLs are collected), transform_data() and, with --db, writing
+the transformed offers with ListingWriter to a scratch schema of a local PostgreSQL (see benchmarks/common.py).
+
+For every stage it reports pages/sec (best of --repeat runs) and the allocations measured with tracemalloc in
+a separate run (peak KB and number of allocated blocks per page). The results can be saved as a baseline
+(--save-baseline) and every next run is compared with it: a stage slower than the baseline by more than
+--threshold percent is reported as a regression and the script exits with status 1.
+
+Corpus (all pages are used as they are, nothing is downloaded):
+- tests/fixtures/otodom (default), plus a synthetic ~500 KB listing page of realistic size
+- a directory with saved .html pages (search_*.html / listing_*.html)
+- --http-cache PATH: search and listing pages stored in the HTTP cache (scraper/http_cache.py) by real runs
+
+Usage:
+    python benchmarks/bench_parse.py [directory] [--http-cache PATH] [--repeat N] [--db] [--db-offers N]
+                                     [--baseline PATH] [--save-baseline] [--threshold PERCENT]
+"""
+import argparse, glob, json, os, sqlite3, sys, time, tracemalloc
+
+from bench_next_data import FIXTURES_DIR, inflate_listing_page
+from scraper.fetch_and_parse import get_total_pages, parse_search_page_offers, download_data_from_listing_page
+from scraper.next_data import extract_next_data
+from scraper.http_cache import classify_url
+from scraper.transform_data import transform_data
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline_parse.json')
+
+
+def load_corpus(directory: str = None, http_cache: str = None) -> tuple:
+    """
+    Returns (search pages, listing pages) as lists of (name, raw bytes)
+    """
+    search_pages, listing_pages = [], []
+    if http_cache:
+        conn = sqlite3.connect(f"file:{http_cache}?mode=ro", uri=True)
+        for url, content in conn.execute("SELECT url, content FROM responses WHERE status_code = 200"):
+            kind = classify_url(url)
+            if kind == 'search':
+                search_pages.append((url, content))
+            elif kind == 'listing':
+                listing_pages.append((url, content))
+        conn.close()
+        return search_pages, listing_pages
+
+    for path in sorted(glob.glob(os.path.join(directory or FIXTURES_DIR, '*.html'))):
+        with open(path, 'rb') as f:
+            content = f.read()
+        name = os.path.basename(path)
+        if name.startswith('search'):
+            search_pages.append((name, content))
+        elif name.startswith('listing'):
+            listing_pages.append((name, content))
+    if directory is None and listing_pages:
+        listing_pages.append(('synthetic_listing_500kb.html', inflate_listing_page(listing_pages[0][1])))
+    return search_pages, listing_pages
+
+
+def parse_listing(content: bytes) -> dict:
+    offer_data = download_data_from_listing_page(content)
+    offer_data.pop('image_urls')
+    return offer_data
+
+
+def search_offers(content: bytes) -> list:
+    return parse_search_page_offers(extract_next_data(content))
+
+
+def time_stage(func, inputs: list, repeat: int, min_time: float = 0.2) -> float:
+    """
+    Returns the best time of one pass over the inputs, every measurement repeats the pass
+    for at least min_time seconds (a single pass over a small corpus is too short to time)
+    """
+    def run(passes: int) -> float:
+        start = time.perf_counter()
+        for _ in range(passes):
+            for item in inputs:
+                func(item)
+        return time.perf_counter() - start
+
+    passes = 1
+    while run(passes) < min_time:
+        passes *= 2
+    return min(run(passes) for _ in range(repeat)) / passes
+
+
+def measure_allocations(func, inputs: list) -> tuple:
+    """
+    Returns (peak KB, allocated blocks) of one pass over the inputs
+    """
+    tracemalloc.start()
+    try:
+        before = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        results = [func(item) for item in inputs]
+        _, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename')) - before
+        del results
+    finally:
+        tracemalloc.stop()
+    return (peak - base) / 1024, blocks
+
+
+def bench_db_insert(offers: list, copies: int) -> float:
+    from common import scratch_schema
+    from db.bulk_writer import ListingWriter
+
+    rows = []
+    for n in range(copies):
+        offer = dict(offers[n % len(offers)], images=[])
+        offer['listing_id'] = 90_000_000 + n
+        rows.append(offer)
+
+    with scratch_schema() as conn:
+        start = time.perf_counter()
+        with ListingWriter(conn, flush_interval=float('inf')) as writer:
+            for offer in rows:
+                writer.add(offer)
+        return time.perf_counter() - start
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline or not baseline[stage]['pages_per_second']:
+            continue
+        change = (result['pages_per_second'] / baseline[stage]['pages_per_second'] - 1) * 100
+        result['change'] = change
+        if change < -threshold:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', nargs='?', default=None)
+    parser.add_argument('--http-cache', default=None, help="read the corpus from an HTTP cache file")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', action='store_true', help="also time writing the offers to a local PostgreSQL")
+    parser.add_argument('--db-offers', type=int, default=500)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=20.0, help="allowed slowdown in percent")
+    args = parser.parse_args()
+
+    search_pages, listing_pages = load_corpus(args.directory, args.http_cache)
+    if not search_pages or not listing_pages:
+        sys.exit("Brak stron wyszukiwania lub ofert w korpusie")
+    search_contents = [content for _, content in search_pages]
+    listing_contents = [content for _, content in listing_pages]
+    parsed_listings = [parse_listing(content) for content in listing_contents]
+    print(f"Korpus: {len(search_pages)} stron wyszukiwania, {len(listing_pages)} ofert "
+          f"({sum(map(len, search_contents + listing_contents)) / 1024:.0f} KB)")
+
+    stages = {
+        'get_total_pages': (get_total_pages, search_contents),
+        'search_offers': (search_offers, search_contents),
+        'parse_listing': (parse_listing, listing_contents),
+        # transform_data dostaje kopię, zeby kazde powtórzenie zaczynało od tych samych danych
+        'transform_data': (lambda offer_data: transform_data(dict(offer_data)), parsed_listings),
+    }
+
+    results = {}
+    for stage, (func, inputs) in stages.items():
+        elapsed = time_stage(func, inputs, args.repeat)
+        peak_kb, blocks = measure_allocations(func, inputs)
+        results[stage] = {'pages_per_second': len(inputs) / elapsed, 'peak_kb_per_page': peak_kb / len(inputs),
+                          'blocks_per_page': blocks / len(inputs)}
+
+    if args.db:
+        offers = [transform_data(dict(offer_data)) for offer_data in parsed_listings]
+        elapsed = bench_db_insert(offers, args.db_offers)
+        results['db_insert'] = {'pages_per_second': args.db_offers / elapsed, 'peak_kb_per_page': None, 'blocks_per_page': None}
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+
+    print(f"{'stage':<18} {'pages/s':>10} {'peak KB/page':>13} {'blocks/page':>12} {'vs baseline':>12}")
+    for stage, result in results.items():
+        peak = f"{result['peak_kb_per_page']:.1f}" if result['peak_kb_per_page'] is not None else '-'
+        blocks = f"{result['blocks_per_page']:.0f}" if result['blocks_per_page'] is not None else '-'
+        change = f"{result['change']:+.1f}%" if 'change' in result else '-'
+        flag = '  REGRESSION' if stage in regressions else ''
+        print(f"{stage:<18} {result['pages_per_second']:>10.1f} {peak:>13} {blocks:>12} {change:>12}{flag}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({stage: {key: value for key, value in result.items() if key != 'change'}
+                       for stage, result in results.items()}, f, indent=2)
+        print(f"Zapisano wyniki bazowe w {args.baseline}")
+
+    if regressions:
+        sys.exit(f"Spadek wydajności o ponad {args.threshold:.0f}%: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
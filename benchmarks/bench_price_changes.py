@@ -0,0 +1,83 @@
+"""
+Benchmark: applying the price changes of a crawl to a local PostgreSQL
+
+Compares the per-offer path (update_active_offers(), four statements and a commit per offer) with
+apply_price_changes() (one INSERT INTO price_history ... SELECT and one UPDATE ... FROM (VALUES ...)
+in one transaction) and checks that both record the previous current price as old_price.
+Requires a running PostgreSQL configured in .env (see benchmarks/common.py).
+
+Usage:
+    python benchmarks/bench_price_changes.py [--offers N] [--changes 100,1000,5000]
+"""
+import argparse, random, time
+
+from common import make_offer, scratch_schema
+
+from db.bulk_writer import ListingWriter
+from db.db_operations import update_active_offers, apply_price_changes
+
+
+def seed_listings(conn, offers: list) -> list:
+    """
+    Inserts the offers and returns the changed_offers entries (as from categorize_offers()) with new prices,
+    the current price of every offer is first set apart from the original one (an earlier price change)
+    """
+    with ListingWriter(conn, batch_size=500, flush_interval=float('inf')) as writer:
+        for offer in offers:
+            writer.add(offer)
+    cur = conn.cursor()
+    cur.execute("UPDATE apartments_sale_listings SET updated_price = price + 1000")
+    cur.execute("SELECT id, otodom_listing_id, updated_price, area FROM apartments_sale_listings")
+    rows = cur.fetchall()
+    conn.commit()
+    cur.close()
+    return [{'id': id_db, 'listing_id': listing_id, 'old_price': old_price, 'new_price': old_price - 5000,
+             'new_price_per_m': round((old_price - 5000) / float(area), 2)}
+            for id_db, listing_id, old_price, area in rows]
+
+
+def check_history(conn, changes: list):
+    cur = conn.cursor()
+    cur.execute("SELECT listing_id, old_price, new_price FROM price_history")
+    history = {listing_id: (old_price, new_price) for listing_id, old_price, new_price in cur.fetchall()}
+    cur.execute("SELECT count(*) FROM apartments_sale_listings WHERE updated_price = price - 4000")
+    updated = cur.fetchone()[0]
+    cur.close()
+    expected = {change['id']: (change['old_price'], change['new_price']) for change in changes}
+    assert history == expected, "price_history nie zawiera poprzednich cen"
+    assert updated == len(changes)
+
+
+def bench(method: str, offers: list, count: int) -> float:
+    with scratch_schema() as conn:
+        changes = random.sample(seed_listings(conn, offers), count)
+        cur = conn.cursor()
+        start = time.perf_counter()
+        if method == 'update_active_offers':
+            for change in changes:
+                update_active_offers(change, conn, cur)
+        else:
+            apply_price_changes(changes, conn, cur)
+        elapsed = time.perf_counter() - start
+        cur.close()
+        check_history(conn, changes)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, default=5000)
+    parser.add_argument('--changes', default='100,1000,5000', help="comma separated numbers of price changes")
+    args = parser.parse_args()
+
+    offers = [make_offer(n) for n in range(args.offers)]
+    print(f"{args.offers} ofert w bazie")
+    print(f"{'changes':>8} {'method':<22} {'seconds':>9} {'changes/s':>10}")
+    for count in (min(int(count), args.offers) for count in args.changes.split(',')):
+        for method in ('update_active_offers', 'apply_price_changes'):
+            elapsed = bench(method, offers, count)
+            print(f"{count:>8} {method:<22} {elapsed:>9.3f} {count / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
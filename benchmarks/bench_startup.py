@@ -0,0 +1,92 @@
+"""
+Benchmark: startup (import) time and memory of the scraper
+
+Imports the given modules in fresh interpreters with `python -X importtime` and reports, for each of them,
+the median import time, its slowest direct imports (cumulative) and the peak RSS after the import.
+It also checks that the heavy optional dependencies (OpenCV, numpy, pandas, openpyxl, BeautifulSoup) are not
+imported: they are loaded lazily only by the code paths that need them (PHOTO_MODE=transcode, saving to Excel,
+the BeautifulSoup fallback of extract_next_data).
+
+Usage:
+    python benchmarks/bench_startup.py [--modules main,scraper.pipeline] [--runs N] [--top N] [--max-ms MS]
+
+With --max-ms the script exits with status 1 when the median import time of a module exceeds the budget
+or when a heavy dependency was imported.
+"""
+import argparse, os, statistics, subprocess, sys, tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+HEAVY_MODULES = ('cv2', 'numpy', 'pandas', 'openpyxl', 'bs4')
+
+# kod uruchamiany w nowym interpreterze: import modułu, potem RSS i załadowane cięzkie moduły
+PROBE = """
+import resource, sys
+import {module}
+print('RSS_KB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+print('HEAVY', ','.join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def run_probe(module: str, log_dir: str) -> tuple:
+    """
+    Returns (import time of the module in us, direct imports of the module as (cumulative us, name), RSS KB,
+    heavy modules loaded)
+    """
+    env = dict(os.environ, LOG_DIR=log_dir, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Import {module} nie powiódł się:\n{result.stderr[-2000:]}")
+
+    # -X importtime wypisuje moduł po wszystkich modułach, które zaimportował (wcięte o 2 spacje na poziom)
+    total, children, block = None, [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth > 0:
+            block.append((depth, int(cumulative_us), name.strip()))
+            continue
+        if name.strip() == module:
+            total = int(cumulative_us)
+            children = [(cumulative, child) for child_depth, cumulative, child in block if child_depth == 1]
+        block = []
+
+    output = dict(line.split(' ', 1) if ' ' in line else (line, '') for line in result.stdout.splitlines())
+    heavy = [name for name in output.get('HEAVY', '').split(',') if name]
+    return total, children, int(output['RSS_KB']), heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', default='main,scraper.pipeline', help="comma separated modules to import")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None, help="import time budget per module")
+    args = parser.parse_args()
+
+    failed = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        for module in args.modules.split(','):
+            runs = [run_probe(module, log_dir) for _ in range(args.runs)]
+            median_ms = statistics.median(total for total, _, _, _ in runs) / 1000
+            rss_mb = statistics.median(rss for _, _, rss, _ in runs) / 1024
+            heavy = sorted({name for _, _, _, loaded in runs for name in loaded})
+
+            print(f"{module}: import {median_ms:.1f} ms (mediana z {args.runs}), RSS {rss_mb:.1f} MB, "
+                  f"cięzkie moduły: {', '.join(heavy) or 'brak'}")
+            # najwolniejsze bezpośrednie importy modułu (z ostatniego przebiegu)
+            for cumulative, name in sorted(runs[-1][1], reverse=True)[:args.top]:
+                print(f"    {name:<40} {cumulative / 1000:>8.1f} ms")
+
+            if heavy or (args.max_ms is not None and median_ms > args.max_ms):
+                failed.append(module)
+
+    if failed:
+        sys.exit(f"Przekroczony budzet startu lub import cięzkich modułów: {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Helpers shared by the benchmarks: synthetic offers and a scratch schema in a local PostgreSQL
+
+The database benchmarks use the connection settings from .env (DB_HOST, DB_NAME, ...) and create
+all tables in a temporary schema which is dropped afterwards, so they can be run against the
+development database without touching its data.
+"""
+import os, sys, random, datetime
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db.db_setup import get_db_connection, create_tables
+from db.locations import get_location_resolver
+from scraper.photos import hash_photo
+
+
+DISTRICTS = ['Koszutka', 'Ligota', 'Brynów', 'Śródmieście', 'Załęże', 'Bogucice', 'Giszowiec', None]
+
+
+def make_photo(n: int, i: int, photo_size: int) -> dict:
+    """
+    Returns a synthetic photo record in the format produced by scraper.photos.collect_photos()
+    """
+    content = os.urandom(photo_size)
+    return {'url': f"https://example.com/images/{n}/{i}.jpg", 'hash': hash_photo(content), 'content': content}
+
+
+def make_offer(n: int, photos: int = 0, photo_size: int = 50_000) -> dict:
+    """
+    Returns a synthetic offer in the format produced by transform_data()
+    """
+    area = round(random.uniform(25, 120), 2)
+    price = random.randrange(250_000, 1_500_000, 1000)
+    return {
+        'listing_id': 70_000_000 + n, 'title': f"Mieszkanie {n}", 'market': 'secondary', 'advert_type': 'agency',
+        'creation_date': datetime.date(2025, 3, 1), 'creation_time': '10:15', 'pushed_ap_at': None,
+        'exclusive_offer': False, 'creation_source': 'API', 'description_text': 'Mieszkanie po remoncie. ' * 40,
+        'area': area, 'price': price, 'price_per_m': int(price / area), 'rent_amount': 650, 'rooms_num': 2,
+        'floor_num': 3, 'heating': 'urban', 'ownership': 'full_ownership', 'proper_type': 'mieszkanie',
+        'construction_status': 'ready_to_use', 'energy_certificate': None,
+        'features': 'balcony basement lift fridge stove internet cable_television entryphone',
+        'voivodeship': 'slaskie', 'city': 'katowice', 'district': random.choice(DISTRICTS), 'street': 'ul. Ordona',
+        'building_build_year': 1975, 'building_floors_num': 10, 'building_material': 'concrete_plate',
+        'building_type': 'block', 'windows_type': 'plastic', 'local_plan_url': None, 'video_url': None,
+        'view3d_url': None, 'walkaround_url': None, 'images': [make_photo(n, i, photo_size) for i in range(photos)],
+        'owner_id': 1234567, 'owner_name': 'Jan Kowalski', 'agency_id': 98765, 'agency_name': 'Nieruchomości Śląsk',
+        'offer_link': f"https://www.otodom.pl/pl/oferta/mieszkanie-ID{n}", 'active': True, 'closing_date': None,
+    }
+
+
+@contextmanager
+def scratch_schema():
+    """
+    Yields a connection whose search_path points to a fresh schema with all tables created
+    by the migrations from db/migrations, the schema is dropped on exit
+    """
+    conn = get_db_connection()
+    if conn is None:
+        sys.exit("Brak połączenia z bazą danych - ustaw DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT w .env")
+
+    schema = f"bench_{os.getpid()}"
+    cur = conn.cursor()
+    try:
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}")
+        conn.commit()
+        create_tables(cur)
+        # pamięć podręczna lokalizacji nie moze zawierac id z poprzedniego schematu
+        get_location_resolver().load(cur)
+        yield conn
+    finally:
+        conn.rollback()
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.commit()
+        cur.close()
+        conn.close()
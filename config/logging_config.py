@@ -1,13 +1,55 @@
-import logging, colorlog
+import os, queue, atexit, logging, logging.handlers, colorlog
 from datetime import datetime
 
-def setup_logger():
-    log_filename = datetime.now().strftime("logs/otodom_app_log_%Y-%m-%d_%H-%M-%S.log")
+
+# Ustawienia mozna nadpisac zmiennymi srodowiskowymi (.env)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # poziom dla wszystkich modułów
+# poziomy dla wybranych modułów (loggery wg nazwy modułu), np. "scraper.fetch_and_parse=DEBUG,db=WARNING"
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
+
+_listener = None
+
+
+def parse_levels(levels: str) -> dict:
+    """
+    Parses "module=LEVEL,module=LEVEL" into {module: level}
+    """
+    result = {}
+    for item in levels.split(','):
+        if not item.strip():
+            continue
+        name, _, level = item.partition('=')
+        result[name.strip()] = level.strip().upper()
+    return result
+
+
+def setup_logger(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, log_dir: str = LOG_DIR):
+    """
+    Configures logging of the application: a log file in log_dir and a colored console
+
+    The handlers run in a QueueListener thread, the logging threads only put the records into a queue
+    (QueueHandler), so writing the file does not slow down scraping. The level is set on the root logger
+    and can be changed for single modules (all modules log through logging.getLogger(__name__))
+
+    Args:
+        level (str): Level of the root logger
+        levels (str): Levels of selected loggers, "module=LEVEL,module=LEVEL"
+
+    Returns:
+        logging.Logger: The root logger
+    """
+    global _listener
+
+    os.makedirs(log_dir, exist_ok=True)
+    log_filename = os.path.join(log_dir, datetime.now().strftime("otodom_app_log_%Y-%m-%d_%H-%M-%S.log"))
 
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(level.upper())
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
 
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
 
     file_handler = logging.FileHandler(log_filename)
     file_handler.setFormatter(formatter)
@@ -27,8 +69,35 @@ def setup_logger():
         )
     )
 
-    # Dodajemy handler do loggera
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Handlery działają w wątku QueueListener, do loggera trafia tylko QueueHandler
+    if _listener is not None:
+        _listener.stop()
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logger)
+
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     return logger
+
+
+def stop_logger():
+    """
+    Writes out the queued records and stops the listener thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_worker_logger(level: str = 'WARNING'):
+    """
+    Minimal logging of a worker process (process pools of the parse and photo stages): warnings and errors
+    to stderr, without a log file or a listener thread (those belong to the main process only)
+    """
+    logging.basicConfig(level=level, format='%(asctime)s - %(levelname)s - %(processName)s - %(name)s - %(message)s')
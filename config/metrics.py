@@ -0,0 +1,228 @@
+import os, time, bisect, threading, logging
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+
+# Ustawienia mozna nadpisac zmiennymi srodowiskowymi (.env)
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE', '')  # plik w formacie Prometheus (np. dla node_exporter textfile collector), pusty - bez pliku
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))  # port endpointu /metrics, 0 - bez endpointu
+
+# Granice przedziałów histogramów
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROWS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+HELP = {
+    'fetch_seconds': "Time of fetching a URL through the FetchEngine (with waiting for the host budget)",
+    'http_request_seconds': "Time of an HTTP request including retries",
+    'http_responses_total': "HTTP responses by status (every attempt)",
+    'http_retries_total': "Retried HTTP requests by reason",
+    'http_response_bytes_total': "Bytes of the received response bodies",
+    'parse_seconds': "Time of extracting the offer data from a listing page",
+    'transform_seconds': "Time of transforming the offer data",
+    'db_statement_seconds': "Time of database statements",
+    'db_batch_rows': "Rows written per batch",
+    'offers_total': "Offers found by the crawls by result (new, changed, closed)",
+    'db_pool_wait_seconds': "Time of waiting for a connection from the database pool",
+    'db_pool_connections': "Connections of the database pool by state (in_use, idle)",
+    'db_pool_timeouts_total': "Waits for a pool connection that ran out of time",
+    'db_pool_discarded_total': "Pool connections closed instead of being reused, by reason",
+}
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = key + extra
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets (Prometheus semantics), one series per set of labels
+    """
+
+    def __init__(self, name: str, buckets: tuple = SECONDS_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self.series = {}  # klucz etykiet -> [liczniki przedziałów (+Inf na końcu), suma, liczba]
+
+    def observe(self, value: float, key: tuple):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def quantile(self, key: tuple, q: float) -> float:
+        """
+        Upper bound of the bucket containing the q-quantile (an estimate, as in histogram_quantile())
+        """
+        counts, _, count = self.series[key]
+        rank = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    In-process registry of counters and histograms of the scraper
+
+    Values can be exported in the Prometheus text format: written to a file (render() / write_textfile(),
+    for the textfile collector of node_exporter) or served on a local /metrics endpoint (start_server()),
+    and summarized in the log at the end of a run (summary())
+    """
+
+    def __init__(self):
+        self.counters = {}  # nazwa -> {klucz etykiet -> wartość}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, buckets: tuple = SECONDS_BUCKETS, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(name, buckets)
+            histogram.observe(value, key)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Measures the time of the `with` block in the histogram name (also when the block raises)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                for name, series in sorted(values.items()):
+                    if name in HELP:
+                        lines.append(f"# HELP {name} {HELP[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    lines.extend(f"{name}{_format_labels(key)} {value}" for key, value in sorted(series.items()))
+            for name, histogram in sorted(self.histograms.items()):
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: str = METRICS_TEXTFILE):
+        """
+        Writes the metrics to a file (through a temporary file, so a reader never sees a partial file)
+        """
+        if not path:
+            return
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except OSError as error:
+            logger.error(f"Error during writing metrics to {path}: {error}")
+
+    def start_server(self, port: int = METRICS_PORT, host: str = '127.0.0.1'):
+        """
+        Serves the metrics on http://host:port/metrics in a background thread
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Metryki dostępne na http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def summary(self) -> list:
+        """
+        Returns lines summarizing the run: total time, count, mean and p50/p95 of every histogram series
+        (times first, sorted by the total time) and the values of the counters and gauges
+        """
+        lines = []
+        with self._lock:
+            rows = []
+            for name, histogram in self.histograms.items():
+                for key, (_, total, count) in histogram.series.items():
+                    rows.append((not name.endswith('_seconds'), -total, f"{name}{_format_labels(key)}", count,
+                                 histogram.quantile(key, 0.5), histogram.quantile(key, 0.95)))
+            # najpierw czasy, od największego łącznego czasu
+            for _, total, series_name, count, p50, p95 in sorted(rows):
+                total = -total
+                lines.append(f"{series_name}: {count} x, łącznie {total:.2f}, średnio {total / count:.4f}, p50 <= {p50}, p95 <= {p95}")
+            for name, series in sorted({**self.counters, **self.gauges}.items()):
+                lines.append(f"{name}: " + ', '.join(f"{_format_labels(key) or 'total'}={value:g}" for key, value in sorted(series.items())))
+        return lines
+
+
+metrics = Metrics()
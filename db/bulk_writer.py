@@ -0,0 +1,174 @@
+import os, time, logging
+from psycopg2.extras import execute_values
+from db.db_operations import LISTING_COLUMNS, FEATURES, get_listing_values, get_features_values, insert_photos, insert_new_listing
+from db.locations import get_location_resolver
+from config.metrics import metrics, ROWS_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+# Ustawienia mozna nadpisac zmiennymi srodowiskowymi (.env)
+BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', 50))  # liczba ofert zapisywanych w jednej transakcji
+FLUSH_INTERVAL = float(os.getenv('DB_FLUSH_INTERVAL', 60))  # maksymalny czas (s) oczekiwania oferty w buforze
+
+
+def _offer_key(otodom_listing_id, area) -> tuple:
+    return otodom_listing_id, round(float(area), 2) if area is not None else None
+
+
+class ListingWriter:
+    """
+    Buffers transformed offers and writes them to the database in batches
+
+    Each flush writes the whole batch (listings, features and photos) with multi-row INSERTs
+    (execute_values) in a single transaction, location ids come from the LocationResolver cache, instead of several INSERTs and a commit per
+    listing. The buffer is flushed when it reaches batch_size offers, when the oldest buffered offer
+    waits longer than flush_interval seconds, or explicitly with flush() (also on leaving `with`)
+
+    If a batch fails, it is rolled back and its offers are inserted one by one with insert_new_listing(),
+    so one broken offer does not drop the whole batch. Inserts are idempotent: an offer that is already
+    in the database (same otodom listing id and area) is skipped, so a batch repeated after a crash
+    does not create duplicates
+
+    Args:
+        conn (connection): psycopg2 connection used for writing
+        batch_size (int): Number of offers written in one transaction
+        flush_interval (float): Maximum time (s) an offer can wait in the buffer
+        location_resolver (LocationResolver): Location cache, the shared one by default
+    """
+
+    def __init__(self, conn, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 location_resolver=None):
+        self.conn = conn
+        self.location_resolver = location_resolver or get_location_resolver()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer = []
+        self._buffered_keys = set()
+        self._first_buffered_at = None
+
+        # statystyki zapisu
+        self.listings_written = 0
+        self.rows_written = 0
+        self.write_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_written / self.write_seconds if self.write_seconds else 0.0
+
+    def add(self, offer_data: dict) -> list:
+        """
+        Adds a transformed offer (result of transform_data()) to the buffer, flushing it if needed
+
+        Returns:
+            list: (otodom listing id, id in db) tuples of the offers written by this call (empty if there was no flush)
+        """
+        key = _offer_key(offer_data['listing_id'], offer_data['area'])
+        # ta sama oferta moze pojawic sie na dwoch stronach wyszukiwania (przesuniecie przez nowe oferty)
+        if key in self._buffered_keys:
+            logger.debug("Oferta %s jest już w buforze zapisu, pomijam", offer_data['listing_id'])
+            return []
+
+        self._buffer.append(offer_data)
+        self._buffered_keys.add(key)
+        if self._first_buffered_at is None:
+            self._first_buffered_at = time.monotonic()
+
+        if len(self._buffer) >= self.batch_size or self.is_flush_due():
+            return self.flush()
+        return []
+
+    def is_flush_due(self) -> bool:
+        return self._first_buffered_at is not None and time.monotonic() - self._first_buffered_at >= self.flush_interval
+
+    def flush(self) -> list:
+        """
+        Writes all buffered offers to the database in one transaction
+
+        Returns:
+            list: (otodom listing id, id in db) tuples of the written offers
+        """
+        if not self._buffer:
+            return []
+
+        batch = self._buffer
+        self._buffer = []
+        self._buffered_keys = set()
+        self._first_buffered_at = None
+
+        start = time.perf_counter()
+        cur = self.conn.cursor()
+        try:
+            created, rows = self._write_batch(cur, batch)
+            self.conn.commit()
+            self.location_resolver.confirm()
+        except Exception as error:
+            self.conn.rollback()
+            self.location_resolver.rollback()
+            logger.exception(f"Error during writing batch of {len(batch)} listings, inserting one by one: {error}")
+            created, rows = self._write_one_by_one(cur, batch)
+        finally:
+            cur.close()
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('db_statement_seconds', elapsed, statement='listing_batch')
+        metrics.observe('db_batch_rows', rows, buckets=ROWS_BUCKETS, statement='listing_batch')
+        self.listings_written += len(created)
+        self.rows_written += rows
+        self.write_seconds += elapsed
+        logger.info(f"Zapisano w bazie {len(created)} ofert ({rows} wierszy) w {elapsed:.2f} s")
+
+        return created
+
+    def _write_batch(self, cur, batch: list) -> tuple:
+        listing_query = f"""
+            INSERT INTO apartments_sale_listings ({', '.join(LISTING_COLUMNS)})
+            VALUES %s
+            ON CONFLICT (otodom_listing_id, area) DO NOTHING
+            RETURNING id, otodom_listing_id, area
+            ;"""
+        listing_rows = [get_listing_values(offer, self.location_resolver.resolve_offer(cur, offer)) for offer in batch]
+        returned = execute_values(cur, listing_query, listing_rows, page_size=len(listing_rows), fetch=True)
+        ids_by_key = {_offer_key(otodom_listing_id, area): id for id, otodom_listing_id, area in returned}
+
+        # oferty, które juz były w bazie, nie są zwracane przez RETURNING - pomijamy je (razem z cechami i zdjęciami)
+        inserted = [(offer, ids_by_key[_offer_key(offer['listing_id'], offer['area'])]) for offer in batch
+                    if _offer_key(offer['listing_id'], offer['area']) in ids_by_key]
+        if len(inserted) < len(batch):
+            logger.info(f"{len(batch) - len(inserted)} ofert z paczki jest już w bazie, pomijam")
+        batch = [offer for offer, _ in inserted]
+        listing_ids = [id for _, id in inserted]
+
+        features_query = f"""
+            INSERT INTO features (listing_id, {', '.join(FEATURES)})
+            VALUES %s
+            ON CONFLICT (listing_id) DO NOTHING
+            ;"""
+        features_rows = [get_features_values(offer, id) for offer, id in zip(batch, listing_ids)]
+        if features_rows:
+            execute_values(cur, features_query, features_rows, page_size=len(features_rows))
+
+        photos_rows = [(id, position, photo) for offer, id in zip(batch, listing_ids)
+                       for position, photo in enumerate(offer.get('images') or [])]
+        photos_written = insert_photos(cur, photos_rows)
+
+        created = [(offer['listing_id'], id) for offer, id in zip(batch, listing_ids)]
+        return created, len(listing_ids) + len(features_rows) + photos_written
+
+    def _write_one_by_one(self, cur, batch: list) -> tuple:
+        created, rows = [], 0
+        for offer in batch:
+            id_db = insert_new_listing(offer, self.conn, cur)
+            if id_db is None:
+                self.conn.rollback()
+                continue
+            created.append((offer['listing_id'], id_db))
+            rows += 2 + len(offer.get('images') or [])
+        return created, rows
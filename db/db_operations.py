@@ -1,160 +1,310 @@
-from db.db_setup import get_db_connection
+from db.locations import get_location_resolver
+from psycopg2.extras import execute_values
+from config.metrics import metrics, ROWS_BUCKETS
 import datetime, logging
 
-def check_location_table(cur, offer_data):
-    location_query = """
-        SELECT id FROM locations
-        WHERE voivodeship = %s 
-        AND city= %s 
-        AND (district = %s OR (district IS NULL AND %s IS NULL))
+logger = logging.getLogger(__name__)
+
+
+def categorize_offers(offers, cur) -> tuple:
+    """
+    Compares offers from the search results with the database in a single query and splits them into
+    new offers, offers with a changed price and unchanged offers
+
+    All (listing_id, area, price) tuples are sent to Postgres at once as a VALUES list and joined with
+    apartments_sale_listings, instead of two SELECTs per offer
+
+    Args:
+        offers (OfferBatch): Offers with 'listing_id', 'area', 'price', 'price_per_m', 'link'
+                             (scraper.offers.OfferBatch, e.g. one search page of iter_search_result_pages())
+        cur (cursor): Database cursor to execute SQL queries
+
+    Returns:
+        tuple: (new_offers, changed_offers, unchanged_offers)
+            - new_offers (list): offers (the input dictionaries) that are not in the database yet
+            - changed_offers (list): dictionaries with 'id' (the one from db), 'listing_id', 'old_price',
+              'new_price', 'new_price_per_m' - ready for update_active_offers()
+            - unchanged_offers (list): offers (the input dictionaries) with an up to date price
+    """
+    if not offers:
+        return [], [], []
+
+    diff_query = """
+        SELECT DISTINCT ON (v.idx) v.idx, asl.id, asl.updated_price,
+               (v.price IS NOT NULL AND asl.updated_price IS DISTINCT FROM v.price) AS price_changed
+        FROM (VALUES %s) AS v(idx, listing_id, area, price)
+        LEFT JOIN apartments_sale_listings asl
+            ON asl.otodom_listing_id = v.listing_id AND asl.area = v.area
+        ORDER BY v.idx, asl.id
         ;"""
-    location_values = (offer_data['voivodeship'], 
-                       offer_data['city'], 
-                       offer_data['district'],
-                       offer_data['district'])
 
-    cur.execute(location_query, location_values)
-    location_result = cur.fetchone()
+    diff_values = [(idx, listing_id, area, price)
+                   for idx, (listing_id, area, price, _, _) in enumerate(offers.rows())]
+    with metrics.timer('db_statement_seconds', statement='categorize_offers'):
+        rows = execute_values(cur, diff_query, diff_values, template="(%s, %s::bigint, %s::numeric, %s::bigint)",
+                              page_size=len(diff_values), fetch=True)
 
-    return location_result
+    new_offers, changed_offers, unchanged_offers = [], [], []
+    for idx, id_db, old_price, price_changed in rows:
+        offer = offers[idx]  # słownik tworzony z kolumn OfferBatch
+        if id_db is None:
+            new_offers.append(offer)
+        elif price_changed:
+            changed_offers.append({"id": id_db,
+                                   "listing_id": offer['listing_id'],
+                                   "old_price": old_price,
+                                   "new_price": offer['price'],
+                                   "new_price_per_m": offer['price_per_m']})
+        else:
+            unchanged_offers.append(offer)
 
+    logger.info(f"Porównanie z bazą: {len(new_offers)} nowych ofert, {len(changed_offers)} ze zmienioną ceną, {len(unchanged_offers)} bez zmian")
 
-def insert_into_locations_table(cur, offer_data):
-    # sprawdzenie czy lokalizacja już istnieje w bazie danych
-    location_result = check_location_table(cur, offer_data)
-    # jezeli nie istnieje to dodajemy do tabeli
-    if not location_result:
-        location_values = (offer_data['voivodeship'], 
-                           offer_data['city'], 
-                           offer_data['district'])
-        
+    return new_offers, changed_offers, unchanged_offers
 
-        logging.debug(f"Czy lokalizacja {location_values} znajduje się już w locations?: NIE")
 
-        location_query = """
-            INSERT INTO locations (voivodeship, city, district)
-            VALUES (%s, %s, %s)
-            RETURNING id
-            ;"""
-        
-        cur.execute(location_query, location_values)
-        new_id = cur.fetchone()[0]
-        logging.debug(f"Nadane ID lokalizacji w tabeli locations: {new_id}")
-        
-    else:
-        logging.debug(f"Czy lokalizacja znajduje się już w locations?: TAK, pod id {location_result}")
+def _copy_text(value) -> str:
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class _CopyRowsFile:
+    """
+    File-like object for COPY ... FROM STDIN producing the text lines of the rows only when they are read,
+    so the whole input is never built in memory
+    """
+
+    def __init__(self, rows):
+        self._lines = ('\t'.join(_copy_text(value) for value in row) + '\n' for row in rows)
+        self._buffer = ''
+
+    def read(self, size: int = -1) -> str:
+        chunks, length = [self._buffer], len(self._buffer)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = ''.join(chunks)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(cur, table: str, columns: tuple, rows) -> int:
+    """
+    Loads rows into a table with a single COPY ... FROM STDIN (the rows are sent in chunks as they are generated)
+
+    Args:
+        cur (cursor): Database cursor to execute SQL queries
+        table (str): Target table
+        columns (tuple): Target columns
+        rows (iterable): Tuples of values in the order of columns
+
+    Returns:
+        int: Number of loaded rows
+    """
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", _CopyRowsFile(rows))
+    return cur.rowcount
 
 
 created_offer_id = None
 
-def insert_into_apartments_sale_listings_table(cur, offer_data):
-    location_id = check_location_table(cur, offer_data)
-    listing_query = """
-        INSERT INTO apartments_sale_listings (otodom_listing_id, title, market, advert_type, 
-        creation_date, creation_time, pushed_ap_at, exclusive_offer, creation_source, description_text, 
-        area, price, updated_price, price_per_m, updated_price_per_m, location_id, street, rent_amount, 
-        rooms_num, floor_num, heating, ownership, proper_type, construction_status, energy_certificate, 
-        building_build_year, building_floors_num,  building_material, building_type, windows_type,  
-        local_plan_url, video_url, view3d_url, walkaround_url, owner_id, owner_name, agency_id, 
-        agency_name, offer_link, active, closing_date)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 
-        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+LISTING_COLUMNS = ('otodom_listing_id', 'title', 'market', 'advert_type', 
+    'creation_date', 'creation_time', 'pushed_ap_at', 'exclusive_offer', 'creation_source', 'description_text', 
+    'area', 'price', 'updated_price', 'price_per_m', 'updated_price_per_m', 'location_id', 'street', 'rent_amount', 
+    'rooms_num', 'floor_num', 'heating', 'ownership', 'proper_type', 'construction_status', 'energy_certificate', 
+    'building_build_year', 'building_floors_num', 'building_material', 'building_type', 'windows_type', 
+    'local_plan_url', 'video_url', 'view3d_url', 'walkaround_url', 'owner_id', 'owner_name', 'agency_id', 
+    'agency_name', 'offer_link', 'active', 'closing_date')
+
+FEATURES = ('internet', 'cable_television', 'phone', 'roller_shutters', 
+            'anti_burglary_door', 'entryphone', 'monitoring', 'alarm', 
+            'closed_area', 'furniture', 'washing_machine', 'dishwasher', 
+            'fridge', 'stove', 'oven', 'tv', 'balcony', 'usable_room', 
+            'garage', 'basement', 'garden', 'terrace', 'lift', 'two_storey', 
+            'separate_kitchen', 'air_conditioning')
+
+
+def get_listing_values(offer_data, location_id):
+    """
+    Returns the values of one apartments_sale_listings row (in LISTING_COLUMNS order) for the transformed offer
+    """
+    return (offer_data['listing_id'],
+            offer_data['title'],
+            offer_data['market'],
+            offer_data['advert_type'],
+            offer_data['creation_date'],
+            offer_data['creation_time'],
+            offer_data['pushed_ap_at'],
+            offer_data['exclusive_offer'],
+            offer_data['creation_source'],
+            offer_data['description_text'],
+            offer_data['area'],
+            offer_data['price'],
+            offer_data['price'], # przy pierwszym wprowadzeniu podajemy tą samą cene
+            offer_data['price_per_m'],
+            offer_data['price_per_m'], # przy pierwszym wprowadzeniu podajemy tą samą cene
+            location_id,
+            offer_data['street'],
+            offer_data['rent_amount'],
+            offer_data['rooms_num'],
+            offer_data['floor_num'],
+            offer_data['heating'],
+            offer_data['ownership'],
+            offer_data['proper_type'],
+            offer_data['construction_status'],
+            offer_data['energy_certificate'],
+            offer_data['building_build_year'],
+            offer_data['building_floors_num'],
+            offer_data['building_material'],
+            offer_data['building_type'],
+            offer_data['windows_type'],
+            offer_data['local_plan_url'],
+            offer_data['video_url'],
+            offer_data['view3d_url'],
+            offer_data['walkaround_url'],
+            offer_data['owner_id'],
+            offer_data['owner_name'],
+            offer_data['agency_id'],
+            offer_data['agency_name'],
+            offer_data['offer_link'],
+            offer_data['active'],
+            offer_data['closing_date'])
+
+
+def get_features_values(offer_data, id):
+    """
+    Returns the values of one features row (listing id + one boolean per FEATURES entry) for the transformed offer
+    """
+    features_offer = list(offer_data['features'].split(' '))
+    features_bools=[feature in features_offer for feature in FEATURES]
+    return (id, *features_bools)
+
+
+def insert_into_apartments_sale_listings_table(cur, offer_data, location_id):
+    listing_query = f"""
+        INSERT INTO apartments_sale_listings ({', '.join(LISTING_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(LISTING_COLUMNS))})
+        ON CONFLICT (otodom_listing_id, area) DO NOTHING
         RETURNING id
         ;"""
     
-    listing_values = (offer_data['listing_id'],
-                      offer_data['title'],
-                      offer_data['market'],
-                      offer_data['advert_type'],
-                      offer_data['creation_date'],
-                      offer_data['creation_time'],
-                      offer_data['pushed_ap_at'],
-                      offer_data['exclusive_offer'],
-                      offer_data['creation_source'],
-                      offer_data['description_text'],
-                      offer_data['area'],
-                      offer_data['price'],
-                      offer_data['price'], # przy pierwszym wprowadzeniu podajemy tą samą cene
-                      offer_data['price_per_m'],
-                      offer_data['price_per_m'], # przy pierwszym wprowadzeniu podajemy tą samą cene
-                      location_id[0],
-                      offer_data['street'],
-                      offer_data['rent_amount'],
-                      offer_data['rooms_num'],
-                      offer_data['floor_num'],
-                      offer_data['heating'],
-                      offer_data['ownership'],
-                      offer_data['proper_type'],
-                      offer_data['construction_status'],
-                      offer_data['energy_certificate'],
-                      offer_data['building_build_year'],
-                      offer_data['building_floors_num'],
-                      offer_data['building_material'],
-                      offer_data['building_type'],
-                      offer_data['windows_type'],
-                      offer_data['local_plan_url'],
-                      offer_data['video_url'],
-                      offer_data['view3d_url'],
-                      offer_data['walkaround_url'],
-                      offer_data['owner_id'],
-                      offer_data['owner_name'],
-                      offer_data['agency_id'],
-                      offer_data['agency_name'],
-                      offer_data['offer_link'],
-                      offer_data['active'],
-                      offer_data['closing_date'])
+    listing_values = get_listing_values(offer_data, location_id)
     
     cur.execute(listing_query, listing_values)
     
-    created_offer_id = cur.fetchone()[0]
+    # brak id - oferta jest juz w bazie (np. zapisana przez przerwany wcześniej przebieg)
+    row = cur.fetchone()
+    created_offer_id = row[0] if row else None
 
     return created_offer_id
 
 
 def insert_into_features_table(cur, offer_data, id):
-    features_query = """
-        INSERT INTO features (listing_id, internet, cable_television, phone, roller_shutters, 
-        anti_burglary_door, entryphone, monitoring, alarm, closed_area, furniture, washing_machine, 
-        dishwasher, fridge, stove, oven, tv, balcony, usable_room, garage, basement, garden, terrace, 
-        lift, two_storey, separate_kitchen, air_conditioning)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 
-        %s, %s, %s, %s, %s, %s)
+    features_query = f"""
+        INSERT INTO features (listing_id, {', '.join(FEATURES)})
+        VALUES ({', '.join(['%s'] * (len(FEATURES) + 1))})
+        ON CONFLICT (listing_id) DO NOTHING
         ;"""
 
-    features_offer = list(offer_data['features'].split(' '))
-    features_all_possibilities = ('internet', 'cable_television', 'phone', 'roller_shutters', 
-                                  'anti_burglary_door', 'entryphone', 'monitoring', 'alarm', 
-                                  'closed_area', 'furniture', 'washing_machine', 'dishwasher', 
-                                  'fridge', 'stove', 'oven', 'tv', 'balcony', 'usable_room', 
-                                  'garage', 'basement', 'garden', 'terrace', 'lift', 'two_storey', 
-                                  'separate_kitchen', 'air_conditioning')
-    
-    features_bools=[feature in features_offer for feature in features_all_possibilities]
-    
-    features_values = (id, *features_bools)
+    features_values = get_features_values(offer_data, id)
     cur.execute(features_query, features_values)
 
 
+def find_known_photos(cur, image_urls: list) -> dict:
+    """
+    Returns the hashes of photos which were already downloaded from the given URLs
+
+    Args:
+        cur (cursor): Database cursor to execute SQL queries
+        image_urls (list): URLs of the photos of a listing
+
+    Returns:
+        dict: {url: hash} for the URLs that are already in photo_blobs
+    """
+    if not image_urls:
+        return {}
+
+    known_photos_query = """
+        SELECT DISTINCT ON (source_url) source_url, hash
+        FROM photo_blobs
+        WHERE source_url = ANY(%s)
+        ;"""
+    cur.execute(known_photos_query, (list(image_urls),))
+    return {url: bytes(hash) for url, hash in cur.fetchall()}
+
+
+def insert_photos(cur, photos_rows: list, page_size: int = 20) -> int:
+    """
+    Stores photos in the content-addressed store: each distinct image is saved once in photo_blobs
+    (keyed by its SHA-256 hash), photos only links listings to the hashes. The hashes are looked up
+    first, so only the images missing from photo_blobs are sent to the database
+
+    Args:
+        cur (cursor): Database cursor to execute SQL queries
+        photos_rows (list): (listing id, position, photo record) tuples, photo record as returned by
+                            scraper.photos.collect_photos() ({'url', 'hash', 'content'})
+        page_size (int): Number of images sent in one INSERT (images are large)
+
+    Returns:
+        int: Number of inserted rows (new blobs + photos)
+    """
+    if not photos_rows:
+        return 0
+
+    blobs = {}
+    for _, _, photo in photos_rows:
+        if photo['content'] is not None and photo['hash'] not in blobs:
+            blobs[photo['hash']] = (photo['hash'], photo['content'], photo['url'], len(photo['content']))
+
+    if blobs:
+        # obrazy, które są juz w magazynie (np. to samo zdjęcie pod nowym linkiem), nie są wysyłane do bazy
+        cur.execute("SELECT hash FROM photo_blobs WHERE hash = ANY(%s);", (list(blobs),))
+        for (hash,) in cur.fetchall():
+            blobs.pop(bytes(hash), None)
+
+    if blobs:
+        blobs_query = """
+            INSERT INTO photo_blobs (hash, photo, source_url, size)
+            VALUES %s
+            ON CONFLICT (hash) DO NOTHING
+            ;"""
+        execute_values(cur, blobs_query, list(blobs.values()), page_size=page_size)
+
+    photos_query = """
+        INSERT INTO photos (listing_id, photo_hash, position)
+        VALUES %s
+        ;"""
+    photos_values = [(id, photo['hash'], position) for id, position, photo in photos_rows]
+    execute_values(cur, photos_query, photos_values, page_size=max(len(photos_values), 1))
+
+    return len(blobs) + len(photos_values)
+
+
 def insert_into_photos_table(cur, offer_data, id):
     if offer_data["images"]:
-        photos_query = """
-            INSERT INTO photos (listing_id, photo)
-            VALUES (%s, %s)
-            ;"""    
-        
-        for photo in offer_data["images"]:
-            photo_values = (id, photo)
-            cur.execute(photos_query, photo_values)
+        insert_photos(cur, [(id, position, photo) for position, photo in enumerate(offer_data["images"])])
 
 
 def insert_new_listing(offer_data, conn, cur):
 
+    location_resolver = get_location_resolver()
     try:
-        # TABELA locations
-        insert_into_locations_table(cur, offer_data)
+        # TABELA locations (z pamięci podręcznej, zapytanie tylko dla nowej lokalizacji)
+        location_id = location_resolver.resolve_offer(cur, offer_data)
 
         # TABELA apartments_sale_listings
-        created_offer_id = insert_into_apartments_sale_listings_table(cur, offer_data)
+        created_offer_id = insert_into_apartments_sale_listings_table(cur, offer_data, location_id)
+        if created_offer_id is None:
+            logger.info(f"Oferta {offer_data['listing_id']} jest już w bazie, pomijam")
+            conn.commit()
+            location_resolver.confirm()
+            return None
 
         # TABELA features
         insert_into_features_table(cur, offer_data, created_offer_id)
@@ -162,14 +312,17 @@ def insert_new_listing(offer_data, conn, cur):
         # TABELA photos
         insert_into_photos_table(cur, offer_data, created_offer_id)
 
-        logging.debug(f"Oferta zapisana w bazie pod id = {created_offer_id}")
+        logger.debug("Oferta zapisana w bazie pod id = %s", created_offer_id)
 
         conn.commit()
+        location_resolver.confirm()
         
         return created_offer_id
     
     except Exception as error:
-        logging.exception(f"Error during inserting new listing: {error}")
+        logger.exception(f"Error during inserting new listing: {error}")
+        conn.rollback()
+        location_resolver.rollback()
 
 
 
@@ -189,9 +342,9 @@ def update_price_in_listings_table(data, cur):
         update_price_values = (new_price, new_price_per_m, id)
         cur.execute(update_price_query, update_price_values)
         
-        logging.debug(f"BAZA: update oferty {id} w apartments_sale_listings: nowa cena - {new_price}, nowa cena za m2 - {new_price_per_m}")
+        logger.debug("BAZA: update oferty %s w apartments_sale_listings: nowa cena - %s, nowa cena za m2 - %s", id, new_price, new_price_per_m)
     except Exception as error:
-        logging.exception(f"Error during updating price in listings_table: {error}")
+        logger.exception(f"Error during updating price in listings_table: {error}")
 
 
 def update_price_in_history_table(data, cur):
@@ -200,8 +353,9 @@ def update_price_in_history_table(data, cur):
         new_price = data.get("new_price")
         change_date = datetime.date.today()
 
+        # cena sprzed zmiany - wywoływane przed update_price_in_listings_table()
         old_price_query = """
-            SELECT price
+            SELECT updated_price
             FROM apartments_sale_listings
             WHERE id = %s
             ;"""
@@ -218,45 +372,112 @@ def update_price_in_history_table(data, cur):
         cur.execute(insert_history_query, update_history_values)
         id_history_table = cur.fetchone()[0]
 
-        logging.debug(f"BAZA: update oferty {id} w price_history pod id {id_history_table}")
+        logger.debug("BAZA: update oferty %s w price_history pod id %s", id, id_history_table)
 
     except Exception as error:
-        logging.exception(f"Error during updating price in price_history table: {error}")
+        logger.exception(f"Error during updating price in price_history table: {error}")
 
 
 def update_active_offers(data, conn, cur):
+    """
+    Applies the price change of a single offer (four statements and a commit), the crawls use apply_price_changes()
+    """
     try:
-        update_price_in_listings_table(data, cur)
-        update_price_in_history_table(data, cur)
-
-        conn.commit()
+        with metrics.timer('db_statement_seconds', statement='update_active_offers'):
+            update_price_in_history_table(data, cur)
+            update_price_in_listings_table(data, cur)
+            conn.commit()
         
     except Exception as error:
-        logging.exception(f"Error during updating active offers: {error}")
+        logger.exception(f"Error during updating active offers: {error}")
+
+
+def apply_price_changes(changed_offers: list, conn, cur) -> int:
+    """
+    Applies the price changes of a crawl in one transaction with two statements: an INSERT INTO price_history
+    ... SELECT recording the current price of every offer as the old price, then an UPDATE ... FROM (VALUES ...)
+    setting the new prices
+
+    Offers whose current price already equals the new one are skipped by both statements, so applying the
+    same changes again (e.g. after a resumed crawl) does not add history rows
+
+    Args:
+        changed_offers (list): Dictionaries with 'id' (the one from db), 'new_price', 'new_price_per_m'
+                               (changed_offers of categorize_offers())
+        conn (connection): Database connection
+        cur (cursor): Database cursor to execute SQL queries
+
+    Returns:
+        int: Number of offers with an updated price
+    """
+    # ta sama oferta mogła trafić na dwie strony wyników - zostaje ostatnia cena
+    changes = {offer['id']: (offer['id'], offer['new_price'], offer['new_price_per_m']) for offer in changed_offers}
+    if not changes:
+        return 0
+    values = list(changes.values())
+    template = "(%s::int, %s::bigint, %s::numeric)"
+
+    insert_history_query = """
+        INSERT INTO price_history (listing_id, old_price, new_price, change_date)
+        SELECT asl.id, asl.updated_price, v.new_price, CURRENT_DATE
+        FROM (VALUES %s) AS v(id, new_price, new_price_per_m)
+        JOIN apartments_sale_listings asl ON asl.id = v.id
+        WHERE asl.updated_price IS DISTINCT FROM v.new_price
+        ;"""
+
+    update_price_query = """
+        UPDATE apartments_sale_listings asl
+        SET updated_price = v.new_price, updated_price_per_m = v.new_price_per_m
+        FROM (VALUES %s) AS v(id, new_price, new_price_per_m)
+        WHERE asl.id = v.id AND asl.updated_price IS DISTINCT FROM v.new_price
+        ;"""
+
+    try:
+        with metrics.timer('db_statement_seconds', statement='apply_price_changes'):
+            execute_values(cur, insert_history_query, values, template=template, page_size=len(values))
+            execute_values(cur, update_price_query, values, template=template, page_size=len(values))
+            updated = cur.rowcount
+            conn.commit()
+        metrics.observe('db_batch_rows', len(values), buckets=ROWS_BUCKETS, statement='apply_price_changes')
+        logger.debug("BAZA: nowe ceny %s ofert zapisane", updated)
+        return updated
+
+    except Exception as error:
+        conn.rollback()
+        logger.exception(f"Error during applying price changes: {error}")
+        return 0
  
 
-def update_deleted_offers(offer_data, conn, cur):
-    """" 
-    offer_data = krotka(1. ID (nadane w bazie), 2. status ofert, które zostały usunięte z otodom)
-    
+def update_deleted_offers(deleted_offers, conn, cur):
+    """
+    Marks closed offers as inactive (with today's closing date) with a single UPDATE
+
+    Args:
+        deleted_offers (set): Tuples (1. ID (nadane w bazie), 2. status ofert, które zostały usunięte z otodom),
+                              result of find_closed_offers()
+        conn (connection): Database connection
+        cur (cursor): Database cursor to execute SQL queries
     """
     try:
+        ids_db = [offer_data[0] for offer_data in deleted_offers]
+        if not ids_db:
+            return
 
         update_inactive_query = """
         UPDATE apartments_sale_listings
         SET active = %s, closing_date = %s
-        WHERE id = %s
+        WHERE id = ANY(%s)
         ;"""
 
         current_date = datetime.date.today()
-        id_db = offer_data[0]
-        update_inactive_values = (False, current_date, id_db)
-        cur.execute(update_inactive_query, update_inactive_values)
+        update_inactive_values = (False, current_date, ids_db)
+        with metrics.timer('db_statement_seconds', statement='update_deleted_offers'):
+            cur.execute(update_inactive_query, update_inactive_values)
 
-        logging.debug(f"W ofercie {id_db} zmieniono wartość 'active' na 'false' z datą {current_date} w kolumnie 'closing_date")
+        logger.debug("W ofertach %s zmieniono wartość 'active' na 'false' z datą %s w kolumnie 'closing_date", ids_db, current_date)
 
         conn.commit()
         
     except Exception as error:
-        logging.exception(f"Error during updating deleted offers: {error}")
-
+        conn.rollback()
+        logger.exception(f"Error during updating deleted offers: {error}")
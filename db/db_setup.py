@@ -1,6 +1,8 @@
-import psycopg2, os, logging
+import psycopg2, psycopg2.errors, os, re, logging
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 
 # Wymagany zainstalowany PostgreSQL oraz utworzona baza apartments_for_sale
 # Utworzenie bazy:
@@ -12,14 +14,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+# Migracje schematu: pliki NNNN_opis.sql, wykonywane po kolei, kazda raz (wersje zapisane w schema_migrations)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+# Klucz blokady (pg_advisory_xact_lock), kilka procesów uruchomionych naraz nie wykona migracji dwa razy
+MIGRATIONS_LOCK_KEY = 71_405_301
+
+
 # ustawienie połączenia z bazą danych 
-def get_db_connection():
+def get_db_connection(**kwargs):
     """
     Establishes a connection to the PostgreSQL database using credentials from environment variables
     
     Reads the database connection settings from the environment variables
     (DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT) and uses them to establish a 
-    connection to the PostgreSQL 
+    connection to the PostgreSQL. The scraper takes its connections from the pool in db/pool.py
+
+    Args:
+        **kwargs: Additional connection parameters for psycopg2.connect (e.g. options)
 
     Returns:
         connection: psycopg2 connection object, or None if connection fails
@@ -35,68 +47,89 @@ def get_db_connection():
             dbname=os.getenv('DB_NAME'),
             user=os.getenv('DB_USER'),
             password=os.getenv('DB_PASSWORD'),
-            port=os.getenv('DB_PORT')
+            port=os.getenv('DB_PORT'),
+            **kwargs
         )
-        logging.debug(f"Connected to database {os.getenv('DB_NAME')}")
+        logger.debug("Connected to database %s", os.getenv('DB_NAME'))
         return connection
     except Exception as error:
-        logging.debug(f"Error while connecting to database: {error}")
+        logger.error(f"Error while connecting to database: {error}")
     return connection
 
 
-# Utworzenie tabel
-def create_tables(cur):
+def load_migrations(directory: str = MIGRATIONS_DIR) -> list:
     """
-    Creates the necessary tables for storing apartment listings, price history, photos, and features in the database
-    
-    This function checks if the required tables (`locations`, `apartments_sale_listings`, `price_history`, 
-    `photos`, `features`) already exist in the database. If they do not exist, it reads SQL commands from a 
-    file (db/schema.sql) and executes them to create the tables
+    Returns the migrations from the directory as (version, name, sql) tuples sorted by version
+    """
+    migrations = []
+    for file_name in os.listdir(directory):
+        match = re.fullmatch(r'(\d+)_(\w+)\.sql', file_name)
+        if match:
+            with open(os.path.join(directory, file_name), 'r', encoding='utf-8') as f:
+                migrations.append((int(match.group(1)), match.group(2), f.read()))
+    return sorted(migrations)
 
-    The schema.sql file should contain the SQL scripts for creating these tables
 
-    Raises:
-        Exception: If an error occurs during the table creation process
+def get_schema_version(cur) -> int:
+    """
+    Returns the version of the last applied migration, 0 if no migration was applied yet
     """
     try:
-        conn = get_db_connection()
-        if conn is None:
-            logging.error("Connection to the databas failed")
-            return
-    
-        cur=conn.cursor()
-
-        # Sprawdź czy tabele juz nie istnieja
-        def check_table_exists(cur, table_name):
-            checking_query = """
-                SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = %s);
-                """
-            cur.execute(checking_query, (table_name,)) #argumenty w zapytaniach muszą byv przekazane jako krotka lub lista
-            result = cur.fetchone()
-            return result[0] # true/false
-        
-        tables = ['locations', 'apartments_sale_listings', 'price_history', 'photos', 'features']
-        
-        flag = any(check_table_exists(cur, name) for name in tables)
-        if not flag:
-            try:
-                with open('db/schema.sql', 'r') as f:
-                    sql_script = f.read()
-                
-                sql_commands = sql_script.split(";")
-                for command in sql_commands:
-                    if command.strip():
-                        cur.execute(command.strip())
-                
-                conn.commit()
-                logging.info(f"Tables {tables} created")
-            except Exception as error:
-                logging.exception(f"Error during creating tables: {error}")
+        cur.execute("SELECT max(version) FROM schema_migrations;")
+        return cur.fetchone()[0] or 0
+    except psycopg2.errors.UndefinedTable:
+        cur.connection.rollback()
+        return 0
 
-    except Exception as error:
-        logging.exception(f"Error during creating tables in database: {error}")
 
+# Utworzenie / aktualizacja schematu
+def create_tables(cur, migrations: list = None):
+    """
+    Brings the database schema up to date by applying the pending migrations from db/migrations
+
+    At startup it costs a single query (version of the last applied migration) when the schema is current.
+    Every pending migration runs in its own transaction together with its entry in schema_migrations,
+    under an advisory lock, so a failed migration leaves the schema at the previous version and concurrent
+    starts do not apply a migration twice. The first migrations use IF NOT EXISTS, so a database created
+    before the migrations were introduced is adopted without changes to its data
+
+    Args:
+        cur (cursor): Database cursor, its connection is committed after every migration
+        migrations (list): (version, name, sql) tuples, load_migrations() by default
+
+    Raises:
+        Exception: If a migration fails (the schema is not usable by this version of the scraper)
+    """
+    conn = cur.connection
+    migrations = load_migrations() if migrations is None else migrations
+    latest = migrations[-1][0] if migrations else 0
+
+    version = get_schema_version(cur)
+    conn.commit()
+    if version >= latest:
+        logger.debug("Schemat bazy aktualny (wersja %s)", version)
+        return
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        );""")
+    conn.commit()
+
+    for migration_version, name, sql in migrations:
+        if migration_version <= version:
+            continue
+        try:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATIONS_LOCK_KEY,))
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s;", (migration_version,))
+            if cur.fetchone() is None:  # inny proces mógł ją wykonać, gdy czekaliśmy na blokadę
+                cur.execute(sql)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (migration_version, name))
+                logger.info(f"Migracja schematu {migration_version:04d}_{name} wykonana")
+            conn.commit()
+        except Exception as error:
+            conn.rollback()
+            logger.error(f"Error during migration {migration_version:04d}_{name}: {error}")
+            raise
@@ -0,0 +1,124 @@
+import threading, logging
+
+logger = logging.getLogger(__name__)
+
+# Białe znaki usuwane z brzegów nazw lokalizacji - te same co btrim() w locations_unique_idx (migracja 0003)
+LOCATION_WHITESPACE = ' \t\n\r'
+
+
+def normalize_location(voivodeship: str, city: str, district: str) -> tuple:
+    """
+    Returns the (voivodeship, city, district) key used for location lookups - stripped, lowercase
+    and with None treated as an empty string (the same normalization as locations_unique_idx)
+    """
+    return tuple((value or '').strip(LOCATION_WHITESPACE).lower() for value in (voivodeship, city, district))
+
+
+class LocationResolver:
+    """
+    In-process cache of the locations table
+
+    The whole table is loaded once (for one city it is a few dozen rows) into a dict keyed by the
+    normalized (voivodeship, city, district) triple. A miss is resolved with a single
+    INSERT ... ON CONFLICT ... RETURNING id backed by locations_unique_idx, so inserting a listing
+    does not query the locations table at all once its location is known
+
+    Locations inserted in a transaction that was rolled back must be forgotten, so writers call
+    confirm() after commit and rollback() after rollback. Several threads (each with its own
+    connection) may share the resolver - a location inserted by another thread is not used until
+    that thread commits it
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._pending = {}  # klucz lokalizacji -> wątek, który ją wstawił (jeszcze bez commit)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, cur):
+        """
+        Loads the locations table into the cache (the lowest id wins for duplicated triples)
+        """
+        cur.execute("SELECT id, voivodeship, city, district FROM locations ORDER BY id DESC;")
+        with self._lock:
+            self._ids = {normalize_location(voivodeship, city, district): id for id, voivodeship, city, district in cur.fetchall()}
+            self._pending = {}
+            self._loaded = True
+        logger.debug("Załadowano %s lokalizacji do pamięci", len(self._ids))
+
+    def resolve(self, cur, voivodeship: str, city: str, district: str) -> int:
+        """
+        Returns the id of the location, inserting it if it is not in the table yet
+
+        Args:
+            cur (cursor): Database cursor, used only when the location is not cached
+            voivodeship (str), city (str), district (str): The location
+
+        Returns:
+            int: The location id
+        """
+        if not self._loaded:
+            self.load(cur)
+
+        key = normalize_location(voivodeship, city, district)
+        thread = threading.get_ident()
+        with self._lock:
+            id = self._ids.get(key)
+            if id is not None and self._pending.get(key, thread) == thread:
+                return id
+
+        # poza blokadą - jezeli inny wątek wstawił tę lokalizację i nie zrobił jeszcze commit,
+        # zapytanie poczeka na jego transakcję
+        insert_query = """
+            INSERT INTO locations (voivodeship, city, district)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (lower(btrim(COALESCE(voivodeship, ''), E' \\t\\n\\r')),
+                         lower(btrim(COALESCE(city, ''), E' \\t\\n\\r')),
+                         lower(btrim(COALESCE(district, ''), E' \\t\\n\\r')))
+            DO UPDATE SET voivodeship = locations.voivodeship
+            RETURNING id, (xmax = 0) AS inserted
+            ;"""
+        values = tuple(value.strip(LOCATION_WHITESPACE) if isinstance(value, str) else value
+                       for value in (voivodeship, city, district))
+        cur.execute(insert_query, values)
+        id, inserted = cur.fetchone()
+
+        with self._lock:
+            self._ids[key] = id
+            if inserted:
+                self._pending[key] = thread
+            else:
+                self._pending.pop(key, None)
+        logger.debug("Lokalizacja %s zapisana w locations pod id %s", values, id)
+        return id
+
+    def resolve_offer(self, cur, offer_data: dict) -> int:
+        return self.resolve(cur, offer_data['voivodeship'], offer_data['city'], offer_data['district'])
+
+    def confirm(self):
+        """
+        Marks the locations inserted by the current thread since its last confirm()/rollback() as committed
+        """
+        thread = threading.get_ident()
+        with self._lock:
+            self._pending = {key: owner for key, owner in self._pending.items() if owner != thread}
+
+    def rollback(self):
+        """
+        Forgets the locations inserted by the current thread in a transaction that was rolled back
+        """
+        thread = threading.get_ident()
+        with self._lock:
+            for key in [key for key, owner in self._pending.items() if owner == thread]:
+                self._ids.pop(key, None)
+                del self._pending[key]
+
+
+_resolver = LocationResolver()
+
+
+def get_location_resolver() -> LocationResolver:
+    """
+    Returns the shared LocationResolver (loaded on first use or explicitly with load() at startup)
+    """
+    return _resolver
@@ -1,11 +1,14 @@
-CREATE TABLE locations (
+-- Schemat bazy: tabele ofert, lokalizacji, historii cen, zdjęć i cech
+-- (IF NOT EXISTS - bazy utworzone przed wprowadzeniem migracji mają juz te tabele)
+
+CREATE TABLE IF NOT EXISTS locations (
     id SERIAL PRIMARY KEY, -- ID Tabeli locations
     voivodeship TEXT,  -- Województwo
     city TEXT,  -- Miasto
     district TEXT  -- Dzielnica
 );
 
-CREATE TABLE apartments_sale_listings (
+CREATE TABLE IF NOT EXISTS apartments_sale_listings (
     id SERIAL PRIMARY KEY,
     otodom_listing_id BIGINT, -- ID oferty (z otodom)
     title TEXT, -- Tytuł
@@ -51,7 +54,7 @@ CREATE TABLE apartments_sale_listings (
     FOREIGN KEY(location_id) REFERENCES locations(id)
 );
 
-CREATE TABLE price_history (
+CREATE TABLE IF NOT EXISTS price_history (
     id SERIAL PRIMARY KEY, -- ID tabeli price_history
     listing_id BIGINT, -- ID oferty
     old_price INT, -- Poprzednia cena
@@ -60,14 +63,25 @@ CREATE TABLE price_history (
     FOREIGN KEY (listing_id) REFERENCES apartments_sale_listings(id) -- Ustanowienie ID oferty kluczem obcym 
 );
 
-CREATE TABLE photos (
+CREATE TABLE IF NOT EXISTS photo_blobs ( -- Magazyn zdjęć adresowany treścią, kazde zdjęcie zapisane jest tylko raz
+    hash BYTEA PRIMARY KEY, -- SHA-256 zawartości zdjęcia
+    photo BYTEA, -- Zdjęcie
+    source_url TEXT, -- Link, z którego zdjęcie zostało pobrane za pierwszym razem
+    size INT -- Rozmiar w bajtach
+);
+
+CREATE INDEX IF NOT EXISTS photo_blobs_source_url_idx ON photo_blobs (source_url);
+
+CREATE TABLE IF NOT EXISTS photos (
     id SERIAL PRIMARY KEY, -- ID tabeli photos
     listing_id BIGINT, -- ID oferty
-    photo BYTEA, -- Zdjęcie
-    FOREIGN KEY (listing_id) REFERENCES apartments_sale_listings(id) -- Ustanowienie ID oferty kluczem obcym 
+    photo_hash BYTEA, -- Zdjęcie (klucz w photo_blobs)
+    position INT, -- Kolejność zdjęcia w ogłoszeniu
+    FOREIGN KEY (listing_id) REFERENCES apartments_sale_listings(id), -- Ustanowienie ID oferty kluczem obcym 
+    FOREIGN KEY (photo_hash) REFERENCES photo_blobs(hash)
 );
 
-CREATE TABLE features ( -- Oznaczenie cech mieszkania, jeden wiersz == jedno ogłoszenie
+CREATE TABLE IF NOT EXISTS features ( -- Oznaczenie cech mieszkania, jeden wiersz == jedno ogłoszenie
     listing_id BIGINT PRIMARY KEY, --  
     internet BOOLEAN,
     cable_television BOOLEAN,
@@ -97,4 +111,3 @@ CREATE TABLE features ( -- Oznaczenie cech mieszkania, jeden wiersz == jedno og
     air_conditioning BOOLEAN,
     FOREIGN KEY (listing_id) REFERENCES apartments_sale_listings(id)  
 );
-
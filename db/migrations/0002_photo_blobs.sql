@@ -0,0 +1,22 @@
+-- Przeniesienie zdjęć zapisanych w photos.photo (starszy schemat) do magazynu photo_blobs,
+-- photos przechowuje tylko hash i kolejność zdjęcia (w nowych bazach nic nie robi)
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'photos' AND column_name = 'photo') THEN
+        ALTER TABLE photos ADD COLUMN IF NOT EXISTS photo_hash BYTEA REFERENCES photo_blobs(hash);
+        ALTER TABLE photos ADD COLUMN IF NOT EXISTS position INT;
+
+        INSERT INTO photo_blobs (hash, photo, size)
+        SELECT sha256(photo), photo, length(photo) FROM photos WHERE photo IS NOT NULL
+        ON CONFLICT (hash) DO NOTHING;
+
+        UPDATE photos p
+        SET photo_hash = sha256(p.photo), position = n.position
+        FROM (SELECT id, row_number() OVER (PARTITION BY listing_id ORDER BY id) - 1 AS position FROM photos) n
+        WHERE p.id = n.id AND p.photo IS NOT NULL;
+
+        ALTER TABLE photos DROP COLUMN photo;
+    END IF;
+END $$;
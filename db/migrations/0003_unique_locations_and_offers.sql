@@ -0,0 +1,46 @@
+-- Jedna lokalizacja = jeden wiersz (wielkość liter, białe znaki na początku i końcu i NULL nie mają znaczenia - ta sama
+-- normalizacja co normalize_location() w db/locations.py) - wymagane przez LocationResolver (INSERT ... ON CONFLICT)
+
+-- duplikaty zapisane przez starsze wersje - zostaje wiersz o najnizszym id (jak w LocationResolver.load())
+CREATE TEMP TABLE duplicate_locations ON COMMIT DROP AS
+SELECT id, keep_id
+FROM (SELECT id, min(id) OVER (PARTITION BY lower(btrim(COALESCE(voivodeship, ''), E' \t\n\r')),
+                                            lower(btrim(COALESCE(city, ''), E' \t\n\r')),
+                                            lower(btrim(COALESCE(district, ''), E' \t\n\r'))) AS keep_id
+      FROM locations) l
+WHERE id <> keep_id;
+
+UPDATE apartments_sale_listings a SET location_id = d.keep_id FROM duplicate_locations d WHERE a.location_id = d.id;
+DELETE FROM locations l USING duplicate_locations d WHERE l.id = d.id;
+
+UPDATE locations
+SET voivodeship = btrim(voivodeship, E' \t\n\r'), city = btrim(city, E' \t\n\r'), district = btrim(district, E' \t\n\r')
+WHERE voivodeship <> btrim(voivodeship, E' \t\n\r') OR city <> btrim(city, E' \t\n\r') OR district <> btrim(district, E' \t\n\r');
+
+CREATE UNIQUE INDEX IF NOT EXISTS locations_unique_idx
+    ON locations (lower(btrim(COALESCE(voivodeship, ''), E' \t\n\r')),
+                  lower(btrim(COALESCE(city, ''), E' \t\n\r')),
+                  lower(btrim(COALESCE(district, ''), E' \t\n\r')));
+
+-- Jedna oferta (otodom_listing_id, area) = jeden wiersz - wymagane przez idempotentny zapis (INSERT ... ON CONFLICT),
+-- indeks obsługuje tez porównanie ofert z wyszukiwania z bazą (categorize_offers)
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_indexes
+                   WHERE schemaname = current_schema() AND indexname = 'apartments_sale_listings_offer_idx') THEN
+        -- duplikaty zapisane przez starsze wersje - zostaje wiersz o najnizszym id
+        CREATE TEMP TABLE duplicate_listings ON COMMIT DROP AS
+        SELECT id, keep_id
+        FROM (SELECT id, min(id) OVER (PARTITION BY otodom_listing_id, area) AS keep_id
+              FROM apartments_sale_listings
+              WHERE otodom_listing_id IS NOT NULL) l
+        WHERE id <> keep_id;
+
+        UPDATE price_history p SET listing_id = d.keep_id FROM duplicate_listings d WHERE p.listing_id = d.id;
+        DELETE FROM features f USING duplicate_listings d WHERE f.listing_id = d.id;
+        DELETE FROM photos p USING duplicate_listings d WHERE p.listing_id = d.id;
+        DELETE FROM apartments_sale_listings a USING duplicate_listings d WHERE a.id = d.id;
+
+        CREATE UNIQUE INDEX apartments_sale_listings_offer_idx ON apartments_sale_listings (otodom_listing_id, area);
+    END IF;
+END $$;
@@ -0,0 +1,31 @@
+-- Dziennik przebiegów wyszukiwań (db/run_journal.py) - wznawianie przerwanych przebiegów
+
+CREATE TABLE IF NOT EXISTS crawl_runs ( -- Dziennik przebiegów wyszukiwań (wznawianie przerwanych przebiegów)
+    id SERIAL PRIMARY KEY,
+    url TEXT NOT NULL, -- URL wyszukiwania
+    full_crawl BOOLEAN NOT NULL, -- Pełny przebieg (wszystkie strony + sprawdzenie usuniętych ofert)
+    status TEXT NOT NULL, -- running / finished / abandoned
+    search_done BOOLEAN NOT NULL DEFAULT FALSE, -- Wszystkie strony wyszukiwania przetworzone
+    started_at TIMESTAMP NOT NULL DEFAULT now(),
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS crawl_run_offers ( -- Oferty ze stron wyszukiwania (stan wyszukiwania przebiegu), usuwane po zakończeniu przebiegu
+    run_id INT REFERENCES crawl_runs(id) ON DELETE CASCADE,
+    page INT, -- Numer strony wyszukiwania
+    position INT, -- Pozycja na stronie
+    otodom_listing_id BIGINT,
+    area NUMERIC(10, 2),
+    price BIGINT,
+    price_per_m NUMERIC(10, 2),
+    link TEXT,
+    listing_id BIGINT, -- ID w apartments_sale_listings, jezeli oferta została zapisana w tym przebiegu
+    PRIMARY KEY (run_id, page, position)
+);
+
+CREATE TABLE IF NOT EXISTS crawl_run_checks ( -- Wykonane sprawdzenia potencjalnie usuniętych ofert
+    run_id INT REFERENCES crawl_runs(id) ON DELETE CASCADE,
+    listing_id BIGINT, -- ID w apartments_sale_listings
+    status TEXT, -- Status oferty z otodom
+    PRIMARY KEY (run_id, listing_id)
+);
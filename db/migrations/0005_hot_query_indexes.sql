@@ -0,0 +1,18 @@
+-- Indeksy dla najczęstszych zapytań
+
+-- Aktywne oferty miasta (find_potentially_deleted_offers: JOIN locations ... WHERE active)
+CREATE INDEX IF NOT EXISTS apartments_sale_listings_active_location_idx
+    ON apartments_sale_listings (location_id) WHERE active;
+
+-- Historia cen oferty w kolejności zmian
+CREATE INDEX IF NOT EXISTS price_history_listing_date_idx ON price_history (listing_id, change_date);
+
+-- Zdjęcia oferty (klucz obcy - bez indeksu kazde usunięcie/sprawdzenie oferty przeszukuje całą tabelę)
+CREATE INDEX IF NOT EXISTS photos_listing_idx ON photos (listing_id, position);
+
+-- Przerwany przebieg wyszukiwania (RunJournal.begin)
+CREATE INDEX IF NOT EXISTS crawl_runs_running_idx ON crawl_runs (url) WHERE status = 'running';
+
+ANALYZE apartments_sale_listings;
+ANALYZE price_history;
+ANALYZE photos;
@@ -0,0 +1,251 @@
+import os, time, threading, logging, atexit
+from contextlib import contextmanager
+import psycopg2, psycopg2.extensions, psycopg2.pool
+from db.db_setup import get_db_connection
+from config.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Ustawienia mozna nadpisac zmiennymi srodowiskowymi (.env)
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 0))  # maksymalna liczba połączeń, 0 - dobrana do liczby równoległych wyszukiwań
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))  # ile sekund czekać na wolne połączenie
+DB_POOL_CHECK_IDLE = float(os.getenv('DB_POOL_CHECK_IDLE', 30))  # połączenie nieuzywane dłuzej jest sprawdzane (SELECT 1) przed wydaniem
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 300_000))  # statement_timeout połączeń w ms, 0 - bez limitu
+
+# Połączenia na jedno wyszukiwanie: crawl_search oraz zapis i sprawdzanie zdjęć w ListingPipeline
+CONNECTIONS_PER_SEARCH = 3
+
+
+def connect(statement_timeout: int = DB_STATEMENT_TIMEOUT):
+    """
+    Opens a new connection with the statement_timeout (ms) set for the whole session
+
+    Raises:
+        psycopg2.OperationalError: If the connection fails
+    """
+    options = f"-c statement_timeout={statement_timeout}" if statement_timeout else None
+    conn = get_db_connection(options=options)
+    if conn is None:
+        raise psycopg2.OperationalError("Connection to the database failed")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections shared by the searches and the pipeline stages
+
+    At most maxconn connections are open, getconn() waits for a free one up to `timeout` seconds.
+    Returned connections are rolled back if needed and kept open for reuse, a connection idle longer
+    than check_idle seconds is checked with SELECT 1 before it is handed out and replaced if it is broken.
+    The wait time, the connections in use and the utilization (share of the pool capacity in use over time)
+    are recorded in the metrics and returned by get_stats()
+
+    Args:
+        maxconn (int): Maximum number of open connections
+        timeout (float): How long getconn() waits for a free connection
+        check_idle (float): Idle time (s) after which a connection is checked before reuse
+        connect (callable): Opens a new connection
+    """
+
+    def __init__(self, maxconn: int, timeout: float = DB_POOL_TIMEOUT, check_idle: float = DB_POOL_CHECK_IDLE,
+                 connect=connect):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._connect = connect
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._idle = []  # (połączenie, czas zwrotu), ostatnio zwrócone na końcu
+        self._closed = False
+
+        self.opened = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkouts = 0
+        self.waits = 0  # wydania, na które trzeba było czekać (pula pełna)
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.discarded = 0
+        self._started = time.monotonic()
+        self._changed = self._started
+        self._busy_seconds = 0.0  # suma (połączenia w uzyciu x czas)
+
+    def _track_in_use(self, delta: int):
+        # wywoływane z self._lock
+        now = time.monotonic()
+        self._busy_seconds += self.in_use * (now - self._changed)
+        self._changed = now
+        self.in_use += delta
+        self.max_in_use = max(self.max_in_use, self.in_use)
+        metrics.set('db_pool_connections', self.in_use, state='in_use')
+        metrics.set('db_pool_connections', len(self._idle), state='idle')
+
+    def getconn(self):
+        """
+        Returns a connection from the pool, waits if all maxconn connections are in use
+
+        Raises:
+            psycopg2.pool.PoolError: If no connection was free within the timeout or the pool is closed
+            psycopg2.OperationalError: If a new connection could not be opened
+        """
+        if self._closed:
+            raise psycopg2.pool.PoolError("connection pool is closed")
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            if not self._slots.acquire(timeout=self.timeout):
+                metrics.inc('db_pool_timeouts_total')
+                raise psycopg2.pool.PoolError(f"no free connection in the pool within {self.timeout}s ({self.maxconn} in use)")
+            waited = time.perf_counter() - start
+            with self._lock:
+                self.waits += 1
+                self.wait_seconds += waited
+                self.max_wait = max(self.max_wait, waited)
+        metrics.observe('db_pool_wait_seconds', time.perf_counter() - start)
+
+        try:
+            conn = self._take_idle() or self._open()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.checkouts += 1
+            self._track_in_use(1)
+        return conn
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, returned_at = self._idle.pop()
+            if conn.closed:
+                self._discard(conn, 'closed')
+            elif time.monotonic() - returned_at > self.check_idle and not self._is_healthy(conn):
+                self._discard(conn, 'broken')
+            else:
+                return conn
+
+    def _open(self):
+        conn = self._connect()
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1;")
+            finally:
+                cur.close()
+            conn.rollback()
+            return True
+        except Exception as error:
+            logger.warning(f"Połączenie z bazą z puli jest zerwane, zostanie otwarte nowe: {error}")
+            return False
+
+    def _discard(self, conn, reason: str):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        metrics.inc('db_pool_discarded_total', reason=reason)
+        with self._lock:
+            self.opened -= 1
+            self.discarded += 1
+
+    def putconn(self, conn, close: bool = False):
+        """
+        Returns a connection to the pool: an open transaction is rolled back and autocommit is reset,
+        a broken connection (or any connection with close=True or after close()) is closed
+        """
+        try:
+            if close or self._closed or conn.closed:
+                self._discard(conn, 'closed' if conn.closed else 'released')
+                return
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception as error:
+                logger.warning(f"Error during returning a connection to the pool: {error}")
+                self._discard(conn, 'broken')
+                return
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._track_in_use(-1)
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Connection from the pool for the `with` block, returned to the pool at the end of the block
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            busy_seconds = self._busy_seconds + self.in_use * (now - self._changed)
+            return {
+                'max': self.maxconn,
+                'open': self.opened,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 3),
+                'max_wait': round(self.max_wait, 3),
+                'discarded': self.discarded,
+                'utilization': round(busy_seconds / (self.maxconn * (now - self._started) or 1), 3),
+            }
+
+    def close(self):
+        """
+        Closes the idle connections, connections still in use are closed when they are returned
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn, 'released')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the shared connection pool (created on first use, DB_POOL_MAX or CONNECTIONS_PER_SEARCH connections)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DB_POOL_MAX or CONNECTIONS_PER_SEARCH)
+        return _pool
+
+
+def set_pool(pool: ConnectionPool) -> ConnectionPool:
+    """
+    Replaces the shared connection pool (e.g. with one sized for the configured searches or in tests),
+    returns the previous one
+    """
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+        return previous
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None:
+        _pool.close()
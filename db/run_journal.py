@@ -0,0 +1,219 @@
+import os, logging
+from psycopg2.extras import execute_values
+from scraper.offers import OfferBatch
+
+logger = logging.getLogger(__name__)
+
+
+# Przerwany przebieg jest wznawiany tylko, jezeli zaczął się nie dawniej niz tyle godzin temu
+RESUME_MAX_AGE_HOURS = float(os.getenv('RUN_RESUME_MAX_AGE_HOURS', 24))
+
+def _to_float(value):
+    return float(value) if value is not None else None
+
+
+def count_runs_since_full_crawl(cur, url: str) -> int:
+    """
+    Returns the number of finished runs of the search URL counted from its last finished full crawl
+    (the full crawl itself included), 0 if the search was never fully crawled. A one-shot process
+    (cron) has no run counter of its own, SearchScheduler.restore_runs() takes it from here
+
+    Args:
+        cur (cursor): Database cursor
+        url (str): Search URL
+
+    Returns:
+        int: The number of runs, e.g. 1 right after a full crawl
+    """
+    cur.execute("""
+        SELECT count(*)
+        FROM crawl_runs
+        WHERE url = %s AND status = 'finished'
+        AND id >= (SELECT max(id) FROM crawl_runs WHERE url = %s AND status = 'finished' AND full_crawl)
+        ;""", (url, url))
+    return cur.fetchone()[0]
+
+
+class RunJournal:
+    """
+    Checkpoint journal of one crawl of a search (tables crawl_runs, crawl_run_offers, crawl_run_checks)
+
+    The journal keeps the search snapshot (offers from every search page, stored as soon as the page
+    is fetched), the database ids of the offers inserted by the run and the results of the closed-offer
+    checks. A run that did not finish (process killed, network or database failure) stays 'running',
+    and the next crawl of the same search URL resumes it: the recorded pages are taken from the journal
+    instead of being fetched again (they still go through categorize_offers(), so offers which did not
+    make it to the database are scraped again), fetching continues from the next page and closed-offer
+    checks that were already done are not repeated
+
+    Every method commits the connection, so it should not be called in the middle of the caller's transaction
+
+    Use RunJournal.begin() to start or resume a run
+    """
+
+    def __init__(self, conn, run_id: int, full_crawl: bool = True, resumed: bool = False):
+        self.conn = conn
+        self.run_id = run_id
+        self.full_crawl = full_crawl
+        self.resumed = resumed
+        self.resumed_pages = {}  # numer strony -> OfferBatch, tylko strony wczytane z dziennika przy wznowieniu
+        self.last_page = 0  # ostatnia zapisana strona (same oferty są tylko w bazie)
+        self.checks = {}
+        self.search_done = False
+
+    @classmethod
+    def begin(cls, conn, url: str, full_crawl: bool = True, max_age_hours: float = RESUME_MAX_AGE_HOURS):
+        """
+        Resumes the unfinished run of the search URL, or starts a new one
+
+        Args:
+            conn (connection): Database connection
+            url (str): Search URL
+            full_crawl (bool): Mode of the new run (a resumed run keeps its mode)
+            max_age_hours (float): Older unfinished runs are abandoned instead of resumed (their snapshot
+                                   and checks are deleted)
+
+        Returns:
+            RunJournal: The journal of the run
+        """
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                UPDATE crawl_runs SET status = 'abandoned'
+                WHERE url = %s AND status = 'running' AND started_at < now() - make_interval(secs => %s)
+                ;""", (url, max_age_hours * 3600))
+            # stan wyszukiwania i sprawdzenia porzuconych przebiegów nie będą juz potrzebne
+            for table in ('crawl_run_offers', 'crawl_run_checks'):
+                cur.execute(f"""
+                    DELETE FROM {table}
+                    WHERE run_id IN (SELECT id FROM crawl_runs WHERE url = %s AND status = 'abandoned')
+                    ;""", (url,))
+
+            cur.execute("""
+                SELECT id, full_crawl, search_done
+                FROM crawl_runs
+                WHERE url = %s AND status = 'running'
+                ORDER BY id DESC
+                LIMIT 1
+                ;""", (url,))
+            row = cur.fetchone()
+
+            if row is None:
+                cur.execute("INSERT INTO crawl_runs (url, full_crawl, status) VALUES (%s, %s, 'running') RETURNING id;",
+                            (url, full_crawl))
+                journal = cls(conn, cur.fetchone()[0], full_crawl)
+                conn.commit()
+                return journal
+
+            run_id, resumed_full_crawl, search_done = row
+            journal = cls(conn, run_id, resumed_full_crawl, resumed=True)
+            journal.search_done = search_done
+
+            cur.execute("""
+                SELECT page, otodom_listing_id, area, price, price_per_m, link
+                FROM crawl_run_offers
+                WHERE run_id = %s
+                ORDER BY page, position
+                ;""", (run_id,))
+            for page, otodom_listing_id, area, price, price_per_m, link in cur.fetchall():
+                if page not in journal.resumed_pages:
+                    journal.resumed_pages[page] = OfferBatch()
+                journal.resumed_pages[page].append(otodom_listing_id, _to_float(area), price, _to_float(price_per_m), link)
+
+            cur.execute("SELECT listing_id, status FROM crawl_run_checks WHERE run_id = %s;", (run_id,))
+            journal.checks = dict(cur.fetchall())
+            journal.last_page = max(journal.resumed_pages, default=0)
+            conn.commit()
+
+            logger.info(f"Wznawiam przerwany przebieg {run_id} ({url}): {len(journal.resumed_pages)} stron z dziennika, "
+                         f"{len(journal.checks)} sprawdzonych ofert")
+            return journal
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    @property
+    def next_page(self) -> int:
+        return self.last_page + 1
+
+    def _execute(self, query: str, values, many: bool = False):
+        cur = self.conn.cursor()
+        try:
+            if many:
+                execute_values(cur, query, values)
+            else:
+                cur.execute(query, values)
+            self.conn.commit()
+        except Exception as error:
+            self.conn.rollback()
+            logger.exception(f"Error during writing run journal: {error}")
+        finally:
+            cur.close()
+
+    def record_page(self, page: int, offers):
+        """
+        Saves the offers of a search page (OfferBatch, the search snapshot)
+
+        The offers are only written to the database (the crawl keeps its own batch of all the offers),
+        the journal remembers just the page number
+        """
+        self.last_page = max(self.last_page, page)
+        if not offers:
+            return
+        self._execute("""
+            INSERT INTO crawl_run_offers (run_id, page, position, otodom_listing_id, area, price, price_per_m, link)
+            VALUES %s
+            ON CONFLICT (run_id, page, position) DO NOTHING
+            ;""", [(self.run_id, page, position, *row) for position, row in enumerate(offers.rows())], many=True)
+
+    def record_inserted(self, created: list):
+        """
+        Saves the database ids of the offers inserted by the run
+
+        Args:
+            created (list): (otodom listing id, id in db) tuples, as returned by ListingWriter
+        """
+        if not created:
+            return
+        self._execute("""
+            UPDATE crawl_run_offers o
+            SET listing_id = c.listing_id
+            FROM (VALUES %s) AS c (run_id, otodom_listing_id, listing_id)
+            WHERE o.run_id = c.run_id AND o.otodom_listing_id = c.otodom_listing_id
+            ;""", [(self.run_id, otodom_listing_id, id_db) for otodom_listing_id, id_db in created], many=True)
+
+    def record_search_done(self):
+        """
+        Marks that all the search pages were processed (a resumed run goes straight to the closed-offer checks)
+        """
+        self.search_done = True
+        self._execute("UPDATE crawl_runs SET search_done = TRUE WHERE id = %s;", (self.run_id,))
+
+    def record_check(self, listing_id: int, status: str):
+        """
+        Saves the result of a closed-offer check (id in db, status from Otodom)
+        """
+        self.checks[listing_id] = status
+        self._execute("""
+            INSERT INTO crawl_run_checks (run_id, listing_id, status)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (run_id, listing_id) DO UPDATE SET status = EXCLUDED.status
+            ;""", (self.run_id, listing_id, status))
+
+    def finish(self):
+        """
+        Marks the run as finished and removes its snapshot (it is needed only to resume the run)
+        """
+        cur = self.conn.cursor()
+        try:
+            cur.execute("UPDATE crawl_runs SET status = 'finished', search_done = TRUE, finished_at = now() WHERE id = %s;", (self.run_id,))
+            cur.execute("DELETE FROM crawl_run_offers WHERE run_id = %s;", (self.run_id,))
+            cur.execute("DELETE FROM crawl_run_checks WHERE run_id = %s;", (self.run_id,))
+            self.conn.commit()
+        except Exception as error:
+            self.conn.rollback()
+            logger.exception(f"Error during finishing run {self.run_id}: {error}")
+        finally:
+            cur.close()
@@ -4,82 +4,136 @@ scraper_path = os.path.join(os.path.dirname(__file__), 'scraper')
 if scraper_path not in sys.path:
     sys.path.append(scraper_path)
 
+import argparse
 from datetime import datetime
-from scraper.scraper import is_allowed_to_scrape, scrape_offer
-from scraper.fetch_and_parse import download_data_from_search_results, check_if_offer_exists, check_if_price_changed, find_closed_offers
+from scraper.scraper import is_allowed_to_scrape, crawl_search
+from scraper.scheduler import SearchScheduler, load_search_config, CONFIG_PATH, DEFAULT_MAX_CONCURRENT_SEARCHES
+from scraper.http_session import get_status_counts, set_cache
+from scraper.http_cache import HttpCache, HTTP_CACHE_PATH
+from scraper.fetch_engine import FetchEngine, set_engine, DEFAULT_MAX_CONCURRENCY, DEFAULT_HOST_INTERVAL
 from db.db_setup import create_tables
-from db.db_operations import insert_new_listing, update_active_offers, update_deleted_offers, get_db_connection
+from db.locations import get_location_resolver
+from db.run_journal import count_runs_since_full_crawl
+from db.pool import ConnectionPool, get_pool, set_pool, DB_POOL_MAX, CONNECTIONS_PER_SEARCH
+from config.metrics import metrics, METRICS_PORT, METRICS_TEXTFILE
 
 from config.logging_config import setup_logger
-logger = setup_logger()
+logger = logging.getLogger(__name__)
 
 # ZASADY: WYSZUKIWANIE MIESZKAN NA SPRZEDAZ W DANYM MIESCIE BEZ ZADNYCH FILTROW, ZALECANE SORTOWANIE OD NAJNOWSZYCH I MAX LIMIT OFERT NA STRONE
+# Wyszukiwania (miasta, filtry, co ile minut odświezać) są zdefiniowane w config/config.json
+
+
+def run_search(search: dict, full_crawl: bool = True) -> dict:
+    """
+    Runs one crawl of a search definition on a connection from the pool (called by SearchScheduler)
+    """
+    url = search['url']
+    pool = get_pool()
+    try:
+        conn = pool.getconn()
+    except Exception as error:
+        logger.critical(f"Connection to the database failed: {error}")
+        return {}
+    cur = conn.cursor()
+    try:
+        # Upewnij się, ze to dozwolone
+        result = is_allowed_to_scrape(url)
+        logger.warning(f"Is fetching page {url} allowed?: {result}")
+
+        return crawl_search(url, search['city'], conn, cur, full_crawl)
+    finally:
+        cur.close()
+        pool.putconn(conn)
+        metrics.write_textfile(METRICS_TEXTFILE)
 
-#url_main = "https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice?by=LATEST&direction=DESC"
-url= "https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice/katowice/katowice?viewType=listing&by=LATEST&direction=DESC&limit=72"
-#url= "https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice/katowice/katowice?viewType=listing&by=LATEST&direction=DESC"
-city = 'katowice'
 
 def main():
+    # tylko w procesie głównym - procesy robocze (spawn) importują ten plik ponownie jako __mp_main__
+    setup_logger()
+    parser = argparse.ArgumentParser(description="Otodom scraper")
+    parser.add_argument('--config', default=CONFIG_PATH, help="plik z definicjami wyszukiwań")
+    parser.add_argument('--loop', action='store_true', help="działaj w pętli, odświezając wyszukiwania co refresh_interval minut")
+    parser.add_argument('--replay', action='store_true', help="odpowiedzi tylko z cache HTTP, bez zapytań do serwera")
+    parser.add_argument('--incremental', action='store_true', help="bez --loop: przebiegi przyrostowe (koniec na pierwszej znanej stronie), co full_crawl_every uruchomienie pełne - z dziennika przebiegów")
+    args = parser.parse_args()
+
+    pool = None
     conn = None
     cur = None  
     try:
-        
-        conn = get_db_connection()
-        if conn is None:
-            logging.critical("Connection to the database failed")
+        config = load_search_config(args.config)
+        if not config['searches']:
+            logger.critical(f"No searches defined in {args.config}")
+            return
+
+        # Wspólna pula połączeń z bazą - kazde wyszukiwanie uzywa CONNECTIONS_PER_SEARCH połączeń naraz
+        max_concurrent_searches = config.get('max_concurrent_searches', DEFAULT_MAX_CONCURRENT_SEARCHES)
+        pool = ConnectionPool(DB_POOL_MAX or CONNECTIONS_PER_SEARCH * max_concurrent_searches)
+        set_pool(pool)
+        try:
+            conn = pool.getconn()
+        except Exception as error:
+            logger.critical(f"Connection to the database failed: {error}")
             return
         cur=conn.cursor()
-        
-        # Upewnij się, ze to dozwolone
-        result = is_allowed_to_scrape(url)
-        logging.warning(f"Is fetching page {url} allowed?: {result}")
+
+        # Cache odpowiedzi HTTP na dysku (HTTP_CACHE_PATH, pusty - bez cache)
+        cache = None
+        if HTTP_CACHE_PATH:
+            cache = HttpCache(HTTP_CACHE_PATH, replay=args.replay)
+            set_cache(cache)
+        elif args.replay:
+            logger.critical("--replay wymaga cache HTTP (HTTP_CACHE_PATH)")
+            return
 
         # Utwórz tabele jezeli nie istnieją
         create_tables(cur)
 
-        # Pobierz dane
-        logging.info("Rozpoczynam pobieranie podstawowych danych z wyniku wyszukiwania...")
-        all_offers_basic_from_sarching_page = download_data_from_search_results(url)
-
-        logging.debug("  Dane z all_offers_basic_from_sarching_page: \n%s\n%s\n%s",  "--" * 100, all_offers_basic_from_sarching_page, "--" * 100)
-
-        logging.debug(f"Dane z all_offers_basic_from_sarching_page: \n{'--' * 100}\n{all_offers_basic_from_sarching_page}\n {'--' * 100}\n")
-        # Sprawdz ktore oferty juz sa w bazie (i dodaj/aktualizuj cene): 
-        logging.info("\nRozpoczynam sprawdzanie i pobieranie ofert...")
-        for offer in all_offers_basic_from_sarching_page:
-            id = offer.get("listing_id")
-            logging.debug(f"Sprawdzam oferte {id}")
-            # Jezeli dana oferta nie znajduje sie jeszcze w bazie, pobierz ja i zapisz
-            if not check_if_offer_exists(offer, cur):
-                offer_data = scrape_offer(offer) # pobierz znaleziona oferte w całości
-                id_db = insert_new_listing(offer_data, conn, cur) # wstaw do bazy
-                logging.info(f"Oferta {id} zapisana w bazie pod id {id_db}\n")
-
-            # jezeli oferta sie znajduje, sprawdz czy nie zmienila sie cena
-            else:
-                logging.info(f"Oferta {id} istnieje w bazie, sprawdzanie czy zmieniła się cena...")
-                id_db, new_price = check_if_price_changed(offer, cur)
-                # Jezeli new_price to nie False tylko liczba tzn ze cena sie zmienila - update bazy
-                if new_price:
-                    update_active_offers(offer, conn, cur)
-                    logging.info(f"Update ceny oferty {id} w bazie zakonczony")
-
-        # Na koncu sprawdz, czy sa jakies usuniete oferty
-        logging.info("Rozpoczynam sprawdzanie czy czy jakieś oferty nie zostały usunięte z otodom...")
-        deleted_offers = find_closed_offers(all_offers_basic_from_sarching_page, city,cur)
-        for deletd_offer in deleted_offers:
-            logging.info("Rozpocznynam update ofert w bazie, które zostały usunięte...")
-            update_deleted_offers(deletd_offer, conn, cur)
+        # Wczytaj lokalizacje do pamięci (bez zapytań do locations przy kazdej nowej ofercie)
+        get_location_resolver().load(cur)
+
+        # Liczniki uruchomień wyszukiwań z dziennika przebiegów - w trybie jednorazowym (cron) proces
+        # nie pamięta poprzednich uruchomień, a co full_crawl_every uruchomienie ma być pełne
+        run_counts = {search['name']: count_runs_since_full_crawl(cur, search['url']) for search in config['searches']}
+        conn.commit()
+        cur.close()
+        pool.putconn(conn)  # połączenie wraca do puli, wyszukiwania biorą własne
+        conn = None
+
+        # Wspólny silnik pobierania dla wszystkich wyszukiwań - limity zapytań na host obowiązują łącznie
+        host_intervals = {host: tuple(interval) for host, interval in config.get('host_intervals', {}).items()}
+        set_engine(FetchEngine(max_concurrency=config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+                               host_interval=DEFAULT_HOST_INTERVAL, host_intervals=host_intervals))
+
+        # Metryki (czasy pobierania, parsowania, zapytań do bazy, liczniki) - endpoint /metrics i/lub plik
+        if METRICS_PORT:
+            metrics.start_server(METRICS_PORT)
+
+        scheduler = SearchScheduler(config['searches'], run_search, max_workers=max_concurrent_searches)
+        scheduler.restore_runs(run_counts)
+        logger.info(f"Wyszukiwania: {[search['name'] for search in config['searches']]}")
+        if args.loop:
+            scheduler.run_forever()
+        else:
+            scheduler.run_once(full_crawl=None if args.incremental else True)
         
-        logging.info("Zakończono")
+        logger.info(f"Statusy odpowiedzi HTTP: {get_status_counts()}")
+        if cache is not None:
+            logger.info(f"Cache HTTP: {cache.get_stats()}")
+        logger.info(f"Pula połączeń z bazą: {pool.get_stats()}")
+        logger.info("Podsumowanie metryk:\n" + "\n".join(metrics.summary()))
+        metrics.write_textfile(METRICS_TEXTFILE)
+        logger.info("Zakończono")
             
     except Exception as error:
-        logging.exception("Error in main fucntion:")
+        logger.exception("Error in main fucntion:")
     finally: 
         if conn:
             cur.close()
-            conn.close()
+            pool.putconn(conn)
+        if pool is not None:
+            pool.close()
 
 if __name__ == "__main__": 
     main()
@@ -2,23 +2,36 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import requests, cv2, json, time, random, logging
-from bs4 import BeautifulSoup
-import numpy as np
-from db.db_operations import get_db_connection
+import requests, logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scraper.fetch_engine import get_engine, http_head, http_get_revalidated
+from scraper.next_data import extract_next_data, html_to_text
+from config.metrics import metrics
+from db.db_operations import copy_rows
+from scraper.offers import OfferBatch
+
+logger = logging.getLogger(__name__)
+
+
+# Maksymalna liczba jednoczesnych sprawdzeń statusu potencjalnie usuniętych ofert
+CLOSED_CHECK_CONCURRENCY = int(os.getenv('CLOSED_CHECK_CONCURRENCY', 8))
+
+# Ile wierszy pobiera jednorazowo kursor po stronie serwera przy wyszukiwaniu usuniętych ofert
+STREAM_ITERSIZE = int(os.getenv('STREAM_ITERSIZE', 2000))
 
 
 def fetch_page(url: str) -> requests.Response:
     """
     Fetches the content of a webpage.
 
-    A delay (random sleep) is added between requests to avoid being blocked by the server due to
-    making too many requests in a short period
+    The request is submitted to the shared FetchEngine (scraper/fetch_engine.py), which spaces out
+    requests to the same host (politeness budget) instead of sleeping after every request, so
+    several pages can be fetched concurrently by the functions below
 
-    The function sends a GET request to the specified URL with custom headers (including Polish 
-    language preference). If the request is successful (status code 200), the response object 
-    is returned. If the request fails (e.g. returns an error status code or raises a network-related 
-    exception), an error message is printed and None is returned
+    The GET request is sent with custom headers (including Polish language preference). If the
+    request is successful (status code 200), the response object is returned. If the request fails
+    (e.g. returns an error status code or raises a network-related exception), an error is logged
+    and None is returned
 
     Args:
     url (str): The URL of the page to fetch
@@ -27,36 +40,24 @@ def fetch_page(url: str) -> requests.Response:
     requests.Response: The HTTP response object containing the content of the page
 
     If the request is successful (status code 200), it returns the response object.
-    Otherwise, it prints an error message with the status code and returns None.
+    Otherwise, it logs an error message with the status code and returns None.
     """
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Cache-Control": "no-cache",
-            "Pragma": "no-cache",
-            "Accept-Language": "pl-PL,pl;q=0.9"
-        }
-
-        html_response = requests.get(url, headers=headers)
-        time.sleep(random.uniform(1,2))
-
-        if html_response.status_code == 200:
-            return html_response
-        else: 
-            logging.error(f"Błąd HTTP podczas pobierania strony ({url}): {html_response.status_code}")
-            return None
-        
-    except requests.exceptions.RequestException as e:
-        logging.exception(f"Wyjątek przy pobieraniu strony: {e}")
-        return None
+    return get_engine().fetch(url)
+
+
+def get_page_count(json_data: dict) -> int:
+    """
+    Reads the total number of search result pages from the decoded __NEXT_DATA__ of a search page
+    """
+    return json_data.get("props", {}).get("pageProps", {}).get("tracking", {}).get("listing", {}).get("page_count", 0)
 
 
 def get_total_pages(html_response: requests.Response) ->int:
     """
     Parses the total number of search result pages from the HTML response of the first Otodom search page.
 
-    This function is used internally by download_data_from_searching_page() to determine how many
-    pages of listings are available for scraping. 
+    This function can be used to determine how many pages of listings are available for scraping
+    (iter_search_result_pages() reads it directly from the already decoded first page with get_page_count())
 
     Args:
         html_response (requests.Response): The HTTP response object from the first search result page
@@ -69,396 +70,340 @@ def get_total_pages(html_response: requests.Response) ->int:
     """
     try:
         if html_response is None:
-            logging.error("Wystąpił błąd w pobraniu danych ze strony")
+            logger.error("Wystąpił błąd w pobraniu danych ze strony")
             raise Exception(f"Wystąpił błąd w pobraniu danych ze strony")
         
-        soup = BeautifulSoup(html_response.text, 'html.parser')
-        script_tag = soup.find('script', {'id': '__NEXT_DATA__'})
-        if script_tag:
-            json_data = json.loads(script_tag.string)
-
-            page_count = json_data.get("props", {}).get("pageProps", {}).get("tracking", {}).get("listing", {}).get("page_count", 0)
+        json_data = extract_next_data(html_response)
+        if json_data:
+            page_count = get_page_count(json_data)
             #result_count = json_data.get("result_count", {})
             #results_per_page = json_data.get("results_per_page", {})
             
             return page_count
         
-        logging.warning("Nie udało się znaleźć tagu z danymi dla liczby stron")
+        logger.warning("Nie udało się znaleźć tagu z danymi dla liczby stron")
         return 0
         
     except Exception as error:
-        logging.exception(f"Error during getting total pages: {error}")
+        logger.exception(f"Error during getting total pages: {error}")
 
 
-def download_data_from_search_results(base_url: str) -> list:
+def parse_search_page_offers(json_data: dict) -> OfferBatch:
     """
-    Extracts listing information from all paginated search result pages on otodom.com.
-
-    This function iterates through all pages of search results starting from the given base URL,
-    parses the embedded JSON data in each page's HTML, and collects basic information about 
-    each listing (ID, area, price, price_per_m and link)
+    Collects basic information about each listing from the decoded __NEXT_DATA__ of one search result page
 
     Args:
-        base_url (str): The base search URL (without the `&page=` parameter)
+        json_data (dict): Decoded __NEXT_DATA__ of a search result page
 
     Returns:
-        list: A list of dictionaries, each containing:
-            - listing_id (int): listing ID from otodom or None
-            - area (float): area of the apartment in m2 or 0
-            - price (int): Total price  or None
-            - price_per_m (float): Price per m2 or None
-            - link (str): URL to the individual listing or None
-
-    Raises:
-        Exception: If the first page fails to load, or if parsing fails due to a missing or incorrect script tag
-        ValueError: If the script tag does not contain the expected data structure
+        OfferBatch: The offers with 'listing_id', 'area', 'price', 'price_per_m' and 'link' 
+        (the same format as download_data_from_search_results())
     """
-    try:
-        all_offers = []
-
-        response_first_page = fetch_page(base_url)
-        if response_first_page is None:
-            logging.error("Nie udało się pobrać pierwszej strony wyszukiwania, sprawdź URL")
-            raise Exception("Nie udało się pobrać pierwszej strony wyszukiwania, sprawdź URL")
-
-        page_count = get_total_pages(response_first_page)
-        logging.info(f"Liczba znalezionych stron: {page_count}")
+    offers = json_data.get("props", {}).get("pageProps", {}).get("data", {}).get("searchAds", {}).get("items", [])
+
+    page_offers = OfferBatch()
+    n=1
+    for offer in offers: 
+        # sprawdz czy nie jest to zbiorowe ogloszenie do ktorego nie mam obslugi
+
+        listing_id = offer.get("id")
+        area = round(float(offer.get("areaInSquareMeters", 0)),2)
+        total_price = offer.get("totalPrice", {})
+        price = total_price.get("value", None) if isinstance(total_price, dict) else None
+        ppm_data = offer.get("pricePerSquareMeter", {})
+        if ppm_data:
+            price_per_m = ppm_data.get("value", None)
+        else: 
+            price_per_m = None
         
-        for page in range(1, page_count+1):
-            page_url = f"{base_url}&page={page}"
-            logging.debug(f"Pobieranie strony {page} z {page_count} ({page_url})")
-            
-            html_response = fetch_page(page_url)
-            if html_response is None:
-                logging.exception(f"Nie udało się pobrać strony {page}.")
-                continue
+        link = f"https://www.otodom.pl/pl/oferta/{offer.get('slug', None)}"
 
-            soup = BeautifulSoup(html_response.text, 'html.parser')
-            script_tag = soup.find('script', {'id': '__NEXT_DATA__'}) 
+        logger.debug("%s.id oferty z searching page: %s, area: %s, price: %s, price_per_m: %s, link: %s", n, listing_id, area, price, price_per_m, link)
 
-            if not script_tag:
-                logging.exception(f"Błąd przy stronie {page}: brak skryptu z danymi")
-                continue
+        page_offers.append(listing_id, area, price, price_per_m, link)
+        n+=1
 
-            json_data = json.loads(script_tag.string)
-            offers = json_data.get("props", {}).get("pageProps", {}).get("data", {}).get("searchAds", {}).get("items", [])
-            
-            if not offers:
-                logging.exception(f"Brak ofert na stronie {page} url {base_url}")
-                continue
-            
-            logging.debug(f"Liczba znalezionych ofert na stronie {page}: {len(offers)}")
-
-            n=1
-            for offer in offers: 
-                # sprawdz czy nie jest to zbiorowe ogloszenie do ktorego nie mam obslugi
-
-                listing_id = offer.get("id")
-                area = round(float(offer.get("areaInSquareMeters", 0)),2)
-                total_price = offer.get("totalPrice", {})
-                price = total_price.get("value", None) if isinstance(total_price, dict) else None
-                ppm_data = offer.get("pricePerSquareMeter", {})
-                if ppm_data:
-                    price_per_m = ppm_data.get("value", None)
-                else: 
-                    price_per_m = None
-                
-                link = f"https://www.otodom.pl/pl/oferta/{offer.get('slug', None)}"
-
-                logging.debug(f"{n}.id oferty z searching page: {listing_id}, area: {area}, price: {price}, price_per_m: {price_per_m}, link: {link}")
-
-                all_offers.append({
-                    'listing_id': listing_id,
-                    'area': area,
-                    'price': price,
-                    'price_per_m': price_per_m,
-                    'link': link
-                })
-                n+=1
+    return page_offers
 
-        return all_offers
 
-    except Exception as error:
-        logging.exception(f"Error during downloading data from search result: {error}")
-        
-
-def check_if_offer_exists(fetched_all_data_from_otodom: dict, cur) -> bool:
+def iter_search_result_pages(base_url: str, prefetch: int = None, start_page: int = 1):
     """
-    Checks whether a property listing already exists in the database based on its ID and area
+    Streams listing information from all paginated search result pages on otodom.com, page by page.
+
+    The first page is fetched once (the base URL is the first page), it gives both the number of pages
+    and the first offers. Once page_count is known, the remaining pages are submitted to the FetchEngine
+    and fetched concurrently, while the offers are yielded in page order as soon as each page
+    arrives - so the caller can process the first pages before the last one is downloaded
 
     Args:
-        fetched_all_data_from_otodom (dict): A dictionary containing offer data from Otodom, including 
-                                        'listing_id', 'area', 'price', 'price_per_m', 'link' 
-                                        (single entry from download_data_from_search_results())
-        cur (cursor): Database cursor to execute queries
+        base_url (str): The base search URL (without the `&page=` parameter)
+        prefetch (int): How many pages ahead of the one being yielded may be fetched, None - all
+                        pages are submitted at once. A small value avoids downloading pages that
+                        will not be needed when the caller stops early (incremental crawl)
+        start_page (int): First page to yield (e.g. when resuming a crawl), the first page is always
+                          fetched to get the number of pages
+
+    Yields:
+        tuple: (page number, OfferBatch with the offers from that page - see parse_search_page_offers())
 
-    Returns:
-        bool: True if the offer already exists in the database, False otherwise. If an error occurs during the query,
-        the function returns None
-    
     Raises:
-        Exception: If database query fails or any other error occurs
+        Exception: If the first page fails to load or does not contain the data
     """
+    response_first_page = fetch_page(base_url)
+    if response_first_page is None:
+        logger.error("Nie udało się pobrać pierwszej strony wyszukiwania, sprawdź URL")
+        raise Exception("Nie udało się pobrać pierwszej strony wyszukiwania, sprawdź URL")
+
+    json_first_page = extract_next_data(response_first_page)
+    if not json_first_page:
+        raise Exception("Brak skryptu z danymi na pierwszej stronie wyszukiwania")
+
+    page_count = get_page_count(json_first_page)
+    logger.info(f"Liczba znalezionych stron: {page_count}")
+
+    # pozostałe strony zlecamy naraz (albo po prefetch stron do przodu), silnik pobiera je równolegle
+    # (z zachowaniem limitu na host)
+    engine = get_engine()
+    page_futures = {}
+    next_to_submit = max(start_page, 2)
+
+    def submit_pages_up_to(last_page):
+        nonlocal next_to_submit
+        for page in range(next_to_submit, min(last_page, page_count) + 1):
+            page_futures[page] = engine.submit(f"{base_url}&page={page}")
+        next_to_submit = max(next_to_submit, min(last_page, page_count) + 1)
+
     try:
-        if_exists_query = """
-            SELECT id
-            FROM apartments_sale_listings
-            WHERE otodom_listing_id = %s AND area = %s
-            LIMIT 1
-            ;"""
-        
-        id = fetched_all_data_from_otodom.get('listing_id')
-        area = fetched_all_data_from_otodom.get('area')
-        if_exists_values = (id, area)
-
-        cur.execute(if_exists_query, if_exists_values)
-        result = cur.fetchone()
-        if result is None:
-            logging.debug(f"Oferta {id} o metrazu {area} NIE istnieje w bazie (result: {result}), pobieramy")
-            return False
-        else:
-            logging.debug(f"Oferta {id} o metrazu {area} istnieje w bazie pod id: {result} , sprawdzamy dalej !!!!!!!!!!!!!!!!!!!!!!!!!!")
-            return True
+        for page in range(start_page, max(page_count, 1)+1):
+            submit_pages_up_to(page_count if prefetch is None else page + prefetch)
 
-    except Exception as error:
-        logging.exception(f"Error during checking if record exists in database: {error}")
-        return None
+            logger.debug("Przetwarzanie strony %s z %s", page, page_count)
+            if page == 1:
+                json_data = json_first_page
+            else:
+                html_response = page_futures[page].result()
+                json_data = extract_next_data(html_response) if html_response is not None else None
 
+            if not json_data:
+                logger.error(f"Nie udało się pobrać strony {page} lub brak na niej skryptu z danymi")
+                continue
 
-def check_if_price_changed(fetched_data_from_otodom: dict, cur) -> tuple:
+            offers = parse_search_page_offers(json_data)
+            if not offers:
+                logger.error(f"Brak ofert na stronie {page} url {base_url}")
+                continue
+
+            logger.debug("Liczba znalezionych ofert na stronie %s: %s", page, len(offers))
+            yield page, offers
+    finally:
+        # jezeli wywolujacy przerwie iteracje, nie pobieramy juz pozostalych stron
+        for future in page_futures.values():
+            future.cancel()
+
+
+def download_data_from_search_results(base_url: str) -> OfferBatch:
     """
-    Checks if the price of a given offer (that is already in database) has changed
+    Extracts listing information from all paginated search result pages on otodom.com.
+
+    Collects the offers streamed by iter_search_result_pages() into a single OfferBatch (the pages are
+    fetched concurrently by the FetchEngine, the first page is fetched only once)
 
     Args:
-        fetched_data_from_otodom (dict): A dictionary containing offer data from Otodom, including 
-                                        'listing_id' and 'area', 'price', 'price_per_m', 'link' 
-                                        (single entry from download_data_from_search_results())
-        cur (cursor): Database cursor to execute SQL queries
+        base_url (str): The base search URL (without the `&page=` parameter)
 
     Returns:
-        tuple: (id, bool) - id (the one from db) of the listing and a boolean indicating if the price 
-        has changed
+        OfferBatch: The offers (read as dictionaries), each containing:
+            - listing_id (int): listing ID from otodom or None
+            - area (float): area of the apartment in m2 or 0
+            - price (int): Total price  or None
+            - price_per_m (float): Price per m2 or None
+            - link (str): URL to the individual listing or None
+
+    Raises:
+        Exception: If the first page fails to load, or if parsing fails due to a missing or incorrect script tag
+        ValueError: If the script tag does not contain the expected data structure
     """
     try:
-        if_changed_query = """
-            SELECT id, updated_price
-            FROM apartments_sale_listings
-            WHERE otodom_listing_id = %s
-            ;"""
-
-        id_otodom = fetched_data_from_otodom.get('listing_id')
-        new_price = fetched_data_from_otodom.get('price')
-        new_price_per_m = fetched_data_from_otodom.get('price_per_m')
-        if_changed_values = (id_otodom, )
-        cur.execute(if_changed_query, if_changed_values)
-        result = cur.fetchone()
-        id_db, old_price = result
-
-        logging.debug(f"    Dla id {id_otodom}  na stronie cena wynosi {new_price} (cena za m2: {new_price_per_m})")
-        logging.debug(f"    W bazie ta oferta ma id: {id_db}  ma zapisaną cenę {old_price}\n")
-        
-        if old_price == new_price:
-            logging.info(f"W ofercie {id_otodom} ({id_db}) cena {old_price} jest aktualna")
-            return id_db, False
-        else:
-            logging.debug(f"W ofercie {id_otodom} ({id_db}) cena {old_price} jest nieaktualna, nowa cena wynosi {new_price}\n")
-            return id_db, new_price
+        all_offers = OfferBatch()
+        for page, offers in iter_search_result_pages(base_url):
+            all_offers.extend(offers)
+
+        return all_offers
 
     except Exception as error:
-        logging.exception(f"Error during checking if price changed: {error}")
+        logger.exception(f"Error during downloading data from search result: {error}")
         
 
-def find_potentially_deleted_offers(fetched_all_data_from_otodom: list, city:str, cur) -> set: 
+def find_potentially_deleted_offers(fetched_all_data_from_otodom: OfferBatch, city:str, cur) -> set: 
     """
     Checks if all active offers (from the same city which used in searching) from the database exist 
     in the current set of fetched offers.
     Will be used in check_offer_status()
 
+    The (listing_id, area) pairs of the search are loaded with COPY into a temporary table and compared
+    with the active offers in Postgres (anti-join). The result is read through a named (server-side) cursor
+    in chunks of STREAM_ITERSIZE rows, so neither the active offers of the city nor the results of the search
+    are held in Python for the comparison, whatever the size of the market
+
     Args:
-        fetched_all_data_from_otodom (list): List of dictionaries containing offer data from Otodom, including 
-                                        'listing_id' and 'area', 'price', 'price_per_m', 'link' 
-                                        (all data from download_data_from_search_results())
+        fetched_all_data_from_otodom (OfferBatch): Offers from Otodom, including 'listing_id' and 'area',
+                                        'price', 'price_per_m', 'link' (all data from download_data_from_search_results())
         city (str): City for which we are looking for apartments for sale
-        cur (cursor): Database cursor to execute SQL queries
+        cur (cursor): Database cursor to execute SQL queries (its transaction is committed at the end,
+                      which drops the temporary table)
 
     Returns:
-        set: A set of potentially deleted offer IDs from the database
+        set: A set of tuples containing (offer_id_from_db, offer_link) of the potentially deleted offers
     """
-    
-    # Sprawdź, czy wszytskie aktywne ID z bazy znajdują się w swiezo zebranych danych z całego wyszukiwania z danego miasta
-    all_offers_from_db_query = """
-        SELECT asl.id, asl.otodom_listing_id, asl.area
+    # aktywne oferty miasta z bazy, których nie ma w wynikach wyszukiwania
+    potentially_deleted_query = """
+        SELECT asl.id, asl.offer_link
         FROM apartments_sale_listings asl
         JOIN locations l ON asl.location_id = l.id
         WHERE asl.active IS TRUE
         AND l.city = %s
+        AND NOT EXISTS (
+            SELECT 1
+            FROM crawl_search_offers s
+            WHERE s.otodom_listing_id = asl.otodom_listing_id AND s.area IS NOT DISTINCT FROM asl.area)
         ;"""
-    
-    cur.execute(all_offers_from_db_query, (city.lower(),))
-    all_offers_from_db = cur.fetchall()
-
-    data_from_otodom = set()
-    for offer_dict in  fetched_all_data_from_otodom:
-        id_otodom_from_otodom= offer_dict["listing_id"]
-        area_from_otodom = offer_dict["area"]
-        offer_data = (id_otodom_from_otodom, area_from_otodom)
-        data_from_otodom.add(offer_data)
 
+    conn = cur.connection
     potentially_deleted = set()
-    for id_db, id_otodom_from_db, area_from_db in all_offers_from_db:
-        if (id_otodom_from_db, area_from_db) not in data_from_otodom:
-            potentially_deleted.add(id_db)
+    # tabela tymczasowa, COPY i anti-join w jednej transakcji - błąd na dowolnym etapie ją wycofuje
+    # (i usuwa tabelę), połączenie wraca do puli bez przerwanej transakcji
+    try:
+        cur.execute("""
+            CREATE TEMP TABLE crawl_search_offers (otodom_listing_id BIGINT, area NUMERIC(10, 2)) ON COMMIT DROP
+            ;""")
+        loaded = copy_rows(cur, 'crawl_search_offers', ('otodom_listing_id', 'area'), fetched_all_data_from_otodom.keys())
+        cur.execute("ANALYZE crawl_search_offers;")
 
-    logging.debug("*"*100)
-    logging.debug(f"Oferty z bazy danych: \n {all_offers_from_db}\n")
-    logging.debug(f"Oferty z otodom: \n {data_from_otodom}")
-    logging.debug("*"*100)
+        with metrics.timer('db_statement_seconds', statement='find_potentially_deleted_offers'):
+            with conn.cursor(name='potentially_deleted_offers') as stream:
+                stream.itersize = STREAM_ITERSIZE
+                stream.execute(potentially_deleted_query, (city.lower(),))
+                for id_db, offer_link in stream:
+                    potentially_deleted.add((id_db, offer_link))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
-    logging.info(f"Potencjalnie {len(potentially_deleted)} usuniętych ofert")
+    logger.debug("Ofert z otodom: %s", loaded)
 
-    return potentially_deleted # set ID (to przypisane w bazie, a nie to z otodom), które mogły zostać usunięte (są w bazie danych ale nie ma ich w  pobranych danych z wyszukiwania)
+    logger.info(f"Potencjalnie {len(potentially_deleted)} usuniętych ofert")
 
+    return potentially_deleted # set krotek (ID nadane w bazie, link) ofert, które mogły zostać usunięte (są w bazie danych ale nie ma ich w pobranych danych z wyszukiwania)
 
-def find_offer_link(potentially_deleted_data: set, cur) -> set:
+
+def get_offer_status(offer_link: str) ->str:
     """
-    Retrieves the links for potentially deleted offers
+    Checks the status of a given offer on Otodom
 
     Args:
-        potentially_deleted_data (set): A set of potentially deleted offer IDs (from find_potentially_deleted_offers())
-        cur (cursor): Database cursor to execute SQL queries
+        offer_link (str): The URL of the offer to check
 
     Returns:
-        set: A set of tuples containing (offer_id_from_db, offer_link)
-
+        str: The status of the offer from the page (e.g., "active"), or None if the page could not be
+        fetched (connection error, throttling or server error after the retries) - the status is then unknown
     """
-    check_potentially_deleted_query = """
-        SELECT offer_link
-        FROM apartments_sale_listings
-        WHERE id = %s
-        ;"""
+    try:
+        # strona oferty z cache (TTL kilka godzin) mogłaby pokazać nieaktualny status - zawsze pytamy serwer
+        html_response = get_engine().fetch(offer_link, fetcher=http_get_revalidated)
+        if html_response is None:
+            # brak strony to nie dowód usunięcia oferty (429/5xx, błąd połączenia) - status nieznany
+            logger.warning(f"Nie udało się pobrać strony oferty {offer_link}, status nieznany")
+            return None
 
-    logging.debug("Potencjalnie usunięte oferty:")
-    links=set()
-    for id_from_db in potentially_deleted_data:
+        json_data = extract_next_data(html_response)
+        if json_data:
+            status = json_data.get("props", {}).get("pageProps", {}).get("ad", {}).get("status", None)
+            
+            return status
         
-        cur.execute(check_potentially_deleted_query, (id_from_db,))
-        offer_link = cur.fetchone()[0]
-
-        links.add((id_from_db, offer_link))
-
-        logging.debug(f"{id_from_db}: {offer_link}")
-
-    return links 
+    except Exception as error:
+        logger.exception(f"Error during getting offer status: {error}")
 
 
-def get_offer_status(offer_link: str) ->str:
+def check_offer_status(offer_link: str) -> str:
     """
-    Checks the status of a given offer on Otodom
+    Checks the status of a given offer on Otodom, starting with a cheap HEAD request
+
+    If the offer page returns 404/410, or redirects somewhere else than to an offer page (e.g. to the
+    search results), the offer is reported as "removed" without downloading the page. Otherwise the
+    page is fetched and parsed with get_offer_status(). Any other failure (throttling, server errors,
+    connection errors) leaves the status unknown, so a live offer is never closed because of it
 
     Args:
         offer_link (str): The URL of the offer to check
 
     Returns:
-        str: The status of the offer (e.g., "active", "removed")
+        str: The status of the offer (e.g., "active", "removed"), None if it could not be determined
     """
-    try:
-        html_response = fetch_page(offer_link)
-        if html_response is None:
+    head_response = get_engine().fetch(offer_link, fetcher=http_head)
+    if head_response is not None:
+        if head_response.status_code in (404, 410):
+            return "removed"
+        if head_response.is_redirect and '/pl/oferta/' not in head_response.headers.get('Location', ''):
             return "removed"
 
-        soup = BeautifulSoup(html_response.text, 'html.parser')
-        script_tag = soup.find('script', {'id': '__NEXT_DATA__'}) 
-        if script_tag: 
-            json_data = json.loads(script_tag.string)
-            status = json_data.get("props", {}).get("pageProps", {}).get("ad", {}).get("status", None)
-            
-            return status
-        
-    except Exception as error:
-        logging.exception(f"Error during getting offer status: {error}")
+    return get_offer_status(offer_link)
 
 
-def find_closed_offers(data:list, city:str, cur) ->set:
+def find_closed_offers(data:list, city:str, cur, journal=None) ->set:
     """
     Finds the offers that have been closed or removed
 
+    The statuses of the potentially deleted offers are checked concurrently (at most
+    CLOSED_CHECK_CONCURRENCY at a time) with check_offer_status(). With a run journal, every result is
+    saved as soon as it arrives and offers checked before the run was interrupted are not checked again
+
     Args:
-        data (list): List of dictionaries containing offer data from Otodom, including 'listing_id', 
-        'area', 'price', 'price_per_m', 'link' (all data from download_data_from_search_results())
+        data (OfferBatch): Offers from Otodom, including 'listing_id', 'area', 'price', 'price_per_m', 'link'
+        (all data from download_data_from_search_results())
         city (str): City for which we are looking for apartments for sale 
         cur (cursor): Database cursor to execute SQL queries
+        journal (RunJournal): Optional journal of the run (db.run_journal)
 
     Returns:
         set: A set of tuples containing (offer_id_from_db, offer_status) for closed offers
     """
 
     try:
-        # 1. Na podstawie bazy i pobranych wlasnie danych z wyszukiwania otodom okreslamy ID ofert ktore mogly zostac usuniete
-        potentially_deleted = find_potentially_deleted_offers(data, city, cur) #set (1. ID do sprawdzenia czy są aktywne)
-        
-        # 2. Do setu ID potencjalnie usunietcyh ofert dodajemy ich linki
-        potentially_deleted_links = find_offer_link(potentially_deleted, cur)  # set krotek (1. id (to nadane w bazie) potecnjalnie usunietych z otodom ofert, 2. link do oferty)
+        # 1. Na podstawie bazy i pobranych wlasnie danych z wyszukiwania otodom okreslamy oferty ktore mogly zostac usuniete
+        potentially_deleted_links = find_potentially_deleted_offers(data, city, cur)  # set krotek (1. id (to nadane w bazie) potecnjalnie usunietych z otodom ofert, 2. link do oferty)
         
-        # 3. Wchodzimy w kazdy link i sprawdzamy status oferty
+        # 2. Wchodzimy w kazdy link i sprawdzamy status oferty (równolegle)
         deleted_offers = set()
-        logging.debug("Sprawdzamy kazda potencjalnie usuniętą ofertę: \n")
-        for id_from_db, offer_link in potentially_deleted_links:
-            logging.debug(f"Oferta {id_from_db}, link: {offer_link}")
-            status = get_offer_status(offer_link)
-            logging.debug(f"status: {status}")
-            if 'active' not in status:
-                deleted_offers.add((id_from_db, status))
-                logging.debug("Dodano do listy usuniętych ofert")
-        logging.debug("\n")   
-
-        logging.info(f"Oferty usunięte z otodom: {deleted_offers}")
+        if journal is not None and journal.checks:
+            # oferty sprawdzone juz przez przerwany przebieg - bierzemy zapisany wynik
+            checked = {(id_from_db, offer_link) for id_from_db, offer_link in potentially_deleted_links if id_from_db in journal.checks}
+            deleted_offers = {(id_from_db, journal.checks[id_from_db]) for id_from_db, _ in checked
+                              if 'active' not in journal.checks[id_from_db]}
+            potentially_deleted_links -= checked
+        logger.debug("Sprawdzamy kazda potencjalnie usuniętą ofertę: \n")
+        with ThreadPoolExecutor(max_workers=CLOSED_CHECK_CONCURRENCY, thread_name_prefix="closed-check") as executor:
+            futures = {executor.submit(check_offer_status, offer_link): (id_from_db, offer_link)
+                       for id_from_db, offer_link in potentially_deleted_links}
+            for future in as_completed(futures):
+                id_from_db, offer_link = futures[future]
+                status = future.result()
+                logger.debug("Oferta %s, link: %s, status: %s", id_from_db, offer_link, status)
+                if journal is not None and status is not None:
+                    journal.record_check(id_from_db, status)
+                if status is None:
+                    logger.warning(f"Nie udało się ustalić statusu oferty {id_from_db} ({offer_link}), pomijam")
+                elif 'active' not in status:
+                    deleted_offers.add((id_from_db, status))
+                    logger.debug("Dodano do listy usuniętych ofert")
+
+        logger.info(f"Oferty usunięte z otodom: {len(deleted_offers)}")
+        logger.debug("Usunięte oferty (id w bazie, status): %s", deleted_offers)
         return deleted_offers #set krotek(1. ID (nadane w bazie), 2. status ofert, które zostały usunięte z otodom)
 
     except Exception as error:
-        logging.exception(f"Error during finding closed offers: {error}")
-
-
-
-def categorize_offers_for_db(offers_data): #jednak NOT IN USE LEFT IN CASE
-    """ 
-    przyjmuje all_offers z download_data_from_search_results() i dzieli je na:
-    - takie, których nie ma w bazie ( -> przesyłane do scrape_all_pages() (bd trzeba zmienic nazwe))
-    - takie, które są w bazie ale zmienila sie cena ( -> -> przesyłane do update_offers() )
-    - takie, z którymi nie trzeba nic robić, ich nie zapisujemy bo nei sa potrzebne ( -> zostawiamy)
-    """
-    conn = None
-    cur = None  
-    try:
-        conn = get_db_connection()
-        if conn is None:
-            print("Connection to the databas failed")
-            return
-        cur=conn.cursor()
-        need_update_offers = []
-        new_offers = []
-
-        n=0
-        for offer in offers_data:
-            if not check_if_offer_exists(offer, cur):
-                new_offers.append(offer)
-            else:
-                id, new_price, new_price_per_m = check_if_price_changed(offer, cur)
-                if new_price: #jezeli jest to jakas liczba
-                    need_update_offers.append({"id": id, "new_price": new_price, "new_price_per_m": new_price_per_m})
-                if not new_price:
-                    n+=1
-        print(f"\nZnaleziono {n} ofert, które juz są w bazie i nie wymagają update ceny")
-
-        # new_offers to lista słowników tak jak w danych wejściwoych czyli wynik download_data_from_search_results()
-        # need_update_offers to lista słowników z wartsociami id, new_price i new_price_per_m
-
-        return need_update_offers, new_offers
-    except Exception as error:
-        print(f"Error during categorizing offers for db: {error}")
-    finally: 
-        if conn:
-            cur.close()
-            conn.close()
+        logger.exception(f"Error during finding closed offers: {error}")
 
 
 def download_data_from_listing_page(html_response:requests.Response) -> dict:
@@ -466,13 +411,16 @@ def download_data_from_listing_page(html_response:requests.Response) -> dict:
     Parses the HTML response, extracts the property listing data embedded in a JSON object 
     within a <script> tag, and returns it as a dictionary.
 
+    Photos are not downloaded here, only their URLs are returned ('image_urls'), they can be 
+    downloaded concurrently with scraper.photos.download_photos()
+
     Parameters:
         html_response (requests.Response): The HTTP response containing the HTML of the page 
         to be parsed.
 
     Returns:
         dict: A dictionary containing the extracted property listing data, such as title, price, 
-        location, features, images, etc.
+        location, features, image URLs, etc.
 
     Raises:
         Exception: If the HTML response does not contain the necessary data or is invalid.
@@ -480,12 +428,9 @@ def download_data_from_listing_page(html_response:requests.Response) -> dict:
     if html_response is None:
         raise Exception(f"Wystąpił błąd w pobraniu danych ze strony")
     
-    soup = BeautifulSoup(html_response.text, 'html.parser')
-    script_tag = soup.find('script', {'id':'__NEXT_DATA__'})
-
-    if script_tag:
-        json_data = json.loads(script_tag.string)
+    json_data = extract_next_data(html_response)
 
+    if json_data:
         offer_data = json_data.get("props", {}).get("pageProps", {}).get("ad", {})
 
         # Debug: wydrukowanie tylko tej części JSON, zaczynając od ...
@@ -493,12 +438,12 @@ def download_data_from_listing_page(html_response:requests.Response) -> dict:
 
         listing_id = offer_data.get("id", None)
         listing_title = offer_data.get("title", None)
-        listing_title = BeautifulSoup(listing_title, "html.parser").get_text()
+        listing_title = html_to_text(listing_title)
         market_type = str(offer_data.get("market", None)).lower()
         advertisement_type = str(offer_data.get("advertType", None)).lower()
         creation_date = offer_data.get("createdAt", None)
         description = offer_data.get("description", None)
-        description_text = BeautifulSoup(description, "html.parser").get_text()
+        description_text = html_to_text(description)
         is_exclusive_offer = offer_data.get("exclusiveOffer", None) # True/False
         creation_source = str(offer_data.get("creationSource", None))
         promoted_at = offer_data.get("pushedUpAt", None)
@@ -548,18 +493,9 @@ def download_data_from_listing_page(html_response:requests.Response) -> dict:
         for data in reverseGeocoding_locations:
             district = data.get("name") if data.get("locationLevel") == "district" else None
 
-        # Zdjęcia
-        images = []
-        images_html = offer_data.get("images", None)
-        for element in images_html:
-            image_link = element.get("medium", None)
-            image_response = fetch_page(image_link)
-            arr = np.asarray(bytearray(image_response.content), dtype=np.uint8)
-            img = cv2.imdecode(arr, cv2.IMREAD_COLOR) # konwersja na obraz
-            success, encoded_image = cv2.imencode('.jpg', img) # zakodowanie obrazu na dane binarne jpg (na potrzeby postgreSQL)
-            if success:
-                binary_image = encoded_image.tobytes() 
-                images.append(binary_image)
+        # Zdjęcia - tylko linki, pobierane są osobno (równolegle) przez scraper.photos
+        images_html = offer_data.get("images", None) or []
+        image_urls = [element.get("medium", None) for element in images_html if element.get("medium")]
 
         # linki
         links = (offer_data.get("links", {}))
@@ -629,8 +565,8 @@ def download_data_from_listing_page(html_response:requests.Response) -> dict:
         data["view3d_url"] = view3d_url
         data["walkaround_url"] = walkaround_url
 
-        # zdjęcia
-        data["images"] = images
+        # zdjęcia (linki)
+        data["image_urls"] = image_urls
         
         # Sprzedajacy
         data["owner_id"] = owner_id
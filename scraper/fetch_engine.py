@@ -0,0 +1,227 @@
+import asyncio, threading, random, logging, atexit, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from scraper import http_session
+from scraper.http_cache import classify_url
+from config.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Ile zapytań HTTP może być w toku jednocześnie (łącznie dla wszystkich hostów)
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Odstęp (w sekundach, losowany z przedziału) pomiędzy startem kolejnych zapytań do tego samego hosta
+DEFAULT_HOST_INTERVAL = (0.5, 1.0)
+
+
+def http_get(url: str, revalidate: bool = False) -> requests.Response:
+    """
+    Sends a single blocking GET request through the shared, pooled HTTP session (with retries)
+    and returns the response if the status code is 200
+
+    This is the default fetcher used by FetchEngine, it is executed in the engine's thread pool
+
+    Args:
+        url (str): The URL of the page to fetch
+        revalidate (bool): Revalidate a cached response with the server whatever its age
+
+    Returns:
+        requests.Response: The HTTP response object, or None if the request failed or the
+        status code is other than 200
+    """
+    html_response = http_session.get(url, revalidate=revalidate)
+    if html_response is None:
+        return None
+
+    if html_response.status_code == 200:
+        return html_response
+    else:
+        logger.error(f"Błąd HTTP podczas pobierania strony ({url}): {html_response.status_code}")
+        return None
+
+
+def http_get_revalidated(url: str) -> requests.Response:
+    """
+    GET fetcher which always revalidates a cached response (conditional request, a 304 keeps the cached page),
+    used for the offer status checks, e.g. engine.fetch(url, fetcher=http_get_revalidated)
+    """
+    return http_get(url, revalidate=True)
+
+
+def http_head(url: str) -> requests.Response:
+    """
+    Sends a HEAD request (without following redirects) through the shared HTTP session and returns
+    the response whatever its status code is (None only if the request could not be sent)
+
+    Used as a per-call fetcher for cheap checks, e.g. engine.fetch(url, fetcher=http_head)
+    """
+    return http_session.head(url)
+
+
+class HostBudget:
+    """
+    Politeness budget for a single host
+
+    Instead of sleeping after every request, each request reserves the next free time slot for
+    its host. Consecutive slots are spaced by a random interval, so requests to one host never
+    start more often than the interval allows, while requests to other hosts are not delayed.
+    Slots are reserved from the event loop (new requests) and from the fetch threads (retries),
+    times are time.monotonic() values (the clock of the event loop)
+    """
+
+    def __init__(self, interval: tuple):
+        self.min_interval, self.max_interval = interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, earliest: float) -> float:
+        """
+        Reserves the first free slot not earlier than `earliest` and returns its start time
+        """
+        with self._lock:
+            start = max(earliest, self._next_slot)
+            self._next_slot = start + random.uniform(self.min_interval, self.max_interval)
+            return start
+
+    async def acquire(self):
+        now = time.monotonic()
+        start = self.reserve(now)
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class FetchEngine:
+    """
+    Concurrent fetch engine running an asyncio event loop in a background thread
+
+    Blocking fetches (requests) are executed in a thread pool, the loop takes care of the bounded
+    concurrency (semaphore) and the per-host politeness budget. A request takes its host slot only
+    after it got a place in the semaphore, so the slot is its real start time, and retries of the
+    request (http_session) take further slots of the same host instead of only sleeping. Synchronous code submits URLs with
+    submit()/fetch()/fetch_many(), the results are the same as from fetch_page() - a response or None
+
+    Args:
+        max_concurrency (int): Maximum number of requests in flight at the same time
+        host_interval (tuple): (min, max) seconds between the start of two requests to the same host
+        host_intervals (dict): Optional per-host overrides of host_interval, e.g. for the image CDN
+        fetcher (callable): Blocking function url -> response or None, http_get by default
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, host_interval: tuple = DEFAULT_HOST_INTERVAL,
+                 host_intervals: dict = None, fetcher=http_get):
+        self.max_concurrency = max_concurrency
+        self.host_interval = host_interval
+        self.host_intervals = host_intervals or {}
+        self.fetcher = fetcher
+
+        self._budgets = {}
+        self._budgets_lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="fetch")
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._executor)
+            self._thread = threading.Thread(target=self._loop.run_forever, name="fetch-engine", daemon=True)
+            self._thread.start()
+            logger.debug("Silnik pobierania uruchomiony (max_concurrency=%s)", self.max_concurrency)
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._executor.shutdown(wait=True)
+            self._loop = None
+            self._thread = None
+            self._executor = None
+            self._semaphore = None
+
+    def _budget(self, url: str) -> HostBudget:
+        host = urlsplit(url).netloc
+        with self._budgets_lock:
+            budget = self._budgets.get(host)
+            if budget is None:
+                budget = HostBudget(self.host_intervals.get(host, self.host_interval))
+                self._budgets[host] = budget
+        return budget
+
+    def _retry_delay(self, url: str, delay: float) -> float:
+        # ponowienie zajmuje kolejny slot hosta (nie wcześniej niz po backoff), zwraca czas oczekiwania
+        now = time.monotonic()
+        return self._budget(url).reserve(now + delay) - now
+
+    async def fetch_async(self, url: str, fetcher=None) -> requests.Response:
+        """
+        Fetches a URL inside the engine's event loop (respecting the host budget and concurrency limit),
+        with the engine's fetcher or the one given for this call (e.g. http_head)
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        with metrics.timer('fetch_seconds', url_class=classify_url(url)):
+            async with self._semaphore:
+                # slot hosta dopiero z miejscem w semaforze - zapytania czekające na semafor nie ruszą razem
+                await self._budget(url).acquire()
+                # to_thread kopiuje kontekst zadania - ponowienia w http_session widzą budżet silnika
+                http_session.retry_scheduler.set(self._retry_delay)
+                return await asyncio.to_thread(fetcher or self.fetcher, url)
+
+    def submit(self, url: str, fetcher=None):
+        """
+        Schedules fetching of the URL and returns a concurrent.futures.Future with the response (or None)
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.fetch_async(url, fetcher), self._loop)
+
+    def fetch(self, url: str, fetcher=None) -> requests.Response:
+        return self.submit(url, fetcher).result()
+
+    def fetch_many(self, urls: list) -> list:
+        """
+        Fetches all URLs concurrently and returns the responses in the same order as the URLs
+        """
+        futures = [self.submit(url) for url in urls]
+        return [future.result() for future in futures]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> FetchEngine:
+    """
+    Returns the shared FetchEngine used by fetch_page() and the scraping functions (created on first use)
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FetchEngine()
+        return _engine
+
+
+def set_engine(engine: FetchEngine) -> FetchEngine:
+    """
+    Replaces the shared FetchEngine (e.g. with a differently configured one or in tests), returns the previous one
+    """
+    global _engine
+    with _engine_lock:
+        previous, _engine = _engine, engine
+        return previous
+
+
+@atexit.register
+def _close_engine():
+    if _engine is not None:
+        _engine.close()
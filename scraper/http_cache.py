@@ -0,0 +1,217 @@
+import os, json, time, sqlite3, threading, logging
+from collections import Counter
+from urllib.parse import urlsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+
+# Ustawienia mozna nadpisac zmiennymi srodowiskowymi (.env)
+HTTP_CACHE_PATH = os.getenv('HTTP_CACHE_PATH', os.path.join('cache', 'http_cache.sqlite'))  # pusty - bez cache
+HTTP_CACHE_MAX_SIZE = int(os.getenv('HTTP_CACHE_MAX_SIZE_MB', 1024)) * 1024 * 1024
+
+# Jak długo (w sekundach) odpowiedź jest aktualna bez pytania serwera, wg rodzaju adresu
+DEFAULT_TTLS = {
+    'search': int(os.getenv('HTTP_CACHE_TTL_SEARCH', 10 * 60)),  # strony wyszukiwania zmieniają się często
+    'listing': int(os.getenv('HTTP_CACHE_TTL_LISTING', 6 * 3600)),
+    'image': int(os.getenv('HTTP_CACHE_TTL_IMAGE', 10 * 365 * 24 * 3600)),  # zdjęcia się nie zmieniają
+    'other': int(os.getenv('HTTP_CACHE_TTL_OTHER', 3600)),
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# Nagłówki, które nie pasują do zapisanej (juz zdekodowanej) treści odpowiedzi
+SKIPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection')
+
+
+def classify_url(url: str) -> str:
+    """
+    Returns the class of the URL used to pick its TTL: 'search', 'listing', 'image' or 'other'
+    """
+    parts = urlsplit(url)
+    path = parts.path.lower()
+    if '/pl/wyniki/' in path:
+        return 'search'
+    if '/pl/oferta/' in path:
+        return 'listing'
+    if path.endswith(IMAGE_EXTENSIONS) or path.endswith('/image') or 'olxcdn' in parts.netloc:
+        return 'image'
+    return 'other'
+
+
+def _build_response(url: str, status_code: int, headers: dict, content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.reason = 'OK' if status_code == 200 else None
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.from_cache = True
+    return response
+
+
+class HttpCache:
+    """
+    Persistent (SQLite) cache of successful GET responses
+
+    A response younger than the TTL of its URL class is served without contacting the server. An older
+    one is revalidated with If-None-Match/If-Modified-Since (if the server sent ETag/Last-Modified),
+    so an unchanged page costs a 304 response without a body. When the cache grows over max_size bytes,
+    the least recently used responses are evicted
+
+    In replay mode the server is never contacted: responses are served from the cache regardless of
+    their age and a miss gives a 504 response (offline tests, parser benchmarks). HEAD requests are
+    answered from the stored GET responses too (replay_head())
+
+    Args:
+        path (str): Path to the SQLite file (created if it does not exist)
+        max_size (int): Maximum total size of the stored bodies in bytes
+        ttls (dict): TTL in seconds per URL class (see classify_url()), DEFAULT_TTLS by default
+        replay (bool): Serve only from the cache
+    """
+
+    def __init__(self, path: str, max_size: int = HTTP_CACHE_MAX_SIZE, ttls: dict = None, replay: bool = False):
+        self.path = path
+        self.max_size = max_size
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.replay = replay
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status_code INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                content BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at_idx ON responses (accessed_at)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _lookup(self, url: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status_code, headers, content, etag, last_modified, stored_at FROM responses WHERE url = ?",
+                (url,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return row
+
+    def _store(self, url: str, response: requests.Response):
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in SKIPPED_HEADERS}
+        content = response.content
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, response.status_code, json.dumps(headers), content, response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), now, now, len(content)))
+            self._size += len(content) - (old[0] if old else 0)
+            if self._size > self.max_size:
+                self._evict()
+
+    def _touch(self, url: str):
+        with self._lock:
+            now = time.time()
+            self._conn.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+
+    def _evict(self):
+        # usuwamy najdawniej uzywane odpowiedzi, az zostanie 90% limitu (zeby nie czyscic przy kazdym zapisie)
+        target = self.max_size * 0.9
+        evicted = 0
+        for url, size in self._conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall():
+            if self._size <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._size -= size
+            evicted += 1
+        self.stats['evicted'] += evicted
+        logger.debug("Cache HTTP: usunięto %s odpowiedzi, rozmiar %.1f MB", evicted, self._size / 1024 / 1024)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def fetch(self, url: str, send, revalidate: bool = False) -> requests.Response:
+        """
+        Returns the response for the URL from the cache or from the server
+
+        Args:
+            url (str): The URL
+            send (callable): Sends the request, called with a dict of the conditional headers
+                             (If-None-Match/If-Modified-Since), returns requests.Response or None
+            revalidate (bool): Ask the server even if the cached response is fresh (a conditional request,
+                               an unchanged page still costs only a 304), ignored in replay mode
+
+        Returns:
+            requests.Response: The response (from_cache=True if it was served from the cache), or None
+            if the request could not be sent
+        """
+        row = self._lookup(url)
+        if row is not None:
+            status_code, headers, content, etag, last_modified, stored_at = row
+            if self.replay or (not revalidate and time.time() - stored_at < self.ttls[classify_url(url)]):
+                self._count('hits')
+                return _build_response(url, status_code, json.loads(headers), content)
+        elif self.replay:
+            self._count('misses')
+            logger.warning(f"Brak odpowiedzi w cache (tryb replay): {url}")
+            return _build_response(url, 504, {}, b'')
+
+        validators = {}
+        if row is not None:
+            if etag:
+                validators['If-None-Match'] = etag
+            if last_modified:
+                validators['If-Modified-Since'] = last_modified
+
+        response = send(validators)
+        if response is None:
+            return None
+
+        if response.status_code == 304 and row is not None:
+            self._count('revalidated')
+            self._touch(url)
+            return _build_response(url, status_code, json.loads(headers), content)
+
+        self._count('misses')
+        if response.status_code == 200:
+            self._store(url, response)
+        return response
+
+    def replay_head(self, url: str) -> requests.Response:
+        """
+        Answers a HEAD request in replay mode: the status and headers of the stored GET response without
+        the body, or 504 if the URL is not in the cache (the server is never contacted)
+        """
+        row = self._lookup(url)
+        if row is None:
+            self._count('misses')
+            logger.warning(f"Brak odpowiedzi w cache (tryb replay, HEAD): {url}")
+            return _build_response(url, 504, {}, b'')
+        self._count('hits')
+        status_code, headers, _, _, _, _ = row
+        return _build_response(url, status_code, json.loads(headers), b'')
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, size_mb=round(self._size / 1024 / 1024, 1))
@@ -0,0 +1,225 @@
+import os, time, random, logging, threading, contextvars
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from scraper.http_cache import classify_url
+from config.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Nagłówki wysyłane z kazdym zapytaniem (ustawiane raz, na sesji)
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept-Language": "pl-PL,pl;q=0.9"
+}
+
+# Statusy, przy których zapytanie jest ponawiane
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Ustawienia mozna nadpisac zmiennymi srodowiskowymi (.env)
+MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 1.0))  # opóźnienie przed pierwszym ponowieniem (s), potem x2
+BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 120.0))  # maksymalne opóźnienie, także dla Retry-After (s)
+BACKOFF_JITTER = float(os.getenv('HTTP_BACKOFF_JITTER', 0.5))  # losowy dodatek do opóźnienia (s)
+POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 16))  # liczba połączeń keep-alive na host
+TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30))
+
+# Liczniki statusów odpowiedzi (wszystkie próby) i ponowień (status -> liczba)
+status_counts = Counter()
+retry_counts = Counter()
+_counts_lock = threading.Lock()
+
+_session = None
+_session_lock = threading.Lock()
+
+# Ustawiane przez FetchEngine dla zapytań, które wykonuje: (url, opóźnienie) -> opóźnienie, ponowienie
+# zajmuje kolejny slot budżetu hosta zamiast tylko czekać (None - samo opóźnienie z backoff_delay())
+retry_scheduler = contextvars.ContextVar('retry_scheduler', default=None)
+
+# Cache odpowiedzi GET (scraper.http_cache.HttpCache), ustawiany przez set_cache(), domyślnie wyłączony
+_cache = None
+
+
+def create_session(pool_maxsize: int = POOL_MAXSIZE) -> requests.Session:
+    """
+    Creates a requests.Session with the default headers and a pooled (keep-alive) HTTP adapter
+
+    Args:
+        pool_maxsize (int): Maximum number of connections kept open per host, should not be lower
+        than the number of concurrent fetches
+
+    Returns:
+        requests.Session: The configured session
+    """
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the shared session (created on first use), so connections are reused between requests
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def parse_retry_after(value: str) -> float:
+    """
+    Parses the Retry-After header (number of seconds or an HTTP date) into seconds to wait, or None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: float = None, base: float = BACKOFF_BASE,
+                  jitter: float = BACKOFF_JITTER, max_delay: float = BACKOFF_MAX) -> float:
+    """
+    Returns the delay before the next attempt: exponential backoff (base * 2^attempt) plus random jitter,
+    but not less than the server's Retry-After and not more than max_delay
+    """
+    delay = base * (2 ** attempt) + random.uniform(0, jitter)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return min(delay, max_delay)
+
+
+def get(url: str, session: requests.Session = None, max_retries: int = MAX_RETRIES, revalidate: bool = False,
+        **kwargs) -> requests.Response:
+    """
+    Sends a GET request using the shared session, retrying on network errors and on the statuses from
+    RETRY_STATUSES (with exponential backoff and jitter, honoring the Retry-After header)
+
+    If a cache is set (set_cache()), fresh responses are served from it and stale ones are
+    revalidated with conditional headers. With revalidate=True a cached response is always revalidated
+    (e.g. checking whether an offer is still active must not rely on a page cached hours ago)
+
+    See request() for the other arguments and the return value
+    """
+    cache = _cache
+    if cache is None:
+        return request('GET', url, session, max_retries, **kwargs)
+
+    headers = kwargs.pop('headers', None) or {}
+    return cache.fetch(url, lambda validators: request('GET', url, session, max_retries,
+                                                       headers={**headers, **validators}, **kwargs),
+                       revalidate=revalidate)
+
+
+def head(url: str, session: requests.Session = None, max_retries: int = MAX_RETRIES, **kwargs) -> requests.Response:
+    """
+    Sends a HEAD request (redirects are not followed) using the shared session, with the same retries as get()
+
+    HEAD responses are not cached, but in replay mode the server is not contacted: the request is answered
+    from the cached GET response, or with 504 if there is none (see HttpCache.replay_head())
+    """
+    cache = _cache
+    if cache is not None and cache.replay:
+        return cache.replay_head(url)
+    kwargs.setdefault('allow_redirects', False)
+    return request('HEAD', url, session, max_retries, **kwargs)
+
+
+def request(method: str, url: str, session: requests.Session = None, max_retries: int = MAX_RETRIES, **kwargs) -> requests.Response:
+    """
+    Sends a request using the shared session, retrying on network errors and on the statuses from
+    RETRY_STATUSES (with exponential backoff and jitter, honoring the Retry-After header). A request run
+    by FetchEngine waits for a slot of its host budget before every retry as well (retry_scheduler)
+
+    Args:
+        method (str): HTTP method, e.g. 'GET' or 'HEAD'
+        url (str): The URL to fetch
+        session (requests.Session): Session to use, the shared one by default
+        max_retries (int): Maximum number of retries (0 - no retries)
+        **kwargs: Additional arguments passed to session.request() (e.g. headers)
+
+    Returns:
+        requests.Response: The last received response (it may have an error status if retries ran out),
+        or None if the request could not be sent at all
+    """
+    session = session or get_session()
+    kwargs.setdefault('timeout', TIMEOUT)
+
+    with metrics.timer('http_request_seconds', method=method, url_class=classify_url(url)):
+        response = _request_with_retries(method, url, session, max_retries, **kwargs)
+    if response is not None and method == 'GET':
+        metrics.inc('http_response_bytes_total', len(response.content), url_class=classify_url(url))
+    return response
+
+
+def _retry_delay(url: str, delay: float) -> float:
+    schedule = retry_scheduler.get()
+    return delay if schedule is None else schedule(url, delay)
+
+
+def _request_with_retries(method: str, url: str, session: requests.Session, max_retries: int, **kwargs) -> requests.Response:
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+            if attempt == max_retries:
+                logger.exception(f"Wyjątek przy pobieraniu strony ({url}): {error}")
+                return None
+            with _counts_lock:
+                retry_counts['connection_error'] += 1
+            metrics.inc('http_retries_total', reason='connection_error')
+            delay = _retry_delay(url, backoff_delay(attempt))
+            logger.warning(f"Błąd połączenia ({url}): {error}, ponowienie {attempt + 1}/{max_retries} za {delay:.1f} s")
+            time.sleep(delay)
+            continue
+
+        with _counts_lock:
+            status_counts[response.status_code] += 1
+        metrics.inc('http_responses_total', status=response.status_code)
+
+        if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+            return response
+
+        with _counts_lock:
+            retry_counts[response.status_code] += 1
+        metrics.inc('http_retries_total', reason=response.status_code)
+        delay = _retry_delay(url, backoff_delay(attempt, parse_retry_after(response.headers.get('Retry-After'))))
+        logger.warning(f"HTTP {response.status_code} ({url}), ponowienie {attempt + 1}/{max_retries} za {delay:.1f} s")
+        response.close()
+        time.sleep(delay)
+
+
+def set_cache(cache):
+    """
+    Sets the response cache used by get() (None - no cache), returns the previous one
+    """
+    global _cache
+    previous, _cache = _cache, cache
+    return previous
+
+
+def get_cache():
+    return _cache
+
+
+def get_status_counts() -> dict:
+    """
+    Returns a snapshot of the counters: {'statuses': {status: count}, 'retries': {status: count}}
+    """
+    with _counts_lock:
+        return {'statuses': dict(status_counts), 'retries': dict(retry_counts)}
@@ -0,0 +1,103 @@
+import re, json, html, logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+# Szybszy dekoder JSON, jezeli jest zainstalowany (orjson przyjmuje bytes bez dekodowania do str)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+NEXT_DATA_MARKER = b'id="__NEXT_DATA__"'
+
+_TAG_RE = re.compile(r'<!--.*?-->|<[^>]*>', re.DOTALL)
+
+
+def slice_next_data(content: bytes) -> bytes:
+    """
+    Locates the <script id="__NEXT_DATA__"> tag with a byte-level scan and returns its raw payload
+
+    The payload of a script tag is raw text (it is not HTML-escaped), so it can be sliced between the
+    end of the opening tag and the first closing </script> without parsing the rest of the document
+
+    Args:
+        content (bytes): Raw HTML of the page
+
+    Returns:
+        bytes: The JSON payload of the script tag, or None if the tag could not be found
+    """
+    marker = content.find(NEXT_DATA_MARKER)
+    while marker != -1:
+        # marker musi byc atrybutem tagu <script>, a nie np. fragmentem tekstu
+        tag_start = content.rfind(b'<script', 0, marker)
+        if tag_start != -1 and content.find(b'>', tag_start, marker) == -1:
+            start = content.find(b'>', marker)
+            end = content.find(b'</script>', start)
+            if start == -1 or end == -1:
+                return None
+            return content[start + 1:end]
+
+        marker = content.find(NEXT_DATA_MARKER, marker + len(NEXT_DATA_MARKER))
+
+    return None
+
+
+def _extract_with_soup(content: bytes) -> dict:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    script_tag = soup.find('script', {'id': '__NEXT_DATA__'})
+    if not script_tag or not script_tag.string:
+        return None
+    return json.loads(script_tag.string)
+
+
+def extract_next_data(page) -> dict:
+    """
+    Extracts and decodes the JSON embedded by Next.js in the <script id="__NEXT_DATA__"> tag
+
+    The payload is sliced directly from the response bytes and decoded with orjson (if available),
+    BeautifulSoup is used only as a fallback when the fast path cannot find or decode the tag
+
+    Args:
+        page (requests.Response | bytes | str): The HTTP response or raw HTML of the page
+
+    Returns:
+        dict: The decoded __NEXT_DATA__ JSON, or None if the page does not contain it
+    """
+    if isinstance(page, requests.Response):
+        content = page.content
+    elif isinstance(page, str):
+        content = page.encode('utf-8')
+    else:
+        content = page
+
+    payload = slice_next_data(content)
+    if payload is not None:
+        try:
+            return _json_loads(payload)
+        except ValueError as error:
+            logger.warning(f"Nie udało się zdekodować __NEXT_DATA__ szybką ścieżką ({error}), próba przez BeautifulSoup")
+
+    return _extract_with_soup(content)
+
+
+def html_to_text(fragment: str) -> str:
+    """
+    Returns the text of an HTML fragment (title or description of an offer): tags and comments are
+    removed and entities decoded, the same text as BeautifulSoup(fragment, "html.parser").get_text()
+    for the simple markup used by Otodom, without building a document tree
+
+    Args:
+        fragment (str): The HTML fragment
+
+    Returns:
+        str: The text, or None if the fragment is None
+    """
+    if fragment is None:
+        return None
+    return html.unescape(_TAG_RE.sub('', fragment))
@@ -0,0 +1,119 @@
+import math
+from array import array
+
+
+# Linki ofert z wyników wyszukiwania mają wspólny początek, przechowywany jest tylko slug
+LINK_PREFIX = "https://www.otodom.pl/pl/oferta/"
+
+FIELDS = ('listing_id', 'area', 'price', 'price_per_m', 'link')
+
+# Brak wartości w kolumnach liczb całkowitych (w kolumnach float - NaN)
+_MISSING = -1
+
+
+def _int_or_missing(value) -> int:
+    return _MISSING if value is None else int(value)
+
+
+def _float_or_nan(value) -> float:
+    return math.nan if value is None else float(value)
+
+
+def _decode_row(listing_id: int, area: float, price: int, price_per_m: float, slug: bytes) -> tuple:
+    slug = slug.decode()
+    return (None if listing_id == _MISSING else listing_id,
+            None if area != area else round(area, 2),  # NaN != NaN
+            None if price == _MISSING else price,
+            None if price_per_m != price_per_m else price_per_m,
+            (slug if '://' in slug else LINK_PREFIX + slug) if slug else None)
+
+
+class OfferBatch:
+    """
+    Compact, columnar container of the offers found in search results ('listing_id', 'area', 'price',
+    'price_per_m', 'link')
+
+    Every field is kept in its own column instead of a dictionary per offer: listing ids and prices
+    in int64 arrays, areas in a float32 array (rounded back to 2 decimal places when read, like
+    NUMERIC(10, 2) in the database), prices per m2 in a float64 array and the links as slugs packed
+    in one UTF-8 buffer, rebuilt with LINK_PREFIX when read. A search of several hundred thousand
+    offers takes a fraction of the memory of a list of dictionaries (see benchmarks/bench_offers_memory.py)
+
+    The batch behaves like a list of offer dictionaries (len(), indexing and iteration create the
+    dictionaries on demand), the diff and deletion stages read the columns through rows() and keys()
+
+    Args:
+        offers (iterable): Offer dictionaries or another OfferBatch to start with
+    """
+
+    __slots__ = ('listing_ids', 'areas', 'prices', 'prices_per_m', 'slugs', 'slug_ends')
+
+    def __init__(self, offers=()):
+        self.listing_ids = array('q')
+        self.areas = array('f')
+        self.prices = array('q')
+        self.prices_per_m = array('d')
+        self.slugs = bytearray()  # slugi kolejnych ofert jeden za drugim
+        self.slug_ends = array('q')  # koniec slugu oferty w self.slugs
+        self.extend(offers)
+
+    def append(self, listing_id: int, area: float, price: int, price_per_m: float, link: str):
+        self.listing_ids.append(_int_or_missing(listing_id))
+        self.areas.append(_float_or_nan(area))
+        self.prices.append(_int_or_missing(price))
+        self.prices_per_m.append(_float_or_nan(price_per_m))
+        # link spoza otodom (np. w testach) zostaje w całości, brak linku - pusty slug
+        slug = link[len(LINK_PREFIX):] if link and link.startswith(LINK_PREFIX) else (link or '')
+        self.slugs += slug.encode()
+        self.slug_ends.append(len(self.slugs))
+
+    def extend(self, offers):
+        if isinstance(offers, OfferBatch):
+            self.listing_ids.extend(offers.listing_ids)
+            self.areas.extend(offers.areas)
+            self.prices.extend(offers.prices)
+            self.prices_per_m.extend(offers.prices_per_m)
+            offset = len(self.slugs)
+            self.slugs += offers.slugs
+            self.slug_ends.extend(end + offset for end in offers.slug_ends)
+            return
+        for offer in offers:
+            self.append(offer['listing_id'], offer['area'], offer['price'], offer['price_per_m'], offer['link'])
+
+    def __len__(self) -> int:
+        return len(self.listing_ids)
+
+    def row(self, index: int) -> tuple:
+        """
+        Returns the offer as a (listing_id, area, price, price_per_m, link) tuple
+        """
+        index = range(len(self))[index]  # ujemne indeksy, IndexError poza zakresem
+        return _decode_row(self.listing_ids[index], self.areas[index], self.prices[index], self.prices_per_m[index],
+                           self.slugs[self.slug_ends[index - 1] if index else 0:self.slug_ends[index]])
+
+    def rows(self):
+        """
+        Yields the offers as (listing_id, area, price, price_per_m, link) tuples
+        """
+        start, slugs = 0, self.slugs
+        for listing_id, area, price, price_per_m, end in zip(self.listing_ids, self.areas, self.prices,
+                                                              self.prices_per_m, self.slug_ends):
+            yield _decode_row(listing_id, area, price, price_per_m, slugs[start:end])
+            start = end
+
+    def keys(self):
+        """
+        Yields the (listing_id, area) pairs identifying the offers (without building the other fields)
+        """
+        for listing_id, area in zip(self.listing_ids, self.areas):
+            yield (None if listing_id == _MISSING else listing_id, None if area != area else round(area, 2))
+
+    def __getitem__(self, index: int) -> dict:
+        return dict(zip(FIELDS, self.row(index)))
+
+    def __iter__(self):
+        for row in self.rows():
+            yield dict(zip(FIELDS, row))
+
+    def __repr__(self) -> str:
+        return f"OfferBatch({len(self)} offers)"
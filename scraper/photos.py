@@ -0,0 +1,163 @@
+import os, hashlib, logging, threading, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from scraper.fetch_engine import get_engine
+from config.logging_config import setup_worker_logger
+
+logger = logging.getLogger(__name__)
+
+
+# Ustawienia mozna nadpisac zmiennymi srodowiskowymi (.env)
+# original - zdjęcia zapisywane są tak jak przyszły z serwera (bez dekodowania)
+# transcode - zdjęcia są dekodowane i ponownie kodowane do JPEG (opcjonalnie zmniejszane), wymaga OpenCV
+PHOTO_MODE = os.getenv('PHOTO_MODE', 'original')
+PHOTO_MAX_SIZE = int(os.getenv('PHOTO_MAX_SIZE', 0))  # dłuższy bok w px, 0 - bez zmiany rozmiaru
+PHOTO_JPEG_QUALITY = int(os.getenv('PHOTO_JPEG_QUALITY', 90))
+PHOTO_POOL = os.getenv('PHOTO_POOL', 'thread')  # thread/process - pula dla trybu transcode
+PHOTO_POOL_WORKERS = int(os.getenv('PHOTO_POOL_WORKERS', os.cpu_count() or 2))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def transcode_photo(content: bytes, max_size: int = PHOTO_MAX_SIZE, quality: int = PHOTO_JPEG_QUALITY) -> bytes:
+    """
+    Decodes an image, optionally scales it down so that its longer side is at most max_size pixels,
+    and encodes it as JPEG
+
+    OpenCV and numpy are imported here, so they are needed only in the transcode mode
+
+    Args:
+        content (bytes): The downloaded image
+        max_size (int): Maximum length of the longer side in pixels, 0 - keep the size
+        quality (int): JPEG quality (0-100)
+
+    Returns:
+        bytes: The JPEG image, or None if the image could not be decoded or encoded
+    """
+    import cv2
+    import numpy as np
+
+    arr = np.frombuffer(content, dtype=np.uint8)
+    img = cv2.imdecode(arr, cv2.IMREAD_COLOR) # konwersja na obraz
+    if img is None:
+        return None
+
+    if max_size:
+        height, width = img.shape[:2]
+        scale = max_size / max(height, width)
+        if scale < 1:
+            img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    success, encoded_image = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality]) # zakodowanie obrazu na dane binarne jpg
+    return encoded_image.tobytes() if success else None
+
+
+def _get_pool():
+    global _pool
+    # wywoływane równolegle przez wątki etapu photos - jedna pula dla wszystkich
+    with _pool_lock:
+        if _pool is None:
+            if PHOTO_POOL == 'process':
+                # spawn - proces roboczy nie dziedziczy wątków (FetchEngine, etapy, logi) ani połączeń z bazą
+                _pool = ProcessPoolExecutor(max_workers=PHOTO_POOL_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=setup_worker_logger)
+            else:
+                _pool = ThreadPoolExecutor(max_workers=PHOTO_POOL_WORKERS, thread_name_prefix="photos")
+        return _pool
+
+
+def _transcode_downloaded(downloaded: list) -> list:
+    new_photos = [content for _, content in downloaded if content is not None]
+    if not new_photos:
+        return downloaded
+
+    try:
+        import cv2
+    except ImportError:
+        logger.warning("PHOTO_MODE=transcode wymaga OpenCV (opencv-python), zapisuję oryginalne zdjęcia")
+        return downloaded
+
+    transcoded = iter(list(_get_pool().map(transcode_photo, new_photos)))
+    result = []
+    for url, content in downloaded:
+        if content is None:
+            result.append((url, None))
+            continue
+        content = next(transcoded)
+        if content is not None:
+            result.append((url, content))
+    return result
+
+
+def hash_photo(content: bytes) -> bytes:
+    """
+    Returns the SHA-256 digest of the photo, the key of the content-addressed photo store (photo_blobs)
+    """
+    return hashlib.sha256(content).digest()
+
+
+def submit_photos(image_urls: list, known_hashes: dict = None) -> list:
+    """
+    Submits downloading of the photos to the FetchEngine without waiting for them. Photos whose URL is
+    already in the photo store (known_hashes) are not downloaded at all
+
+    Args:
+        image_urls (list): URLs of the photos, in the order of the listing
+        known_hashes (dict): {url: hash} of the photos already stored (see db.db_operations.find_known_photos())
+
+    Returns:
+        list: (url, future with the response or None for a known photo) tuples, to be passed to collect_photos()
+    """
+    engine = get_engine()
+    known_hashes = known_hashes or {}
+    return [(url, None if url in known_hashes else engine.submit(url)) for url in image_urls if url]
+
+
+def collect_photos(submitted: list, known_hashes: dict = None, mode: str = None) -> list:
+    """
+    Waits for the photos submitted with submit_photos() and returns the photo records
+
+    Args:
+        submitted (list): Result of submit_photos()
+        known_hashes (dict): The same {url: hash} dictionary that was passed to submit_photos()
+        mode (str): 'original' (default, the downloaded bytes are stored as they are) or 'transcode'
+                    (decoded and re-encoded in a thread/process pool, see transcode_photo())
+
+    Returns:
+        list: Dictionaries {'url', 'hash', 'content'} in the order of the listing, 'content' is None for
+        photos already in the store, photos that failed to download are skipped
+    """
+    mode = mode or PHOTO_MODE
+    known_hashes = known_hashes or {}
+
+    downloaded = []
+    for url, future in submitted:
+        if future is None:
+            downloaded.append((url, None))
+            continue
+        response = future.result()
+        if response is not None:
+            downloaded.append((url, response.content))
+
+    if mode == 'transcode':
+        downloaded = _transcode_downloaded(downloaded)
+
+    return [{'url': url,
+             'hash': known_hashes[url] if content is None else hash_photo(content),
+             'content': content}
+            for url, content in downloaded]
+
+
+def download_photos(image_urls: list, known_hashes: dict = None, mode: str = None) -> list:
+    """
+    Downloads the photos that are not in the store yet concurrently (through the FetchEngine)
+
+    Args:
+        image_urls (list): URLs of the photos
+        known_hashes (dict): {url: hash} of the photos already stored
+        mode (str): 'original' or 'transcode', see collect_photos()
+
+    Returns:
+        list: The photo records, see collect_photos()
+    """
+    return collect_photos(submit_photos(image_urls, known_hashes), known_hashes, mode)
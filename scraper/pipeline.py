@@ -0,0 +1,306 @@
+import os, time, queue, threading, logging, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from scraper.fetch_and_parse import fetch_page, download_data_from_listing_page
+from scraper.transform_data import transform_data
+from scraper.photos import submit_photos, collect_photos
+from db.pool import get_pool
+from db.db_operations import find_known_photos
+from db.bulk_writer import ListingWriter
+from config.metrics import metrics
+from config.logging_config import setup_worker_logger
+
+logger = logging.getLogger(__name__)
+
+
+# Ustawienia mozna nadpisac zmiennymi srodowiskowymi (.env)
+FETCH_WORKERS = int(os.getenv('PIPELINE_FETCH_WORKERS', 8))  # zapytania i tak ogranicza FetchEngine (limit na host)
+PARSE_WORKERS = int(os.getenv('PIPELINE_PARSE_WORKERS', os.cpu_count() or 2))
+# thread - strony ofert parsowane w wątkach etapu parse
+# process - surowe odpowiedzi wysyłane do puli procesów (parsowanie na wielu rdzeniach, np. pierwsze pobranie nowego miasta)
+PARSE_POOL = os.getenv('PARSE_POOL', 'thread')
+PARSE_POOL_WORKERS = int(os.getenv('PARSE_POOL_WORKERS', os.cpu_count() or 2))
+PHOTO_WORKERS = int(os.getenv('PIPELINE_PHOTO_WORKERS', 4))
+QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 32))  # maksymalna liczba ofert czekających przed etapem
+REPORT_INTERVAL = float(os.getenv('PIPELINE_REPORT_INTERVAL', 60))  # co ile sekund logować stan kolejek, 0 - tylko na koniec
+
+_STOP = object()
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+class Stage:
+    """
+    One stage of the pipeline: a bounded input queue and worker threads applying func to its items
+
+    The result of func (if not None) is put into the next stage's queue. The queues are bounded, so
+    when a later stage falls behind, put() blocks and the earlier stages slow down (backpressure)
+
+    Args:
+        name (str): Name used in the stats
+        func (callable): Processes one item, returns the item for the next stage or None
+        workers (int): Number of worker threads
+        queue_size (int): Capacity of the input queue
+        on_idle (callable): Called by a worker which waited idle_interval seconds for an item, its result
+                            (if not None) is put into the next stage's queue
+        idle_interval (float): See on_idle
+    """
+
+    def __init__(self, name: str, func, workers: int, queue_size: int = QUEUE_SIZE, on_idle=None, idle_interval: float = 1.0):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.on_idle = on_idle
+        self.idle_interval = idle_interval
+        self.input = queue.Queue(maxsize=queue_size)
+        self.next_stage = None
+
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self._started_at = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._started_at = time.monotonic()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item):
+        self.input.put(item)
+        depth = self.input.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _work(self):
+        while True:
+            try:
+                item = self.input.get(timeout=self.idle_interval if self.on_idle else None)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+
+            start = time.perf_counter()
+            try:
+                if item is None:
+                    result = self.on_idle()
+                else:
+                    result = self.func(item)
+            except Exception as error:
+                logger.exception(f"Error during pipeline stage {self.name}: {error}")
+                result = None
+                with self._lock:
+                    self.failed += 1
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.processed += item is not None
+                self.busy_seconds += elapsed
+
+            if result is not None and self.next_stage is not None:
+                self.next_stage.put(result)
+
+    def stop(self):
+        """
+        Waits until all queued items are processed and stops the workers
+        """
+        for _ in self._threads:
+            self.input.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def get_stats(self) -> dict:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            return {'queued': self.input.qsize(), 'max_queued': self.max_depth, 'processed': self.processed,
+                    'failed': self.failed, 'per_second': round(self.processed / elapsed, 2) if elapsed else 0.0,
+                    'busy_seconds': round(self.busy_seconds, 2)}
+
+
+def parse_listing(content: bytes) -> tuple:
+    """
+    Parses and transforms a downloaded listing page (parse stage)
+
+    Returns:
+        tuple: The transformed offer data (photo URLs in 'image_urls') and the parse and transform
+        times in seconds (measured here, so that they are known also when run in the process pool)
+    """
+    start = time.perf_counter()
+    offer_data = download_data_from_listing_page(content)
+    parsed = time.perf_counter()
+    image_urls = offer_data.pop('image_urls')
+    cleaned_offer_data = transform_data(offer_data)
+    cleaned_offer_data['image_urls'] = image_urls
+    return cleaned_offer_data, parsed - start, time.perf_counter() - parsed
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn - proces roboczy nie dziedziczy wątków (FetchEngine, etapy) ani połączeń z bazą
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_POOL_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                              initializer=setup_worker_logger)
+        return _parse_pool
+
+
+class ListingPipeline:
+    """
+    Staged pipeline scraping new offers: fetch -> parse/transform -> photos -> write
+
+    - fetch: FETCH_WORKERS threads download the listing pages (through the shared FetchEngine)
+    - parse: PARSE_WORKERS threads extract and transform the offer data, in the 'process' parse mode
+             they only send the raw pages to a shared process pool (PARSE_POOL_WORKERS processes)
+    - photos: PHOTO_WORKERS threads skip photos already in the store and download the others
+    - write: a single thread adding offers to a ListingWriter (batched inserts) on its own connection
+
+    Every stage has a bounded input queue, so submit() blocks when the pipeline is full instead of
+    buffering the whole search in memory. Queue depths and throughput of every stage are logged
+    every REPORT_INTERVAL seconds and on close()
+
+    Args:
+        pool (ConnectionPool): Pool of the writer and photo lookup connections (they use their own
+                               connections, not the caller's), the shared pool by default
+        fetch_workers, parse_workers, photo_workers (int): Number of threads of the stages
+        queue_size (int): Capacity of every stage queue
+        parse_mode (str): 'thread' or 'process', see PARSE_POOL
+        report_interval (float): How often (s) the stats are logged, 0 - only on close()
+    """
+
+    def __init__(self, pool=None, fetch_workers: int = FETCH_WORKERS, parse_workers: int = PARSE_WORKERS,
+                 photo_workers: int = PHOTO_WORKERS, queue_size: int = QUEUE_SIZE, parse_mode: str = PARSE_POOL,
+                 report_interval: float = REPORT_INTERVAL):
+        self.pool = pool or get_pool()
+        self.write_conn = self.pool.getconn()
+        try:
+            self.lookup_conn = self.pool.getconn()
+        except Exception:
+            self.pool.putconn(self.write_conn)
+            raise
+        self.lookup_conn.autocommit = True
+        self._lookup_lock = threading.Lock()
+
+        self.writer = ListingWriter(self.write_conn)
+        self.parse_mode = parse_mode
+        self.report_interval = report_interval
+        self._written = []
+        self._written_lock = threading.Lock()
+        self._stop_reporting = threading.Event()
+        self._reporter = None
+
+        self.stages = [
+            Stage('fetch', self._fetch, fetch_workers, queue_size),
+            Stage('parse', self._parse, parse_workers, queue_size),
+            Stage('photos', self._photos, photo_workers, queue_size),
+            Stage('write', self._write, 1, queue_size, on_idle=self._flush_if_due),
+        ]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        if self.report_interval:
+            self._reporter = threading.Thread(target=self._report_periodically, name="pipeline-report", daemon=True)
+            self._reporter.start()
+
+    def submit(self, offer: dict):
+        """
+        Adds a new offer (entry from the search results: 'listing_id', 'area', 'price', 'price_per_m', 'link')
+        to the pipeline, blocks while the fetch queue is full
+        """
+        self.stages[0].put(offer)
+
+    def _fetch(self, offer: dict):
+        response = fetch_page(offer['link'])
+        if response is None:
+            logger.error(f"Nie udało się pobrać oferty {offer['listing_id']} ({offer['link']})")
+            return None
+        return response.content
+
+    def _parse(self, content: bytes):
+        if self.parse_mode == 'process':
+            offer_data, parse_seconds, transform_seconds = _get_parse_pool().submit(parse_listing, content).result()
+        else:
+            offer_data, parse_seconds, transform_seconds = parse_listing(content)
+        metrics.observe('parse_seconds', parse_seconds)
+        metrics.observe('transform_seconds', transform_seconds)
+        return offer_data
+
+    def _photos(self, offer_data: dict):
+        image_urls = offer_data.pop('image_urls')
+        with self._lookup_lock:
+            cur = self.lookup_conn.cursor()
+            try:
+                known_hashes = find_known_photos(cur, image_urls)
+            finally:
+                cur.close()
+        offer_data['images'] = collect_photos(submit_photos(image_urls, known_hashes), known_hashes)
+        logger.debug("Dane oferty %s zostały pobrane", offer_data['listing_id'])
+        return offer_data
+
+    def _write(self, offer_data: dict):
+        self._record_written(self.writer.add(offer_data))
+        return None
+
+    def _flush_if_due(self):
+        # gdy nowe oferty przestały napływać, bufor zapisu jest opróżniany po flush_interval
+        if self.writer.is_flush_due():
+            self._record_written(self.writer.flush())
+        return None
+
+    def _record_written(self, created: list):
+        if created:
+            with self._written_lock:
+                self._written.extend(created)
+
+    def pop_written(self) -> list:
+        """
+        Returns the (otodom listing id, id in db) tuples of the offers written since the last call
+        """
+        with self._written_lock:
+            written, self._written = self._written, []
+        return written
+
+    @property
+    def listings_written(self) -> int:
+        return self.writer.listings_written
+
+    def get_stats(self) -> dict:
+        return {stage.name: stage.get_stats() for stage in self.stages}
+
+    def report(self):
+        logger.info("Pipeline: " + ", ".join(
+            f"{name}: kolejka {stats['queued']} (max {stats['max_queued']}), {stats['processed']} ofert, {stats['per_second']}/s"
+            for name, stats in self.get_stats().items()))
+
+    def _report_periodically(self):
+        while not self._stop_reporting.wait(self.report_interval):
+            self.report()
+
+    def close(self):
+        """
+        Waits until all submitted offers are written, flushes the writer and returns the connections to the pool
+        """
+        try:
+            for stage in self.stages:
+                stage.stop()
+            self._record_written(self.writer.flush())
+        finally:
+            self._stop_reporting.set()
+            self.report()
+            logger.info(f"Zapisano {self.writer.listings_written} nowych ofert ({self.writer.rows_per_second:.0f} wierszy/s)")
+            self.pool.putconn(self.write_conn)
+            self.pool.putconn(self.lookup_conn)
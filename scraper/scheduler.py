@@ -0,0 +1,197 @@
+import os, json, time, threading, logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlencode
+from scraper.scraper import extract_city_from_url
+
+logger = logging.getLogger(__name__)
+
+
+SEARCH_BASE_URL = "https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie"
+
+# Parametry dodawane do kazdego wyszukiwania: od najnowszych, max liczba ofert na stronę
+DEFAULT_SEARCH_PARAMS = {'viewType': 'listing', 'by': 'LATEST', 'direction': 'DESC', 'limit': 72}
+
+DEFAULT_REFRESH_INTERVAL = 60  # minuty
+DEFAULT_FULL_CRAWL_EVERY = 1  # co które uruchomienie pełne przejście wyszukiwania (1 - zawsze)
+DEFAULT_MAX_CONCURRENT_SEARCHES = 2
+
+# Jak szybko "wygasa" aktywność wyszukiwania (0 - liczy się tylko ostatnie uruchomienie)
+ACTIVITY_DECAY = 0.5
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'config.json')
+
+
+def build_search_url(search: dict) -> str:
+    """
+    Builds the Otodom search URL of a search definition
+
+    Args:
+        search (dict): Search definition with either 'url', or 'region' (voivodeship or the location
+                       path before the city, e.g. 'slaskie/katowice/katowice'), 'city' and optional
+                       'filters' (additional query parameters, e.g. {"priceMax": 700000})
+
+    Returns:
+        str: The search URL
+    """
+    if search.get('url'):
+        return search['url']
+
+    params = dict(DEFAULT_SEARCH_PARAMS)
+    params.update(search.get('filters') or {})
+    location = '/'.join(part.strip('/') for part in (search['region'], search['city']))
+    return f"{SEARCH_BASE_URL}/{location}?{urlencode(params)}"
+
+
+def load_search_config(path: str = CONFIG_PATH) -> dict:
+    """
+    Loads the search definitions and the scheduler settings from a JSON file
+
+    Example:
+        {
+            "max_concurrent_searches": 2,
+            "default_refresh_interval": 60,
+            "full_crawl_every": 6,
+            "host_intervals": {"www.otodom.pl": [0.5, 1.0]},
+            "searches": [
+                {"region": "slaskie/katowice/katowice", "city": "katowice", "refresh_interval": 30, "full_crawl_every": 12},
+                {"region": "slaskie/gliwice/gliwice", "city": "gliwice", "filters": {"priceMax": 700000}}
+            ]
+        }
+
+    Args:
+        path (str): Path to the config file
+
+    Returns:
+        dict: The config, every search has 'name', 'url', 'city', 'refresh_interval' (minutes) and
+        'full_crawl_every' filled in
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    default_interval = config.get('default_refresh_interval', DEFAULT_REFRESH_INTERVAL)
+    full_crawl_every = config.get('full_crawl_every', DEFAULT_FULL_CRAWL_EVERY)
+    searches = []
+    for search in config.get('searches', []):
+        search = dict(search)
+        search['url'] = build_search_url(search)
+        search['city'] = extract_city_from_url(search['url']) or search.get('city')
+        search.setdefault('name', search['city'])
+        search.setdefault('refresh_interval', default_interval)
+        search.setdefault('full_crawl_every', full_crawl_every)
+        searches.append(search)
+
+    config['searches'] = searches
+    return config
+
+
+class SearchScheduler:
+    """
+    Runs the searches from the config in a shared pool of workers
+
+    Each search is run again when its refresh interval has passed. When more searches are due than
+    there are free workers, the recently active ones (with many new, changed or closed offers in
+    the last runs) go first. The HTTP requests of all searches go through the shared FetchEngine,
+    so the per-host rate budgets apply to all of them together
+
+    Every full_crawl_every-th run of a search (starting with the first one) is a full crawl, the other
+    runs are incremental (they stop at the first page of already known offers, see crawl_search()).
+    The run counters start from 0 or from restore_runs()
+
+    Args:
+        searches (list): Search definitions (see load_search_config())
+        run_search (callable): Runs one crawl, called with the search definition and full_crawl (bool),
+                               returns a dict with the number of 'new', 'changed' and 'closed' offers
+        max_workers (int): How many searches can run at the same time
+    """
+
+    def __init__(self, searches: list, run_search, max_workers: int = DEFAULT_MAX_CONCURRENT_SEARCHES):
+        self.searches = searches
+        self.run_search = run_search
+        self.max_workers = max_workers
+        self.activity = {search['name']: 0.0 for search in searches}
+        self.next_run = {search['name']: 0.0 for search in searches}
+        self.runs = {search['name']: 0 for search in searches}
+        self.last_stats = {}
+        self._lock = threading.Lock()
+
+    def due_searches(self, now: float) -> list:
+        """
+        Returns the searches due at the given time (time.monotonic()), the most active first
+        """
+        with self._lock:
+            due = [search for search in self.searches if self.next_run[search['name']] <= now]
+            return sorted(due, key=lambda search: (-self.activity[search['name']], self.next_run[search['name']]))
+
+    def restore_runs(self, counts: dict):
+        """
+        Sets the run counters of the searches (search name -> number of runs since the last full crawl),
+        e.g. from the run journal when every process runs the searches only once (cron)
+        """
+        with self._lock:
+            self.runs.update({name: count for name, count in counts.items() if name in self.runs})
+
+    def is_full_crawl_due(self, search: dict) -> bool:
+        with self._lock:
+            return self.runs[search['name']] % max(search.get('full_crawl_every', DEFAULT_FULL_CRAWL_EVERY), 1) == 0
+
+    def _run(self, search: dict, full_crawl: bool = None):
+        name = search['name']
+        started = time.monotonic()
+        if full_crawl is None:
+            full_crawl = self.is_full_crawl_due(search)
+        try:
+            stats = self.run_search(search, full_crawl) or {}
+        except Exception as error:
+            logger.exception(f"Error during running search {name}: {error}")
+            stats = {}
+
+        changes = sum(stats.get(key, 0) for key in ('new', 'changed', 'closed'))
+        with self._lock:
+            self.activity[name] = self.activity[name] * ACTIVITY_DECAY + changes
+            self.next_run[name] = started + search['refresh_interval'] * 60
+            self.last_stats[name] = stats
+            self.runs[name] += 1
+        logger.info(f"Wyszukiwanie {name} zakończone w {time.monotonic() - started:.0f} s: {stats}")
+
+    def run_once(self, full_crawl: bool = True):
+        """
+        Runs every search once (the most active first) and waits for all of them
+
+        Args:
+            full_crawl (bool): Full (True) or incremental (False) crawls, None - according to full_crawl_every
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="search") as executor:
+            for search in self.due_searches(float('inf')):
+                executor.submit(self._run, search, full_crawl)
+
+    def run_forever(self, stop_event: threading.Event = None):
+        """
+        Keeps running the searches when they are due, until stop_event is set
+        """
+        stop_event = stop_event or threading.Event()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="search") as executor:
+            while not stop_event.is_set():
+                # nowe zadania tylko na wolne miejsca, zeby kolejność ustalać w chwili zwolnienia workera
+                free = self.max_workers - len(running)
+                for search in self.due_searches(time.monotonic()):
+                    if free <= 0:
+                        break
+                    if search['name'] not in running.values():
+                        running[executor.submit(self._run, search)] = search['name']
+                        free -= 1
+
+                # czekamy do końca któregoś z wyszukiwań albo do terminu kolejnego (gdy jest wolny worker)
+                timeout = 60
+                if free > 0:
+                    with self._lock:
+                        idle = [self.next_run[name] for name in self.next_run if name not in running.values()]
+                    timeout = max(0.0, min(min(idle, default=float('inf')) - time.monotonic(), 60))
+                if running:
+                    done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del running[future]
+                else:
+                    stop_event.wait(timeout)
+
+            wait(running)
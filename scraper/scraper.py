@@ -1,19 +1,33 @@
-import requests, logging
+import os, requests, logging
+from urllib.parse import urlsplit
 from urllib.robotparser import RobotFileParser
 from scraper.utils import save_data_to_excel
-
-from scraper.fetch_and_parse import fetch_page, download_data_from_search_results, download_data_from_listing_page, categorize_offers_for_db, find_closed_offers
+from scraper import http_session
+
+from scraper.fetch_and_parse import fetch_page, download_data_from_search_results, download_data_from_listing_page, find_closed_offers, iter_search_result_pages
+from db.db_operations import categorize_offers, apply_price_changes, update_deleted_offers
+from scraper.pipeline import ListingPipeline
+from scraper.offers import OfferBatch
+from config.metrics import metrics
+from db.run_journal import RunJournal
 from scraper.transform_data import transform_data
 
+logger = logging.getLogger(__name__)
+
 url_main = "https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice?by=LATEST&direction=DESC"
 
+# Tryb przyrostowy: ile stron wyszukiwania pobierać do przodu (kolejne mogą nie być potrzebne)
+INCREMENTAL_PREFETCH_PAGES = int(os.getenv('INCREMENTAL_PREFETCH_PAGES', 1))
+
 
 def is_allowed_to_scrape(url: str) -> bool:
     domain = '/'.join(url.split('/')[:3])
     robots_url = domain + '/robots.txt'
 
     try:
-        response = requests.get(robots_url, headers={"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"})
+        response = http_session.get(robots_url)
+        if response is None:
+            return False
         response.raise_for_status() 
         rp = RobotFileParser()
         rp.parse(response.text.splitlines())
@@ -34,46 +48,11 @@ def scrape_all_pages_to_excel(url=url_main): # Not in use, left just in case, no
         response = fetch_page(link_offer)
         offer_data = download_data_from_listing_page(response)
         cleaned_offer_data = transform_data(offer_data)
-        cleaned_offer_data.pop('images')
+        cleaned_offer_data.pop('image_urls')
         save_data_to_excel(cleaned_offer_data, 'output_data/data_katowice.xlsx')
         
 
-def scrape_offer(offer_to_insert: dict) -> dict:
-    """
-    Scrapes data from a listing page for a new offer and transforms it into a structured format for insertion into the database.
-
-    This function takes an offer that is not yet in the database, fetches the page using the offer's URL, 
-    downloads the offer's data, cleans, and transforms it into a standardized format for database insertion.
-
-    Args:
-        offer_to_insert (dict): A dictionary containing offer data from Otodom, including 
-                                'listing_id' and 'area', 'price', 'price_per_m', 'link' 
-                                (single entry from download_data_from_search_results())
-
-    Returns:
-        dict: A dictionary containing the cleaned and transformed data for the offer, ready to be inserted into the database.
-
-    Raises:
-        Exception: If there is an error during the scraping process, such as issues with fetching the page or transforming the data
-    """
-
-    try:
-        offer_url = offer_to_insert.get("link")
-        id = offer_to_insert.get("listing_id")
-
-        response = fetch_page(offer_url)
-        offer_data = download_data_from_listing_page(response)
-        cleaned_offer_data = transform_data(offer_data)
-
-        logging.debug(f"Dane oferty {id} zostały pobrane")
-
-        return cleaned_offer_data
-    except Exception as error:
-        logging.exception(f"Error during scraping page offer: {error}")
-        return None
-
-
-def scrape_all_pages(url): # jednak NOT IN USE LEFT IN CASE (zbyt duzo pamieci na raz, wole kazda oferte analizowac na biezaco)
+def scrape_all_pages(url, city, cur): # jednak NOT IN USE LEFT IN CASE (zbyt duzo pamieci na raz, wole kazda oferte analizowac na biezaco)
     """
     new_offers to lista słowników tak jak w danych wejściwoych czyli wynik download_data_from_search_results() (listing_id, area, price, price_per_m, link)
     need_update_offers to lista słowników z wartsociami id, new_price i new_price_per_m
@@ -84,9 +63,9 @@ def scrape_all_pages(url): # jednak NOT IN USE LEFT IN CASE (zbyt duzo pamieci n
     print(f"Liczba znalezionych ofert: {len(all_offers_basic)}")
     print('-' * 40)
 
-    need_update_offers, new_offers = categorize_offers_for_db(all_offers_basic)
+    new_offers, need_update_offers, _ = categorize_offers(all_offers_basic, cur)
 
-    deleted_offers = find_closed_offers(all_offers_basic)
+    deleted_offers = find_closed_offers(all_offers_basic, city, cur)
 
     print(f"Nowych ofert:{len(new_offers)}")
     print(f"Ofert, w których zmieniła się cena i wymagają update:{len(need_update_offers)}")
@@ -98,4 +77,132 @@ def scrape_all_pages(url): # jednak NOT IN USE LEFT IN CASE (zbyt duzo pamieci n
 
 
 def extract_city_from_url(url: str) ->str:
-    pass
+    """
+    Extracts the city from an Otodom search URL
+
+    The location part of the path is voivodeship/county/commune/city[/district], shorter forms
+    (e.g. slaskie/katowice) end with the searched city
+
+    Args:
+        url (str): Search URL, e.g. https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice/katowice/katowice?limit=72
+
+    Returns:
+        str: The city as in the URL (e.g. 'katowice'), or None if the URL does not contain a location
+    """
+    path = urlsplit(url).path.strip('/').split('/')
+    if 'wyniki' not in path:
+        return None
+
+    # /pl/wyniki/<rodzaj transakcji>/<rodzaj nieruchomości>/<lokalizacja...>
+    location = path[path.index('wyniki') + 3:]
+    if len(location) < 2:
+        return None
+    return location[3] if len(location) >= 4 else location[-1]
+
+
+def iter_journaled_pages(url: str, journal, prefetch: int = None):
+    """
+    Yields the search pages recorded in the run journal, then fetches the remaining ones (from the
+    next page) with iter_search_result_pages(), recording each of them in the journal
+
+    Yields:
+        tuple: (page number, OfferBatch of the offers from that page)
+    """
+    # strony wczytane przy wznowieniu są zwalniane po przekazaniu (oferty trafiają do wyników przebiegu)
+    for page in sorted(journal.resumed_pages):
+        yield page, journal.resumed_pages.pop(page)
+    if journal.search_done:
+        return
+
+    search_pages = iter_search_result_pages(url, prefetch=prefetch, start_page=journal.next_page)
+    try:
+        for page, offers in search_pages:
+            journal.record_page(page, offers)
+            yield page, offers
+    finally:
+        search_pages.close()
+
+
+def crawl_search(url: str, city: str, conn, cur, full_crawl: bool = True) -> dict:
+    """
+    Runs one crawl of a search: inserts new offers, updates changed prices and closes offers
+    that are no longer listed
+
+    An incremental crawl (full_crawl=False) relies on the search being sorted from the newest offers:
+    it stops at the first page on which all offers are already in the database with the same price,
+    and it does not look for closed offers (that needs the complete list of offers of the search)
+
+    The crawl is recorded in a run journal (db.run_journal.RunJournal). If the previous crawl of the same
+    URL was interrupted, it is resumed (in its original mode) instead of starting from the first page
+
+    Args:
+        url (str): Search URL (sorted from the newest offers, max limit of offers per page)
+        city (str): City of the search, used to find the offers closed in the meantime
+        conn (connection): Database connection used only by this crawl
+        cur (cursor): Database cursor of the connection
+        full_crawl (bool): Walk all pages and check closed offers (True) or crawl incrementally (False)
+
+    Returns:
+        dict: Number of 'new', 'changed' and 'closed' offers, of all 'offers' found in the search and of
+        the 'pages' processed, whether it was a 'full_crawl' and whether it was 'resumed'
+    """
+    journal = RunJournal.begin(conn, url, full_crawl)
+    full_crawl = journal.full_crawl
+
+    # Pobierz dane - oferty przychodzą strona po stronie, kazda strona jest sprawdzana od razu,
+    # bez czekania na pobranie wszystkich stron wyszukiwania
+    logger.info(f"[{city}] Rozpoczynam pobieranie podstawowych danych z wyniku wyszukiwania oraz sprawdzanie i pobieranie ofert...")
+    all_offers_basic_from_sarching_page = OfferBatch()  # kolumnowo, bez słownika na ofertę
+    all_changed_offers = []
+    pages = 0
+    prefetch = None if full_crawl else INCREMENTAL_PREFETCH_PAGES
+    search_pages = iter_journaled_pages(url, journal, prefetch=prefetch)
+    # nowe oferty są pobierane, parsowane i zapisywane (w paczkach, na osobnym połączeniu) w tle,
+    # w tym czasie sprawdzane są kolejne strony wyszukiwania
+    with ListingPipeline() as pipeline:
+        for page, page_offers in search_pages:
+            pages += 1
+            all_offers_basic_from_sarching_page.extend(page_offers)
+
+            # Sprawdz ktore oferty juz sa w bazie (jedno zapytanie dla całej strony wyników)
+            new_offers, changed_offers, unchanged_offers = categorize_offers(page_offers, cur)
+
+            # Oferty, których nie ma jeszcze w bazie - do pobrania i zapisu
+            for offer in new_offers:
+                pipeline.submit(offer)
+
+            # Oferty, w których zmieniła się cena - zapisywane razem po przejściu wyszukiwania
+            all_changed_offers.extend(changed_offers)
+
+            journal.record_inserted(pipeline.pop_written())
+
+            # Tryb przyrostowy - cała strona znana i bez zmian cen, dalej są juz tylko starsze oferty
+            if not full_crawl and not new_offers and not changed_offers:
+                logger.info(f"[{city}] Strona {page} bez nowych ofert i zmian cen, kończę pobieranie (tryb przyrostowy)")
+                break
+        search_pages.close() # anuluje strony pobierane do przodu
+
+    journal.record_inserted(pipeline.pop_written())
+
+    # Zmiany cen z całego przebiegu - jedna transakcja (po przerwaniu wznowiony przebieg wykryje je ponownie)
+    changed_count = apply_price_changes(all_changed_offers, conn, cur)
+    logger.info(f"[{city}] Zaktualizowano ceny {changed_count} ofert")
+    journal.record_search_done()
+
+    # Na koncu sprawdz, czy sa jakies usuniete oferty (tylko przy pełnym przejściu wyszukiwania)
+    deleted_offers = set()
+    if full_crawl:
+        logger.info(f"[{city}] Rozpoczynam sprawdzanie czy czy jakieś oferty nie zostały usunięte z otodom...")
+        deleted_offers = find_closed_offers(all_offers_basic_from_sarching_page, city, cur, journal) or set()
+        if deleted_offers:
+            logger.info("Rozpocznynam update ofert w bazie, które zostały usunięte...")
+            update_deleted_offers(deleted_offers, conn, cur)
+
+    journal.finish()
+
+    metrics.inc('offers_total', pipeline.listings_written, result='new')
+    metrics.inc('offers_total', changed_count, result='changed')
+    metrics.inc('offers_total', len(deleted_offers), result='closed')
+
+    return {'offers': len(all_offers_basic_from_sarching_page), 'pages': pages, 'full_crawl': full_crawl, 'resumed': journal.resumed,
+            'new': pipeline.listings_written, 'changed': changed_count, 'closed': len(deleted_offers)}
@@ -13,6 +13,9 @@ def save_data_to_excel(data:dict, file_name:str="output_data/data.xlsx"):
     Raises:
         FileNotFoundError: If the Excel file does not exist and cannot be created.
     """
+    # pandas (i openpyxl) ładowane dopiero tutaj - zwykłe uruchomienie scrapera ich nie potrzebuje
+    import pandas as pd
+
     df = pd.DataFrame([data])
 
     try:
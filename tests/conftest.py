@@ -0,0 +1,140 @@
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+# ustawienie ścieżki do kodu
+scraper_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+if scraper_path not in sys.path:
+    sys.path.insert(0, scraper_path)
+
+from scraper.fetch_engine import FetchEngine, set_engine
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'otodom')
+
+
+class OtodomStandIn(BaseHTTPRequestHandler):
+    """
+    Local stand-in for otodom.pl serving the recorded pages from tests/fixtures/otodom:
+    - /pl/wyniki/...?page=N -> search_page_N.html (page 1 without the page parameter)
+    - /pl/oferta/<slug>     -> listing_<slug>.html
+    - /images/...           -> photo.jpg
+    Paths in `statuses` are answered with the given status code and no body instead (a list of status
+    codes is used up one per request, then the page is served). With `etag` set, pages are served with
+    that ETag and a request with a matching If-None-Match gets 304
+    """
+    # ustawiane przez fixture
+    base_url = None
+    statuses = {}
+    etag = None
+    delay = 0.0
+    requests_log = []
+    request_headers = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        parts = urlsplit(self.path)
+        if parts.path.startswith('/pl/wyniki/'):
+            page = parse_qs(parts.query).get('page', ['1'])[0]
+            return f"search_page_{page}.html", "text/html; charset=utf-8"
+        if parts.path.startswith('/pl/oferta/'):
+            slug = parts.path.rsplit('/', 1)[-1]
+            return f"listing_{slug}.html", "text/html; charset=utf-8"
+        if parts.path.startswith('/images/'):
+            return "photo.jpg", "image/jpeg"
+        return None, None
+
+    def _queued_status(self):
+        status = type(self).statuses.get(self.path)
+        if isinstance(status, list):
+            return status.pop(0) if status else None
+        return status
+
+    def do_GET(self):
+        self._serve(with_body=True)
+
+    def do_HEAD(self):
+        self._serve(with_body=False)
+
+    def _serve(self, with_body):
+        cls = type(self)
+        with cls.lock:
+            cls.requests_log.append((time.monotonic(), self.path))
+            cls.request_headers.append(dict(self.headers))
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            if cls.delay:
+                time.sleep(cls.delay)
+
+            status = self._queued_status()
+            if status is not None:
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            file_name, content_type = self._resolve()
+            path = os.path.join(FIXTURES_DIR, file_name) if file_name else None
+            if path is None or not os.path.exists(path):
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            if cls.etag and self.headers.get('If-None-Match') == cls.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            with open(path, 'rb') as f:
+                body = f.read()
+            if content_type.startswith('text/html'):
+                body = body.replace(b'{{BASE_URL}}', cls.base_url.encode())
+
+            self.send_response(200)
+            if cls.etag:
+                self.send_header('ETag', cls.etag)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if with_body:
+                self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+@pytest.fixture
+def otodom_server():
+    handler = type('Handler', (OtodomStandIn,), {'requests_log': [], 'request_headers': [], 'in_flight': 0,
+                                                 'max_in_flight': 0, 'statuses': {}, 'lock': threading.Lock()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    handler.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield handler
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def engine():
+    """Shared FetchEngine without the host budget (the stand-in server is local)"""
+    engine = FetchEngine(max_concurrency=4, host_interval=(0, 0))
+    previous = set_engine(engine)
+    yield engine
+    engine.close()
+    set_engine(previous)
@@ -0,0 +1,121 @@
+from decimal import Decimal
+
+import pytest
+
+from db import bulk_writer
+from db.bulk_writer import ListingWriter
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeCursor:
+    def close(self):
+        pass
+
+
+class FakeResolver:
+    def __init__(self):
+        self.confirmed = 0
+        self.rolled_back = 0
+
+    def resolve_offer(self, cur, offer_data):
+        return 1
+
+    def confirm(self):
+        self.confirmed += 1
+
+    def rollback(self):
+        self.rolled_back += 1
+
+
+def offer(n: int, images: int = 0) -> dict:
+    return {'listing_id': 66100000 + n, 'area': 48.51 + n, 'images': [b'photo'] * images}
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """
+    Records the statements of the writer: RETURNING of the listings INSERT answers with the rows
+    in `database['returned']` (None - every offer inserted, ids 1, 2, ...)
+    """
+    state = {'returned': None, 'fail': False, 'statements': [], 'photos': [], 'one_by_one': []}
+
+    def execute_values(cur, query, rows, page_size=100, fetch=False):
+        if state['fail']:
+            raise RuntimeError("batch failed")
+        state['statements'].append((query.split()[2], rows))
+        if fetch:
+            if state['returned'] is not None:
+                return state['returned']
+            return [(position + 1, row[0], Decimal(str(row[1]))) for position, row in enumerate(rows)]
+
+    def insert_photos(cur, rows):
+        state['photos'].extend(rows)
+        return len(rows)
+
+    def insert_new_listing(offer_data, conn, cur):
+        state['one_by_one'].append(offer_data['listing_id'])
+        return None if offer_data['listing_id'] == 66100002 else offer_data['listing_id'] - 66100000 + 100
+
+    monkeypatch.setattr(bulk_writer, 'execute_values', execute_values)
+    monkeypatch.setattr(bulk_writer, 'insert_photos', insert_photos)
+    monkeypatch.setattr(bulk_writer, 'insert_new_listing', insert_new_listing)
+    monkeypatch.setattr(bulk_writer, 'get_listing_values', lambda offer_data, location_id: (offer_data['listing_id'], offer_data['area']))
+    monkeypatch.setattr(bulk_writer, 'get_features_values', lambda offer_data, id: (id,))
+    return state
+
+
+def test_offer_already_in_buffer_is_skipped(database):
+    writer = ListingWriter(FakeConnection(), batch_size=10, flush_interval=float('inf'), location_resolver=FakeResolver())
+
+    assert writer.add(offer(1)) == []
+    assert writer.add(dict(offer(1), area=49.510000001)) == []  # ta sama powierzchnia po zaokrągleniu
+    created = writer.flush()
+
+    assert created == [(66100001, 1)]
+    assert database['statements'][0] == ('apartments_sale_listings', [(66100001, 49.51)])
+
+
+def test_offers_skipped_by_on_conflict_get_no_features_or_photos(database):
+    conn, resolver = FakeConnection(), FakeResolver()
+    # oferta 2 jest juz w bazie - RETURNING zwraca tylko oferty 1 i 3 (w innej kolejności)
+    database['returned'] = [(7, 66100003, Decimal('51.51')), (5, 66100001, Decimal('49.51'))]
+
+    with ListingWriter(conn, batch_size=10, flush_interval=float('inf'), location_resolver=resolver) as writer:
+        for n in (1, 2, 3):
+            writer.add(offer(n, images=n))
+
+    assert writer.listings_written == 2
+    assert database['statements'][1] == ('features', [(5,), (7,)])
+    assert [(id, position) for id, position, _ in database['photos']] == [(5, 0), (7, 0), (7, 1), (7, 2)]
+    assert writer.rows_written == 2 + 2 + 4
+    assert (conn.commits, resolver.confirmed) == (1, 1)
+
+
+def test_failed_batch_falls_back_to_one_by_one(database):
+    conn, resolver = FakeConnection(), FakeResolver()
+    database['fail'] = True
+    writer = ListingWriter(conn, batch_size=3, flush_interval=float('inf'), location_resolver=resolver)
+
+    writer.add(offer(1))
+    writer.add(offer(2))
+    created = writer.add(offer(3, images=2))
+
+    assert database['one_by_one'] == [66100001, 66100002, 66100003]
+    assert created == [(66100001, 101), (66100003, 103)]  # oferta 2 nie została zapisana
+    assert writer.rows_written == 2 + 4
+    # wycofana paczka i nieudana oferta
+    assert (conn.rollbacks, resolver.rolled_back) == (2, 1)
@@ -0,0 +1,174 @@
+import pytest
+
+from db import db_operations
+from db.db_operations import copy_rows, apply_price_changes, categorize_offers
+from scraper.fetch_and_parse import find_potentially_deleted_offers
+from scraper.offers import OfferBatch
+
+
+class FakeCopyCursor:
+    """Reads the COPY input in small chunks, as psycopg2 does"""
+    def __init__(self):
+        self.query = None
+        self.data = ''
+        self.rowcount = -1
+
+    def copy_expert(self, query, file, size=7):
+        self.query = query
+        while chunk := file.read(size):
+            self.data += chunk
+        self.rowcount = self.data.count('\n')
+
+
+def test_copy_rows_streams_text_format():
+    cur = FakeCopyCursor()
+    rows = iter([(66100001, 48.5), (66100002, None), (66100003, "a\tb\\c")])
+
+    assert copy_rows(cur, 'crawl_search_offers', ('otodom_listing_id', 'area'), rows) == 3
+    assert cur.query == "COPY crawl_search_offers (otodom_listing_id, area) FROM STDIN"
+    assert cur.data == "66100001\t48.5\n66100002\t\\N\n66100003\ta\\tb\\\\c\n"
+
+
+class FailingCopyConnection:
+    """Connection whose cursor fails on COPY, records the statements and the rollback"""
+    def __init__(self):
+        self.statements = []
+        self.rolled_back = False
+        self.committed = False
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def commit(self):
+        self.committed = True
+
+
+class FailingCopyCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        self.connection.statements.append(query)
+
+    def copy_expert(self, query, file):
+        raise RuntimeError("COPY failed")
+
+
+def test_failed_copy_rolls_back_temp_table():
+    conn = FailingCopyConnection()
+    offers = OfferBatch([{'listing_id': 66100001, 'area': 48.51, 'price': 455000, 'price_per_m': 9380.0,
+                          'link': None}])
+
+    with pytest.raises(RuntimeError):
+        find_potentially_deleted_offers(offers, 'Katowice', FailingCopyCursor(conn))
+
+    assert 'CREATE TEMP TABLE crawl_search_offers' in conn.statements[0]
+    assert conn.rolled_back and not conn.committed
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeCursor:
+    rowcount = -1
+
+
+def test_price_changes_are_applied_with_one_values_list(monkeypatch):
+    statements = []
+
+    def execute_values(cur, query, values, template=None, page_size=100):
+        statements.append((query.split()[0], values, template))
+        cur.rowcount = len(values)
+
+    monkeypatch.setattr(db_operations, 'execute_values', execute_values)
+    conn, cur = FakeConnection(), FakeCursor()
+    changes = [{'id': 1, 'new_price': 455000, 'new_price_per_m': 9380.0},
+               {'id': 2, 'new_price': 612000, 'new_price_per_m': 9696.0},
+               {'id': 1, 'new_price': 450000, 'new_price_per_m': 9276.0}]  # ta sama oferta na dwóch stronach
+
+    assert apply_price_changes(changes, conn, cur) == 2
+
+    expected = [(1, 450000, 9276.0), (2, 612000, 9696.0)]
+    assert [(statement, values) for statement, values, _ in statements] == [('INSERT', expected), ('UPDATE', expected)]
+    assert conn.commits == 1 and conn.rollbacks == 0
+
+
+def test_failed_price_changes_are_rolled_back(monkeypatch):
+    def execute_values(cur, query, values, template=None, page_size=100):
+        if query.split()[0] == 'UPDATE':
+            raise RuntimeError("deadlock detected")
+
+    monkeypatch.setattr(db_operations, 'execute_values', execute_values)
+    conn = FakeConnection()
+
+    assert apply_price_changes([{'id': 1, 'new_price': 455000, 'new_price_per_m': 9380.0}], conn, FakeCursor()) == 0
+    assert conn.commits == 0 and conn.rollbacks == 1
+    assert apply_price_changes([], conn, FakeCursor()) == 0
+
+
+def test_categorize_offers_splits_new_changed_and_unchanged(monkeypatch):
+    # apartments_sale_listings: (otodom_listing_id, area) -> (id, updated_price)
+    listings = {(66100001, 48.51): (1, 455000), (66100002, 63.12): (2, 600000), (66100003, 70.0): (3, 700000)}
+    queries = []
+
+    def execute_values(cur, query, values, template=None, page_size=100, fetch=False):
+        # LEFT JOIN z warunkiem price_changed jak w zapytaniu categorize_offers()
+        queries.append(query)
+        rows = []
+        for idx, listing_id, area, price in values:
+            id_db, old_price = listings.get((listing_id, area), (None, None))
+            rows.append((idx, id_db, old_price, price is not None and old_price != price))
+        return rows
+
+    monkeypatch.setattr(db_operations, 'execute_values', execute_values)
+    offers = OfferBatch([
+        {'listing_id': 66100001, 'area': 48.51, 'price': 455000, 'price_per_m': 9380.0, 'link': None},  # bez zmian
+        {'listing_id': 66100002, 'area': 63.12, 'price': 612000, 'price_per_m': 9696.0, 'link': None},  # nowa cena
+        {'listing_id': 66100003, 'area': 70.0, 'price': None, 'price_per_m': None, 'link': None},  # cena ukryta
+        {'listing_id': 66100004, 'area': 51.0, 'price': 500000, 'price_per_m': 9803.0, 'link': None},  # nowa oferta
+    ])
+
+    new_offers, changed_offers, unchanged_offers = categorize_offers(offers, None)
+
+    assert "v.price IS NOT NULL" in queries[0]
+    assert new_offers == [offers[3]]
+    assert changed_offers == [{'id': 2, 'listing_id': 66100002, 'old_price': 600000, 'new_price': 612000,
+                               'new_price_per_m': 9696.0}]
+    # brak ceny w wynikach wyszukiwania to nie zmiana ceny
+    assert unchanged_offers == [offers[0], offers[2]]
+    assert categorize_offers(OfferBatch(), None) == ([], [], [])
+
+
+class FakePhotoCursor:
+    def __init__(self, stored_hashes):
+        self.stored_hashes = stored_hashes
+        self.result = []
+
+    def execute(self, query, params=None):
+        self.result = [(memoryview(hash),) for hash in params[0] if hash in self.stored_hashes]
+
+    def fetchall(self):
+        return self.result
+
+
+def test_only_missing_photo_blobs_are_sent(monkeypatch):
+    sent = {}
+    monkeypatch.setattr(db_operations, 'execute_values',
+                        lambda cur, query, values, page_size=100: sent.setdefault(query.split()[2], values))
+    known = {'url': "http://cdn/known.jpg", 'hash': b'\x01' * 32, 'content': b'known'}
+    new = {'url': "http://cdn/new.jpg", 'hash': b'\x02' * 32, 'content': b'new'}
+
+    written = db_operations.insert_photos(FakePhotoCursor({known['hash']}), [(7, 0, known), (7, 1, new)])
+
+    assert sent['photo_blobs'] == [(new['hash'], b'new', new['url'], 3)]
+    assert sent['photos'] == [(7, known['hash'], 0), (7, new['hash'], 1)]
+    assert written == 3
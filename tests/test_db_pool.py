@@ -0,0 +1,74 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import psycopg2.extensions
+import psycopg2.pool
+import pytest
+
+from db.pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.healthy = True
+        self.rollbacks = 0
+        self.info = SimpleNamespace(transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        if not self.healthy:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def test_returned_connection_is_reset_and_reused():
+    pool = ConnectionPool(2, connect=FakeConnection)
+
+    with pool.connection() as conn:
+        conn.autocommit = True
+        conn.execute("SELECT 1;")
+    with pool.connection() as again:
+        assert again is conn
+        assert not again.autocommit
+
+    stats = pool.get_stats()
+    assert stats['open'] == 1 and stats['checkouts'] == 2 and stats['in_use'] == 0
+
+
+def test_getconn_waits_for_a_free_connection_and_times_out():
+    pool = ConnectionPool(1, timeout=0.2, connect=FakeConnection)
+    conn = pool.getconn()
+
+    with pytest.raises(psycopg2.pool.PoolError):
+        pool.getconn()
+
+    threading.Timer(0.05, pool.putconn, (conn,)).start()
+    assert pool.getconn() is conn
+    stats = pool.get_stats()
+    assert stats['waits'] == 1 and stats['max_wait'] > 0
+    assert stats['max_in_use'] == 1 and 0 < stats['utilization'] <= 1
+
+
+def test_broken_idle_connection_is_replaced():
+    pool = ConnectionPool(2, check_idle=0, connect=FakeConnection)
+    with pool.connection() as conn:
+        pass
+    conn.healthy = False
+    time.sleep(0.01)
+
+    with pool.connection() as replacement:
+        assert replacement is not conn
+    assert conn.closed
+    assert pool.get_stats()['discarded'] == 1
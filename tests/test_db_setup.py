@@ -0,0 +1,43 @@
+from db.db_setup import load_migrations, create_tables
+
+
+class FakeCursor:
+    """Answers the schema version query, records the statements"""
+    def __init__(self, version):
+        self.version = version
+        self.statements = []
+        self.connection = self
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+
+    def fetchone(self):
+        return (self.version,)
+
+    def commit(self):
+        pass
+
+
+def test_load_migrations_sorted_by_version(tmp_path):
+    for file_name in ("0010_later.sql", "0002_second.sql", "0001_first.sql", "README.md"):
+        (tmp_path / file_name).write_text(f"-- {file_name}")
+
+    migrations = load_migrations(str(tmp_path))
+
+    assert [(version, name) for version, name, _ in migrations] == [(1, 'first'), (2, 'second'), (10, 'later')]
+    assert migrations[0][2] == "-- 0001_first.sql"
+
+
+def test_shipped_migrations_have_unique_versions():
+    versions = [version for version, _, _ in load_migrations()]
+    assert versions == sorted(set(versions))
+    assert versions[0] == 1
+
+
+def test_current_schema_costs_one_query():
+    latest = load_migrations()[-1][0]
+    cur = FakeCursor(latest)
+
+    create_tables(cur)
+
+    assert cur.statements == ["SELECT max(version) FROM schema_migrations;"]
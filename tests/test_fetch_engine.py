@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+
+import pytest
+
+from scraper import http_session
+from scraper.fetch_engine import FetchEngine
+from scraper.fetch_and_parse import download_data_from_search_results, download_data_from_listing_page, iter_search_result_pages, check_offer_status
+from scraper import photos
+from scraper.photos import download_photos, hash_photo
+
+from conftest import FIXTURES_DIR
+
+
+SEARCH_PATH = "/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice?viewType=listing&by=LATEST&direction=DESC&limit=72"
+
+
+def test_fetch_many_keeps_order(otodom_server, engine):
+    urls = [f"{otodom_server.base_url}{SEARCH_PATH}&page={page}" for page in (2, 1, 3)]
+    responses = engine.fetch_many(urls)
+
+    assert responses[0].status_code == 200
+    assert b'66100004' in responses[0].content
+    assert b'66100001' in responses[1].content
+    assert responses[2] is None  # brak strony 3 -> 404
+
+
+def test_concurrency_is_bounded(otodom_server, engine):
+    otodom_server.delay = 0.1
+    urls = [f"{otodom_server.base_url}/images/x/{n}.jpg" for n in range(12)]
+    responses = engine.fetch_many(urls)
+
+    assert all(response is not None for response in responses)
+    assert 1 < otodom_server.max_in_flight <= engine.max_concurrency
+
+
+def test_host_budget_spaces_requests():
+    starts = {}
+    engine = FetchEngine(max_concurrency=4, host_interval=(0.05, 0.05), host_intervals={"cdn": (0, 0)},
+                         fetcher=lambda url: starts.setdefault(url.split('/')[2], []).append(time.monotonic()))
+    try:
+        engine.fetch_many([f"http://{host}/{n}" for n in range(4) for host in ("otodom", "cdn")])
+    finally:
+        engine.close()
+
+    gaps = [b - a for a, b in zip(starts["otodom"], starts["otodom"][1:])]
+    assert min(gaps) >= 0.045
+    # inny host nie czeka na budżet otodom
+    assert starts["cdn"][-1] - starts["cdn"][0] < 0.05
+
+
+def test_host_budget_holds_when_concurrency_is_saturated():
+    starts = []
+
+    def slow_first_requests(url):
+        starts.append(time.monotonic())
+        if url.endswith(('/0', '/1')):
+            time.sleep(0.3)
+
+    engine = FetchEngine(max_concurrency=2, host_interval=(0.1, 0.1), fetcher=slow_first_requests)
+    try:
+        engine.fetch_many([f"http://otodom/{n}" for n in range(6)])
+    finally:
+        engine.close()
+
+    # zapytania czekające na semafor nie startują razem po zwolnieniu miejsc
+    assert min(b - a for a, b in zip(starts, starts[1:])) >= 0.095
+
+
+def test_retries_take_host_budget_slots(otodom_server, monkeypatch):
+    monkeypatch.setattr(http_session, 'backoff_delay', lambda *args, **kwargs: 0)
+    first = "/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1"
+    otodom_server.statuses[first] = [503]
+    engine = FetchEngine(max_concurrency=4, host_interval=(0.1, 0.1))
+    try:
+        engine.fetch_many([f"{otodom_server.base_url}{first}",
+                           f"{otodom_server.base_url}/pl/oferta/mieszkanie-3-pokojowe-ligota-ID4aaa2"])
+    finally:
+        engine.close()
+
+    starts = [start for start, _ in otodom_server.requests_log]
+    assert len(starts) == 3
+    assert min(b - a for a, b in zip(starts, starts[1:])) >= 0.095
+
+
+def test_download_data_from_search_results(otodom_server, engine):
+    offers = download_data_from_search_results(f"{otodom_server.base_url}{SEARCH_PATH}")
+
+    assert [offer['listing_id'] for offer in offers] == [66100001, 66100002, 66100003, 66100004, 66100005]
+    assert offers[1]['area'] == 63.12
+    assert offers[1]['price'] == 612000
+    assert offers[4]['price'] is None
+    assert offers[0]['link'] == "https://www.otodom.pl/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1"
+
+
+def test_listing_photos_are_fetched_through_engine(otodom_server, engine):
+    response = engine.fetch(f"{otodom_server.base_url}/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1")
+    data = download_data_from_listing_page(response)
+
+    assert data['listing_id'] == 66100001
+    assert data['district'] == "Koszutka"
+    assert len(data['image_urls']) == 2
+    # parsowanie nie pobiera zdjęć
+    assert not any(path.startswith('/images/') for _, path in otodom_server.requests_log)
+
+    photos = download_photos(data['image_urls'])
+
+    with open(os.path.join(FIXTURES_DIR, 'photo.jpg'), 'rb') as f:
+        original = f.read()
+    assert [photo['content'] for photo in photos] == [original, original]
+    assert [photo['url'] for photo in photos] == data['image_urls']
+    assert photos[0]['hash'] == photos[1]['hash'] == hash_photo(original)
+    assert sum(path.startswith('/images/') for _, path in otodom_server.requests_log) == 2
+
+
+def test_known_photos_are_not_downloaded(otodom_server, engine):
+    urls = [f"{otodom_server.base_url}/images/x/{n}.jpg" for n in (1, 2)]
+    photos = download_photos(urls, known_hashes={urls[0]: b'known'})
+
+    assert [(photo['hash'], photo['content']) for photo in photos][0] == (b'known', None)
+    assert photos[1]['content'] is not None
+    assert [path for _, path in otodom_server.requests_log] == ['/images/x/2.jpg']
+
+
+def test_photos_transcode_mode(otodom_server, engine):
+    pytest.importorskip('cv2')
+    photos = download_photos([f"{otodom_server.base_url}/images/x/1.jpg"], mode='transcode')
+
+    assert len(photos) == 1
+    assert photos[0]['content'][:2] == b'\xff\xd8'
+
+
+def test_photo_pool_is_created_once(monkeypatch):
+    created = []
+
+    class SlowExecutor:
+        def __init__(self, **kwargs):
+            time.sleep(0.05)  # okno na wyścig przy tworzeniu puli
+            created.append(self)
+
+    monkeypatch.setattr(photos, '_pool', None)
+    monkeypatch.setattr(photos, 'ThreadPoolExecutor', SlowExecutor)
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(photos._get_pool())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(pool is created[0] for pool in pools)
+
+
+def test_first_search_page_is_fetched_once(otodom_server, engine):
+    pages = list(iter_search_result_pages(f"{otodom_server.base_url}{SEARCH_PATH}"))
+
+    assert [page for page, _ in pages] == [1, 2]
+    assert [len(offers) for _, offers in pages] == [3, 2]
+    search_requests = [path for _, path in otodom_server.requests_log if path.startswith('/pl/wyniki/')]
+    assert len(search_requests) == 2
+    assert search_requests[1].endswith('&page=2')
+
+
+def test_check_offer_status(otodom_server, engine):
+    removed = f"{otodom_server.base_url}/pl/oferta/mieszkanie-usuniete-ID4zzz9"
+    active = f"{otodom_server.base_url}/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1"
+
+    assert check_offer_status(removed) == "removed"
+    # usunięta oferta rozpoznana po samym HEAD (404), bez pobierania strony
+    assert [path for _, path in otodom_server.requests_log] == ['/pl/oferta/mieszkanie-usuniete-ID4zzz9']
+
+    assert check_offer_status(active) == "active"
+
+
+def test_offer_status_unknown_when_server_fails(otodom_server, engine, monkeypatch):
+    monkeypatch.setattr(http_session, 'backoff_delay', lambda *args, **kwargs: 0)
+    throttled = "/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1"
+    otodom_server.statuses[throttled] = 503
+
+    # HEAD i GET 503 - oferta nie moze zostac uznana za usuniętą
+    assert check_offer_status(f"{otodom_server.base_url}{throttled}") is None
+
+
+def test_incremental_paging_stops_without_fetching_remaining_pages(otodom_server, engine):
+    pages = iter_search_result_pages(f"{otodom_server.base_url}{SEARCH_PATH}", prefetch=0)
+    page, offers = next(pages)
+    pages.close()
+
+    assert page == 1 and len(offers) == 3
+    assert len([path for _, path in otodom_server.requests_log if path.startswith('/pl/wyniki/')]) == 1
+
+
+def test_search_pages_can_start_from_later_page(otodom_server, engine):
+    pages = list(iter_search_result_pages(f"{otodom_server.base_url}{SEARCH_PATH}", start_page=2))
+
+    assert [page for page, _ in pages] == [2]
+    assert [offer['listing_id'] for offer in pages[0][1]] == [66100004, 66100005]
@@ -0,0 +1,124 @@
+import os
+import time
+
+import pytest
+
+from scraper import http_session
+from scraper.http_cache import HttpCache, classify_url
+from conftest import FIXTURES_DIR
+
+LISTING_PATH = "/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1"
+SEARCH_PATH = "/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice"
+
+
+@pytest.fixture
+def etag_server(otodom_server):
+    otodom_server.etag = '"v1"'
+    return otodom_server
+
+
+def sent_etags(server) -> list:
+    return [headers.get('If-None-Match') for headers in server.request_headers]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite"))
+    previous = http_session.set_cache(cache)
+    yield cache
+    http_session.set_cache(previous)
+    cache.close()
+
+
+def test_classify_url():
+    assert classify_url("https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice?page=2") == 'search'
+    assert classify_url("https://www.otodom.pl/pl/oferta/mieszkanie-ID4aaa1") == 'listing'
+    assert classify_url("https://ireland.apollo.olxcdn.com/v1/files/eyJmbiI6/image;s=1280x1024") == 'image'
+    assert classify_url("https://www.otodom.pl/robots.txt") == 'other'
+
+
+def test_fresh_response_is_served_from_cache(etag_server, cache):
+    url = f"{etag_server.base_url}{LISTING_PATH}"
+
+    first = http_session.get(url)
+    second = http_session.get(url)
+
+    assert b"koszutka" in first.content
+    assert first.content == second.content
+    assert getattr(second, 'from_cache', False)
+    assert second.headers['ETag'] == '"v1"'
+    assert len(etag_server.requests_log) == 1
+
+
+def test_stale_response_is_revalidated(etag_server, cache):
+    url = f"{etag_server.base_url}{SEARCH_PATH}"
+    cache.ttls['search'] = 0
+
+    first = http_session.get(url)
+    response = http_session.get(url)
+
+    assert response.status_code == 200
+    assert response.content == first.content
+    assert sent_etags(etag_server) == [None, '"v1"']
+    assert cache.get_stats()['revalidated'] == 1
+
+
+def test_revalidate_asks_server_for_fresh_response(etag_server, cache):
+    url = f"{etag_server.base_url}{LISTING_PATH}"
+
+    first = http_session.get(url)
+    response = http_session.get(url, revalidate=True)
+
+    assert response.content == first.content
+    assert sent_etags(etag_server) == [None, '"v1"']
+
+
+def test_replay_mode_never_contacts_server(otodom_server, cache):
+    cached = http_session.get(f"{otodom_server.base_url}{LISTING_PATH}")
+
+    replay = HttpCache(cache.path, replay=True)
+    http_session.set_cache(replay)
+    try:
+        assert http_session.get(f"{otodom_server.base_url}{LISTING_PATH}").content == cached.content
+        assert http_session.get(f"{otodom_server.base_url}/pl/oferta/brak-ID4aaa9").status_code == 504
+    finally:
+        replay.close()
+    assert len(otodom_server.requests_log) == 1
+
+
+def test_replay_mode_answers_head_from_cache(otodom_server, cache):
+    cached = http_session.get(f"{otodom_server.base_url}{LISTING_PATH}")
+
+    replay = HttpCache(cache.path, replay=True)
+    http_session.set_cache(replay)
+    try:
+        assert http_session.head(f"{otodom_server.base_url}{LISTING_PATH}").status_code == 200
+        assert http_session.head(f"{otodom_server.base_url}/pl/oferta/brak-ID4aaa9").status_code == 504
+        assert http_session.get(f"{otodom_server.base_url}{LISTING_PATH}", revalidate=True).content == cached.content
+    finally:
+        replay.close()
+    assert len(otodom_server.requests_log) == 1
+
+
+def test_least_recently_used_responses_are_evicted(otodom_server, tmp_path):
+    photo_size = os.path.getsize(os.path.join(FIXTURES_DIR, "photo.jpg"))
+    cache = HttpCache(str(tmp_path / "small.sqlite"), max_size=int(photo_size * 4.5))
+    previous = http_session.set_cache(cache)
+    try:
+        for name in ("a", "b", "c"):
+            http_session.get(f"{otodom_server.base_url}/images/x/{name}.jpg")
+            time.sleep(0.01)
+        http_session.get(f"{otodom_server.base_url}/images/x/a.jpg")  # a - ostatnio uzywana
+        for name in ("d", "e"):
+            http_session.get(f"{otodom_server.base_url}/images/x/{name}.jpg")
+            time.sleep(0.01)
+    finally:
+        http_session.set_cache(previous)
+
+    assert cache.size <= cache.max_size
+    requests_before = len(otodom_server.requests_log)
+    assert cache.fetch(f"{otodom_server.base_url}/images/x/a.jpg", lambda validators: None) is not None
+    assert cache.fetch(f"{otodom_server.base_url}/images/x/c.jpg", lambda validators: None) is not None
+    assert cache.fetch(f"{otodom_server.base_url}/images/x/b.jpg", lambda validators: None) is None
+    assert len(otodom_server.requests_log) == requests_before
+    cache.close()
@@ -0,0 +1,64 @@
+import pytest
+
+from scraper import http_session
+from scraper.http_session import backoff_delay, parse_retry_after
+
+LISTING_PATH = "/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1"
+
+
+@pytest.fixture
+def url(otodom_server):
+    return f"{otodom_server.base_url}{LISTING_PATH}"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(http_session, 'BACKOFF_BASE', 0)
+    monkeypatch.setattr(http_session.time, 'sleep', lambda seconds: None)
+
+
+def test_retries_until_success(otodom_server, url):
+    otodom_server.statuses[LISTING_PATH] = [503, 429]
+    before = http_session.get_status_counts()['retries']
+
+    response = http_session.get(url)
+
+    assert response.status_code == 200
+    retries = http_session.get_status_counts()['retries']
+    assert retries.get(503, 0) - before.get(503, 0) == 1
+    assert retries.get(429, 0) - before.get(429, 0) == 1
+    # nagłówki ustawione na sesji
+    assert len(otodom_server.request_headers) == 3
+    assert all(headers['User-Agent'] == http_session.DEFAULT_HEADERS['User-Agent']
+               for headers in otodom_server.request_headers)
+
+
+def test_gives_up_after_max_retries(otodom_server, url):
+    otodom_server.statuses[LISTING_PATH] = [500, 500, 500]
+
+    response = http_session.get(url, max_retries=2)
+
+    assert response.status_code == 500
+    assert len(otodom_server.requests_log) == 3
+
+
+def test_not_retried_status(otodom_server, url):
+    otodom_server.statuses[LISTING_PATH] = [404]
+
+    assert http_session.get(url).status_code == 404
+    assert len(otodom_server.requests_log) == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('nonsense') is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff_delay():
+    assert backoff_delay(0, base=1, jitter=0) == 1
+    assert backoff_delay(3, base=1, jitter=0) == 8
+    assert backoff_delay(0, retry_after=30, base=1, jitter=0) == 30
+    assert backoff_delay(10, base=1, jitter=0, max_delay=60) == 60
+    assert 1 <= backoff_delay(0, base=1, jitter=0.5) <= 1.5
@@ -0,0 +1,85 @@
+import threading
+
+from db.locations import LocationResolver, normalize_location
+
+
+class FakeLocationsCursor:
+    """Stand-in for the locations table: answers the SELECT and INSERT ... ON CONFLICT ... RETURNING of the resolver"""
+    def __init__(self, rows=()):
+        self.rows = list(rows)  # (id, voivodeship, city, district)
+        self.inserts = 0
+        self.next_id = len(self.rows) + 1  # jak sekwencja - id nie wracają po rollback
+        self.result = None
+
+    def execute(self, query, params=None):
+        if query.startswith("SELECT"):
+            self.result = sorted(self.rows, reverse=True)
+            return
+        self.inserts += 1
+        key = normalize_location(*params)
+        existing = [id for id, *location in self.rows if normalize_location(*location) == key]
+        if existing:
+            self.result = [(min(existing), False)]
+        else:
+            self.rows.append((self.next_id, *params))
+            self.result = [(self.next_id, True)]
+            self.next_id += 1
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+def in_other_thread(function):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_normalize_location_matches_unique_index():
+    assert normalize_location(" Śląskie\t", "KATOWICE\n", None) == ("śląskie", "katowice", "")
+
+
+def test_cached_location_needs_no_query():
+    cur = FakeLocationsCursor([(1, "śląskie", "Katowice", " Koszutka")])
+    resolver = LocationResolver()
+
+    assert resolver.resolve(cur, "Śląskie", "katowice ", "Koszutka") == 1
+    assert cur.inserts == 0
+
+
+def test_pending_location_is_used_only_by_inserting_thread():
+    cur = FakeLocationsCursor()
+    resolver = LocationResolver()
+
+    id = resolver.resolve(cur, "śląskie", "Katowice", "Ligota")
+    assert resolver.resolve(cur, "śląskie", "Katowice", "Ligota") == id
+    assert cur.inserts == 1
+
+    # inny wątek nie uzywa lokalizacji bez commit - pyta bazę (czeka na transakcję)
+    assert in_other_thread(lambda: resolver.resolve(cur, "śląskie", "Katowice", "Ligota")) == id
+    assert cur.inserts == 2
+
+    id = resolver.resolve(cur, "śląskie", "Katowice", "Brynów")
+    resolver.confirm()
+    assert in_other_thread(lambda: resolver.resolve(cur, "śląskie", "Katowice", "Brynów")) == id
+    assert cur.inserts == 3
+
+
+def test_rollback_forgets_locations_of_current_thread_only():
+    cur = FakeLocationsCursor()
+    resolver = LocationResolver()
+    resolver.resolve(cur, "śląskie", "Katowice", "Brynów")
+    other = in_other_thread(lambda: (resolver.resolve(cur, "śląskie", "Katowice", "Załęże"), resolver.confirm())[0])
+
+    resolver.rollback()
+    cur.rows = [row for row in cur.rows if row[3] != "Brynów"]  # baza wycofała wstawienie
+
+    assert in_other_thread(lambda: resolver.resolve(cur, "śląskie", "Katowice", "Załęże")) == other
+    assert cur.inserts == 2
+    assert resolver.resolve(cur, "śląskie", "Katowice", "Brynów") == 3
+    assert cur.inserts == 3
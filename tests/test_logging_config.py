@@ -0,0 +1,31 @@
+import logging
+import logging.handlers
+
+from config.logging_config import setup_logger, stop_logger, parse_levels
+
+
+def test_parse_levels():
+    assert parse_levels("scraper.fetch_and_parse=debug, db=WARNING,") == {'scraper.fetch_and_parse': 'DEBUG', 'db': 'WARNING'}
+
+
+def test_records_go_through_queue_with_module_levels(tmp_path):
+    root = logging.getLogger()
+    previous_level, previous_handlers = root.level, list(root.handlers)
+    try:
+        setup_logger(level='INFO', levels='tests.verbose=DEBUG', log_dir=str(tmp_path))
+        assert any(isinstance(handler, logging.handlers.QueueHandler) for handler in root.handlers)
+
+        logging.getLogger('tests.verbose').debug("widoczny %s", 1)
+        logging.getLogger('tests.quiet').debug("niewidoczny %s", 2)
+        logging.getLogger('tests.quiet').info("informacja %s", 3)
+        stop_logger()
+
+        log = next(tmp_path.glob("otodom_app_log_*.log")).read_text()
+        assert "tests.verbose - widoczny 1" in log
+        assert "niewidoczny" not in log
+        assert "tests.quiet - informacja 3" in log
+    finally:
+        stop_logger()
+        root.handlers = previous_handlers
+        root.setLevel(previous_level)
+        logging.getLogger('tests.verbose').setLevel(logging.NOTSET)
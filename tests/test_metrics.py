@@ -0,0 +1,55 @@
+import urllib.request
+
+from config.metrics import Metrics, metrics
+from scraper.fetch_engine import FetchEngine, set_engine
+from scraper.fetch_and_parse import fetch_page
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = Metrics()
+    for value in (0.003, 0.02, 0.02, 4):
+        registry.observe('parse_seconds', value)
+    registry.inc('http_responses_total', status=200)
+    registry.inc('http_responses_total', 2, status=200)
+
+    text = registry.render()
+
+    assert '# TYPE http_responses_total counter' in text
+    assert 'http_responses_total{status="200"} 3' in text
+    assert 'parse_seconds_bucket{le="0.005"} 1' in text
+    assert 'parse_seconds_bucket{le="0.025"} 3' in text
+    assert 'parse_seconds_bucket{le="+Inf"} 4' in text
+    assert 'parse_seconds_count 4' in text
+    assert registry.histograms['parse_seconds'].quantile((), 0.5) == 0.025
+
+
+def test_textfile_and_endpoint(tmp_path):
+    registry = Metrics()
+    registry.observe('db_batch_rows', 120, buckets=(100, 250), statement='listing_batch')
+
+    path = tmp_path / "metrics" / "otodom.prom"
+    registry.write_textfile(str(path))
+    assert 'db_batch_rows_bucket{statement="listing_batch",le="250"} 1' in path.read_text()
+
+    server = registry.start_server(port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.read().decode() == registry.render()
+    finally:
+        registry.stop_server()
+
+
+def test_fetches_are_measured(otodom_server):
+    metrics.reset()
+    engine = FetchEngine(max_concurrency=2, host_interval=(0, 0))
+    previous = set_engine(engine)
+    try:
+        fetch_page(f"{otodom_server.base_url}/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1")
+    finally:
+        engine.close()
+        set_engine(previous)
+
+    assert metrics.histograms['fetch_seconds'].series[(('url_class', 'listing'),)][2] == 1
+    assert metrics.counters['http_responses_total'][(('status', 200),)] == 1
+    assert metrics.counters['http_response_bytes_total'][(('url_class', 'listing'),)] > 0
+    assert any(line.startswith('fetch_seconds{url_class="listing"}: 1 x') for line in metrics.summary())
@@ -0,0 +1,51 @@
+import os
+
+from scraper.next_data import extract_next_data, slice_next_data, html_to_text
+
+from conftest import FIXTURES_DIR
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def test_extracts_search_page():
+    data = extract_next_data(read_fixture('search_page_1.html'))
+
+    assert data['props']['pageProps']['tracking']['listing']['page_count'] == 2
+    assert len(data['props']['pageProps']['data']['searchAds']['items']) == 3
+
+
+def test_accepts_str_and_keeps_unicode():
+    html = read_fixture('listing_mieszkanie-2-pokojowe-koszutka-ID4aaa1.html').decode('utf-8')
+    data = extract_next_data(html)
+
+    assert data['props']['pageProps']['ad']['agency']['name'] == "Nieruchomości Śląsk"
+
+
+def test_marker_outside_script_tag_is_ignored():
+    html = b'<p>id="__NEXT_DATA__"</p><script type="application/json" id="__NEXT_DATA__">{"a": 1}</script>'
+
+    assert slice_next_data(html) == b'{"a": 1}'
+    assert extract_next_data(html) == {"a": 1}
+
+
+def test_falls_back_to_soup_for_unquoted_attribute():
+    html = b'<script type="application/json" id=__NEXT_DATA__>{"a": 1}</script>'
+
+    assert slice_next_data(html) is None
+    assert extract_next_data(html) == {"a": 1}
+
+
+def test_missing_tag():
+    assert extract_next_data(b'<html><body>brak danych</body></html>') is None
+
+
+def test_html_to_text_matches_soup():
+    from bs4 import BeautifulSoup
+
+    ad = extract_next_data(read_fixture('listing_mieszkanie-2-pokojowe-koszutka-ID4aaa1.html'))['props']['pageProps']['ad']
+    for fragment in (ad['title'], ad['description'], "a<!-- <b>x</b> -->b<br/>c &lt;d&gt;"):
+        assert html_to_text(fragment) == BeautifulSoup(fragment, "html.parser").get_text()
+    assert html_to_text(None) is None
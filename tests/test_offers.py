@@ -0,0 +1,30 @@
+import pytest
+
+from scraper.offers import OfferBatch
+
+OFFERS = [
+    {'listing_id': 66100001, 'area': 48.51, 'price': 455000, 'price_per_m': 9380.0,
+     'link': "https://www.otodom.pl/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1"},
+    {'listing_id': 66100002, 'area': 63.12, 'price': None, 'price_per_m': None,
+     'link': "http://127.0.0.1:8080/pl/oferta/mieszkanie-ID4aaa2"},
+    {'listing_id': 66100003, 'area': None, 'price': 612000, 'price_per_m': 9696.0, 'link': None},
+]
+
+
+def test_batch_reads_back_offer_dictionaries():
+    batch = OfferBatch(OFFERS)
+
+    assert len(batch) == 3
+    assert list(batch) == OFFERS
+    assert batch[-1] == OFFERS[2]
+    assert list(batch.keys()) == [(66100001, 48.51), (66100002, 63.12), (66100003, None)]
+    with pytest.raises(IndexError):
+        batch[3]
+
+
+def test_extend_with_batch_keeps_links():
+    batch = OfferBatch(OFFERS[:1])
+    batch.extend(OfferBatch(OFFERS[1:]))
+
+    assert [row[4] for row in batch.rows()] == [offer['link'] for offer in OFFERS]
+    assert batch.row(1) == tuple(OFFERS[1].values())
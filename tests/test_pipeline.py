@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from scraper import pipeline
+from scraper.pipeline import Stage, ListingPipeline
+
+
+class FakeConnection:
+    autocommit = False
+
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self):
+        self.returned = []
+
+    def getconn(self):
+        return FakeConnection()
+
+    def putconn(self, conn):
+        self.returned.append(conn)
+
+
+class FakeWriter:
+    """Records the offers instead of writing them, one flush per add()"""
+    def __init__(self, conn):
+        self.offers = []
+        self.listings_written = 0
+        self.rows_per_second = 0.0
+
+    def add(self, offer_data):
+        self.offers.append(offer_data)
+        self.listings_written += 1
+        return [(offer_data['listing_id'], len(self.offers))]
+
+    def is_flush_due(self):
+        return False
+
+    def flush(self):
+        return []
+
+
+def test_bounded_queue_blocks_producer():
+    release = threading.Event()
+    consumed = []
+    stage = Stage('slow', lambda item: release.wait() and consumed.append(item), workers=1, queue_size=2)
+    stage.start()
+
+    producer = threading.Thread(target=lambda: [stage.put(n) for n in range(5)])
+    producer.start()
+    time.sleep(0.1)
+    # 1 element w obróbce, 2 w kolejce, producent czeka z kolejnymi
+    assert producer.is_alive()
+    assert stage.input.qsize() == 2
+
+    release.set()
+    producer.join(timeout=1)
+    stage.stop()
+    assert consumed == [0, 1, 2, 3, 4]
+    assert stage.get_stats()['processed'] == 5
+    assert stage.get_stats()['max_queued'] == 2
+
+
+@pytest.mark.parametrize('parse_mode', ['thread', 'process'])
+def test_pipeline_fetches_parses_and_writes_offers(otodom_server, engine, monkeypatch, parse_mode):
+    monkeypatch.setattr(pipeline, 'ListingWriter', FakeWriter)
+    monkeypatch.setattr(pipeline, 'find_known_photos', lambda cur, image_urls: {})
+
+    offers = [{'listing_id': 66100001, 'link': f"{otodom_server.base_url}/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa1"},
+              {'listing_id': 66100002, 'link': f"{otodom_server.base_url}/pl/oferta/mieszkanie-3-pokojowe-ligota-ID4aaa2"},
+              {'listing_id': 66100009, 'link': f"{otodom_server.base_url}/pl/oferta/brak-ID4aaa9"}]  # 404
+
+    pool = FakePool()
+    with ListingPipeline(pool=pool, fetch_workers=2, parse_workers=2, photo_workers=2,
+                         parse_mode=parse_mode, report_interval=0) as listing_pipeline:
+        for offer in offers:
+            listing_pipeline.submit(offer)
+
+    written = sorted(offer['listing_id'] for offer in listing_pipeline.writer.offers)
+    assert written == [66100001, 66100002]
+    assert all(offer['images'] and 'image_urls' not in offer for offer in listing_pipeline.writer.offers)
+    assert sorted(otodom_id for otodom_id, _ in listing_pipeline.pop_written()) == [66100001, 66100002]
+    assert listing_pipeline.pop_written() == []
+
+    assert len(pool.returned) == 2
+
+    stats = listing_pipeline.get_stats()
+    assert stats['fetch']['processed'] == 3
+    assert stats['write']['processed'] == 2
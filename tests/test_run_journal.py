@@ -0,0 +1,182 @@
+from decimal import Decimal
+
+import pytest
+
+from db import run_journal
+from db.run_journal import RunJournal
+from scraper import fetch_and_parse, scraper
+from scraper.offers import OfferBatch
+
+LINK = "https://www.otodom.pl/pl/oferta/mieszkanie-2-pokojowe-koszutka-ID4aaa{}"
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.connection.statements.append((' '.join(query.split()), params))
+        # wynik zapytania - pierwszy pasujący fragment z FakeConnection.results
+        self.rows = next((rows for key, rows in self.connection.results.items() if key in query), [])
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Answers the queries containing the keys of `results` with the given rows, records the statements"""
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def offer(n: int) -> dict:
+    return {'listing_id': 66100000 + n, 'area': 48.51 + n, 'price': 455000 + n, 'price_per_m': 9380.0 + n,
+            'link': LINK.format(n)}
+
+
+@pytest.fixture
+def written_values(monkeypatch):
+    written = []
+    monkeypatch.setattr(run_journal, 'execute_values', lambda cur, query, values: written.append(list(values)))
+    return written
+
+
+@pytest.fixture
+def resumed_conn():
+    """Connection of a run interrupted after two search pages and two closed-offer checks"""
+    snapshot = [(page, item['listing_id'], Decimal(str(item['area'])), item['price'],
+                 Decimal(str(item['price_per_m'])), item['link'])
+                for page, item in ((1, offer(1)), (1, offer(2)), (2, offer(3)))]
+    return FakeConnection({
+        "SELECT id, full_crawl, search_done": [(7, False, False)],
+        "SELECT page, otodom_listing_id": snapshot,
+        "SELECT listing_id, status": [(101, 'active'), (102, 'removed')],
+    })
+
+
+def test_begin_starts_new_run_and_prunes_abandoned_runs():
+    conn = FakeConnection({"RETURNING id": [(8,)]})
+
+    journal = RunJournal.begin(conn, "http://s", full_crawl=True)
+
+    assert (journal.run_id, journal.resumed, journal.next_page) == (8, False, 1)
+    deletes = [query for query, _ in conn.statements if query.startswith('DELETE')]
+    assert len(deletes) == 2
+    assert any('crawl_run_offers' in query and "status = 'abandoned'" in query for query in deletes)
+    assert any('crawl_run_checks' in query and "status = 'abandoned'" in query for query in deletes)
+
+
+def test_begin_resumes_run_from_snapshot(resumed_conn):
+    journal = RunJournal.begin(resumed_conn, "http://s", full_crawl=True)
+
+    assert (journal.run_id, journal.resumed, journal.full_crawl) == (7, True, False)
+    assert list(journal.resumed_pages[1]) == [offer(1), offer(2)]
+    assert list(journal.resumed_pages[2]) == [offer(3)]
+    assert journal.next_page == 3
+    assert journal.checks == {101: 'active', 102: 'removed'}
+
+
+def test_resumed_run_continues_from_next_page(resumed_conn, written_values, monkeypatch):
+    fetched_from = []
+
+    def fake_search_pages(url, prefetch=None, start_page=1):
+        fetched_from.append(start_page)
+        yield start_page, OfferBatch([offer(4)])
+
+    monkeypatch.setattr(scraper, 'iter_search_result_pages', fake_search_pages)
+    journal = RunJournal.begin(resumed_conn, "http://s")
+
+    pages = [(page, list(offers)) for page, offers in scraper.iter_journaled_pages("http://s", journal)]
+
+    assert pages == [(1, [offer(1), offer(2)]), (2, [offer(3)]), (3, [offer(4)])]
+    assert fetched_from == [3]
+    assert journal.resumed_pages == {}
+    assert written_values == [[(7, 3, 0, *OfferBatch([offer(4)]).row(0))]]
+    assert journal.next_page == 4
+
+
+def test_finished_search_is_not_fetched_again(resumed_conn, monkeypatch):
+    resumed_conn.results["SELECT id, full_crawl, search_done"] = [(7, True, True)]
+    monkeypatch.setattr(scraper, 'iter_search_result_pages', pytest.fail)
+    journal = RunJournal.begin(resumed_conn, "http://s")
+
+    assert [page for page, _ in scraper.iter_journaled_pages("http://s", journal)] == [1, 2]
+
+
+def test_closed_offer_checks_reuse_journal(resumed_conn, monkeypatch):
+    checked = []
+    monkeypatch.setattr(fetch_and_parse, 'find_potentially_deleted_offers',
+                        lambda data, city, cur: {(101, LINK.format(1)), (102, LINK.format(2)), (103, LINK.format(3))})
+    monkeypatch.setattr(fetch_and_parse, 'check_offer_status', lambda link: checked.append(link) or 'removed')
+    journal = RunJournal.begin(resumed_conn, "http://s")
+
+    deleted = fetch_and_parse.find_closed_offers(OfferBatch(), 'katowice', None, journal)
+
+    assert deleted == {(102, 'removed'), (103, 'removed')}
+    assert checked == [LINK.format(3)]
+    assert journal.checks[103] == 'removed'
+    assert resumed_conn.statements[-1][1] == (7, 103, 'removed')
+
+
+class FakePipeline:
+    def __init__(self):
+        self.listings_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, offer):
+        self.listings_written += 1
+
+    def pop_written(self):
+        return []
+
+
+def test_incremental_crawl_stops_at_first_known_page(written_values, monkeypatch):
+    conn = FakeConnection({"RETURNING id": [(9,)]})
+    fetched, closed = [], []
+
+    def fake_search_pages(url, prefetch=None, start_page=1):
+        try:
+            for page in range(start_page, 4):
+                fetched.append(page)
+                yield page, OfferBatch([offer(page)])
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(scraper, 'iter_search_result_pages', fake_search_pages)
+    # strona 1 - nowa oferta, strona 2 - same znane oferty bez zmian cen
+    monkeypatch.setattr(scraper, 'categorize_offers',
+                        lambda offers, cur: ([offers[0]], [], []) if offers[0] == offer(1) else ([], [], list(offers)))
+    monkeypatch.setattr(scraper, 'ListingPipeline', FakePipeline)
+    monkeypatch.setattr(scraper, 'apply_price_changes', lambda changes, conn, cur: len(changes))
+    monkeypatch.setattr(scraper, 'find_closed_offers', pytest.fail)
+
+    stats = scraper.crawl_search("http://s", 'katowice', conn, None, full_crawl=False)
+
+    assert stats == {'offers': 2, 'pages': 2, 'full_crawl': False, 'resumed': False, 'new': 1, 'changed': 0, 'closed': 0}
+    assert fetched == [1, 2]
+    assert closed == [True]  # strony pobierane do przodu anulowane
+    assert [values[0][1] for values in written_values] == [1, 2]
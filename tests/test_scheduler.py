@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+
+from scraper.scraper import extract_city_from_url
+from scraper.scheduler import SearchScheduler, build_search_url, load_search_config
+
+
+def test_extract_city_from_url():
+    assert extract_city_from_url("https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice/katowice/katowice?viewType=listing&limit=72") == "katowice"
+    assert extract_city_from_url("https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/pszczynski/pszczyna/pszczyna/centrum") == "pszczyna"
+    assert extract_city_from_url("https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/gliwice?by=LATEST") == "gliwice"
+    assert extract_city_from_url("https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie") is None
+    assert extract_city_from_url("https://www.otodom.pl/pl/oferta/mieszkanie-ID4aaa1") is None
+
+
+def test_load_search_config(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({
+        "default_refresh_interval": 45,
+        "searches": [
+            {"region": "slaskie/katowice/katowice", "city": "katowice", "refresh_interval": 30},
+            {"name": "gliwice-tanie", "region": "slaskie/gliwice/gliwice", "city": "gliwice", "filters": {"priceMax": 500000}},
+        ]
+    }))
+
+    katowice, gliwice = load_search_config(str(path))['searches']
+
+    assert katowice['name'] == "katowice"
+    assert katowice['refresh_interval'] == 30
+    assert katowice['url'] == build_search_url({"region": "slaskie/katowice/katowice", "city": "katowice"})
+    assert katowice['url'].startswith("https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/slaskie/katowice/katowice/katowice?")
+    assert gliwice['city'] == "gliwice"
+    assert gliwice['refresh_interval'] == 45
+    assert "priceMax=500000" in gliwice['url'] and "limit=72" in gliwice['url']
+
+
+def test_recently_active_searches_go_first():
+    searches = [{'name': name, 'refresh_interval': 60} for name in ("a", "b", "c")]
+    order = []
+    scheduler = SearchScheduler(searches, lambda search, full_crawl: order.append(search['name']), max_workers=1)
+    scheduler.activity.update({"b": 5.0, "c": 1.0})
+
+    scheduler.run_once()
+
+    assert order == ["b", "c", "a"]
+
+
+def test_searches_run_concurrently_and_are_rescheduled():
+    searches = [{'name': name, 'refresh_interval': 0.001} for name in ("a", "b")]
+    in_flight = []
+    max_in_flight = []
+    runs = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def run_search(search, full_crawl):
+        with lock:
+            in_flight.append(search['name'])
+            max_in_flight.append(len(in_flight))
+            runs.append(search['name'])
+            if len(runs) >= 6:
+                stop.set()
+        time.sleep(0.05)
+        with lock:
+            in_flight.remove(search['name'])
+        return {'new': 1}
+
+    scheduler = SearchScheduler(searches, run_search, max_workers=2)
+    thread = threading.Thread(target=scheduler.run_forever, args=(stop,))
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert max(max_in_flight) == 2
+    assert runs.count("a") >= 2 and runs.count("b") >= 2
+    assert scheduler.activity["a"] > 0
+
+
+def test_every_nth_run_is_a_full_crawl():
+    search = {'name': "a", 'refresh_interval': 60, 'full_crawl_every': 3}
+    modes = []
+    scheduler = SearchScheduler([search], lambda search, full_crawl: modes.append(full_crawl))
+
+    for _ in range(7):
+        scheduler._run(search)
+
+    assert modes == [True, False, False, True, False, False, True]
+
+
+def test_restored_run_counts_decide_full_crawl():
+    searches = [{'name': name, 'refresh_interval': 60, 'full_crawl_every': 3} for name in ("a", "b", "c")]
+    modes = {}
+    scheduler = SearchScheduler(searches, lambda search, full_crawl: modes.update({search['name']: full_crawl}))
+    # a - nigdy pełny przebieg, b - zaraz po pełnym, c - dwa przebiegi od pełnego (kolejny pełny)
+    scheduler.restore_runs({"a": 0, "b": 1, "c": 3, "unknown": 5})
+
+    scheduler.run_once(full_crawl=None)
+
+    assert modes == {"a": True, "b": False, "c": True}
+    assert "unknown" not in scheduler.runs
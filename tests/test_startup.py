@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+HEAVY_MODULES = ('cv2', 'numpy', 'pandas', 'openpyxl', 'bs4')
+
+
+def test_heavy_dependencies_are_imported_lazily(tmp_path):
+    code = ("import sys, main, scraper.pipeline, scraper.utils\n"
+            f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=dict(os.environ, LOG_DIR=str(tmp_path)),
+                            capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
+
+
+def test_spawned_worker_import_does_not_set_up_logging(tmp_path):
+    # procesy robocze (spawn) wykonują main.py ponownie jako __mp_main__
+    code = "import runpy, logging; runpy.run_path('main.py', run_name='__mp_main__'); print(len(logging.getLogger().handlers))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=dict(os.environ, LOG_DIR=str(tmp_path)),
+                            capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '0'
+    assert list(tmp_path.iterdir()) == []